@@ -0,0 +1,55 @@
+"""
+check() helper shared by the verify_*.py scripts.
+
+Each check prints ✅ or ❌; finish() at the end of a script exits with status 1 if any check
+failed, so a script run from a deploy or cron step fails visibly instead of exiting 0.
+use_temp_storage() keeps scripts away from the checkout's data/bot.db and data/*.json.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+failures = []
+
+def check(name, condition):
+    if condition:
+        print(f"✅ {name}")
+    else:
+        print(f"❌ {name}")
+        failures.append(name)
+
+def finish():
+    """Exit with status 1 if any check failed."""
+    if failures:
+        print(f"\n{len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+
+def use_temp_storage(copy_data: bool = False):
+    """
+    Point the shared storage (services.storage.storage, used by every module) at a fresh temp
+    database, so a script neither creates data/bot.db nor imports and renames the JSON files in
+    data/. Call it before anything touches storage. With copy_data, the real database (if any) and
+    the JSON files of data/ are copied first, so the script sees the same records.
+    """
+    from services.storage import storage, DATA_DIR
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, 'bot.db')
+    if copy_data:
+        if os.path.exists(storage.path):
+            # backup() gives a consistent copy even while the bot writes (WAL)
+            source, target = sqlite3.connect(storage.path), sqlite3.connect(path)
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+                target.close()
+        if os.path.isdir(DATA_DIR):
+            for name in os.listdir(DATA_DIR):
+                if name.endswith('.json'):
+                    shutil.copy(os.path.join(DATA_DIR, name), tmp_dir)
+    storage.path = path
+    storage.data_dir = tmp_dir
+    storage._initialized = False
+    return storage
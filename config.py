@@ -9,3 +9,62 @@ SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Per-request timeout and retries of LLM calls, and the overall deadline of the nightly feedback analysis
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+FEEDBACK_ANALYSIS_DEADLINE = float(os.getenv("FEEDBACK_ANALYSIS_DEADLINE", "600"))
+# Group photos sent to the LLM: longest edge in px, JPEG quality, max photos per day, dHash bits for a near-duplicate
+LLM_IMAGE_MAX_EDGE = int(os.getenv("LLM_IMAGE_MAX_EDGE", "1024"))
+LLM_IMAGE_QUALITY = int(os.getenv("LLM_IMAGE_QUALITY", "80"))
+LLM_IMAGE_DAILY_BUDGET = int(os.getenv("LLM_IMAGE_DAILY_BUDGET", "20"))
+LLM_IMAGE_DUPLICATE_DISTANCE = int(os.getenv("LLM_IMAGE_DUPLICATE_DISTANCE", "6"))
+# Photos one chunk of the day's messages may use out of the daily budget, so the evening still gets some
+LLM_IMAGE_CHUNK_BUDGET = int(os.getenv("LLM_IMAGE_CHUNK_BUDGET", "5"))
+# Incremental feedback: summarize group messages in chunks of N, or once the oldest unsummarized one is this old (s)
+FEEDBACK_CHUNK_MESSAGES = int(os.getenv("FEEDBACK_CHUNK_MESSAGES", "40"))
+FEEDBACK_CHUNK_MAX_AGE = int(os.getenv("FEEDBACK_CHUNK_MAX_AGE", "3600"))
+FEEDBACK_CHUNK_CHECK_INTERVAL = int(os.getenv("FEEDBACK_CHUNK_CHECK_INTERVAL", "900"))
+# Group message log: fsync after this many appended messages or seconds, whichever comes first
+MESSAGE_LOG_FSYNC_BATCH = int(os.getenv("MESSAGE_LOG_FSYNC_BATCH", "20"))
+MESSAGE_LOG_FSYNC_INTERVAL = float(os.getenv("MESSAGE_LOG_FSYNC_INTERVAL", "5"))
+# Captured group messages are buffered in memory and written when this many are queued or every N seconds
+MESSAGE_BUFFER_MAX_MESSAGES = int(os.getenv("MESSAGE_BUFFER_MAX_MESSAGES", "50"))
+MESSAGE_BUFFER_FLUSH_INTERVAL = float(os.getenv("MESSAGE_BUFFER_FLUSH_INTERVAL", "2"))
+
+# Shared HTTP client used by SheetManager for Google Sheets downloads
+SHEETS_HTTP2 = os.getenv("SHEETS_HTTP2", "true").lower() == "true"
+SHEETS_MAX_CONNECTIONS = int(os.getenv("SHEETS_MAX_CONNECTIONS", "10"))
+SHEETS_MAX_KEEPALIVE = int(os.getenv("SHEETS_MAX_KEEPALIVE", "5"))
+SHEETS_KEEPALIVE_EXPIRY = float(os.getenv("SHEETS_KEEPALIVE_EXPIRY", "120"))
+SHEETS_CONNECT_TIMEOUT = float(os.getenv("SHEETS_CONNECT_TIMEOUT", "10"))
+SHEETS_READ_TIMEOUT = float(os.getenv("SHEETS_READ_TIMEOUT", "30"))
+
+# How long past its TTL a cached sheet may still be served while it refreshes in the background
+SHEETS_STALE_MAX_AGE = int(os.getenv("SHEETS_STALE_MAX_AGE", "3600"))
+
+# On-disk copy of sheet CSVs and metadata, used on startup and when Google is unreachable
+SHEETS_CACHE_DIR = os.getenv("SHEETS_CACHE_DIR", "data/sheet_cache")
+SHEETS_CACHE_MAX_BYTES = int(os.getenv("SHEETS_CACHE_MAX_BYTES", str(20 * 1024 * 1024)))
+SHEETS_CACHE_MAX_AGE = int(os.getenv("SHEETS_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Maximum number of sheet downloads running in parallel for one batch
+SHEETS_FETCH_CONCURRENCY = int(os.getenv("SHEETS_FETCH_CONCURRENCY", "4"))
+
+# Shift reminders: how long before the shift start, and how often the schedule is revalidated
+SHIFT_REMINDER_LEAD_MINUTES = int(os.getenv("SHIFT_REMINDER_LEAD_MINUTES", "60"))
+SHIFT_SYNC_INTERVAL = int(os.getenv("SHIFT_SYNC_INTERVAL", "900"))
+
+# Outgoing notification fan-outs: messages per second for the whole bot, and sends in flight
+TELEGRAM_SEND_RATE = float(os.getenv("TELEGRAM_SEND_RATE", "25"))
+TELEGRAM_SEND_CONCURRENCY = int(os.getenv("TELEGRAM_SEND_CONCURRENCY", "8"))
+
+# Run log of scheduled jobs (duration, misfire lag, phases), shown by /jobs
+JOB_RUNS_FILE = os.getenv("JOB_RUNS_FILE", "data/job_runs.jsonl")
+JOB_RUNS_MAX_BYTES = int(os.getenv("JOB_RUNS_MAX_BYTES", str(1024 * 1024)))
+
+# SQLite record of which daily job slots already ran, so restarts neither lose nor repeat them
+JOB_STORE_FILE = os.getenv("JOB_STORE_FILE", "data/jobs.db")
+# SQLite database (WAL) with users, sent reminders, settings, ratings and medical records
+STORAGE_DB_FILE = os.getenv("STORAGE_DB_FILE", "data/bot.db")
+# Seconds a cached config/state read is trusted before the file mtime or table version is checked again
+DATA_CACHE_CHECK_INTERVAL = float(os.getenv("DATA_CACHE_CHECK_INTERVAL", "5"))
@@ -1,5 +1,6 @@
 #!/bin/bash
 # Deploy group.json to production server
+# The bot imports it into data/bot.db on the restart and renames it to group.json.imported
 
 echo "Deploying group.json to server..."
 ssh -i ~/.ssh/ubuntu_dodo_bot.pem ubuntu@45.12.4.173 << 'ENDSSH'
@@ -1,5 +1,4 @@
 import os
-import json
 import logging
 from datetime import datetime
 import pytz
@@ -21,7 +20,6 @@ def check_environment():
     
     # Check Files
     feedback_file = 'data/feedback.text'
-    group_file = 'data/group.json'
     
     print(f"Checking {feedback_file}...")
     if os.path.exists(feedback_file):
@@ -36,18 +34,16 @@ def check_environment():
         print(f"  CWD: {os.getcwd()}")
         print(f"  Abs path: {os.path.abspath(feedback_file)}")
 
-    print(f"Checking {group_file}...")
-    if os.path.exists(group_file):
-        print("  [OK] File exists")
-        try:
-            with open(group_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                group_id = data.get('group_id')
-                print(f"  [OK] Group ID: {group_id}")
-        except Exception as e:
-            print(f"  [FAIL] Error reading JSON: {e}")
-    else:
-        print("  [FAIL] File not found")
+    print("Checking group ID in storage...")
+    try:
+        from services.storage import storage
+        group_id = storage.get_group_id()
+        if group_id:
+            print(f"  [OK] Group ID: {group_id}")
+        else:
+            print("  [FAIL] Group ID not set (use /set_group or data/group.json)")
+    except Exception as e:
+        print(f"  [FAIL] Error reading storage: {e}")
 
 if __name__ == "__main__":
     check_environment()
@@ -1,20 +1,15 @@
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters
-import json
 import os
+from services.data_cache import data_cache
 
 DEFROST_MENU_SELECT, DEFROST_DAY_SELECT = range(2)
 
 DAYS = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
 
 def load_json(filename):
-    """Load JSON data from file."""
-    filepath = os.path.join('data', filename)
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        return None
+    """Load JSON data from file (cached until the file changes; don't modify the result)."""
+    return data_cache.get_file(os.path.join('data', filename))
 
 async def start_defrost(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show the three sub-menu options for defrosting."""
@@ -1,12 +1,9 @@
-import json
-import os
 from telegram import Update
 from telegram.ext import ContextTypes
 
 from datetime import datetime
-from services.sheets import get_preps
-
-GROUP_FILE = 'data/group.json'
+from services.rendered_messages import get_preps_message, get_who_message
+from services.storage import storage
 
 async def set_group_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -21,12 +18,7 @@ async def set_group_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        data = {'group_id': str(chat_id)}
-        
-        os.makedirs('data', exist_ok=True)
-        
-        with open(GROUP_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        storage.set_group_id(chat_id)
             
         await update.message.reply_text(f"✅ Группа успешно привязана! ID: {chat_id}\nТеперь сюда будут приходить уведомления о заготовках.")
         
@@ -61,7 +53,7 @@ async def prep_command_handler(update: Update, context: ContextTypes.DEFAULT_TYP
             
         await update.message.reply_text(f"⏳ Загружаю список заготовок {shift_name}...")
         
-        preps_text = await get_preps(target_day_index, is_morning)
+        preps_text = await get_preps_message(target_day_index, is_morning)
         
         await update.message.reply_text(preps_text, parse_mode='Markdown')
         
@@ -79,8 +71,7 @@ async def who_command_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         await update.message.reply_text("⏳ Загружаю список сотрудников на смене...")
         
-        from services.sheets import get_who_on_shift
-        who_text = await get_who_on_shift(today_str)
+        who_text = await get_who_message(today_str)
         
         await update.message.reply_text(who_text)
         
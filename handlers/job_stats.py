@@ -0,0 +1,84 @@
+"""
+/jobs command: metrics of the scheduled jobs recorded by services/job_metrics.py.
+
+/jobs            - summary of every job over the recorded runs
+/jobs <name>     - the last runs of jobs whose name contains <name>
+"""
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+from services.auth import get_user_role
+from services.job_metrics import load_runs, summarize
+from services.sheet_manager import sheet_manager
+
+logger = logging.getLogger(__name__)
+
+LAST_RUNS = 10
+
+def _format_run(run: dict) -> str:
+    status = "✅" if run.get('ok') else "❌"
+    line = f"{status} {run['started'][5:16].replace('T', ' ')} {run.get('duration', 0):.1f}s"
+    if run.get('lag') is not None:
+        line += f", lag {run['lag']:.0f}s"
+    if run.get('phases'):
+        line += " | " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in run['phases'].items())
+    if run.get('counters'):
+        line += " | " + ", ".join(f"{name}={value}" for name, value in run['counters'].items())
+    for error in run.get('errors', [])[:2]:
+        line += f"\n   ⚠️ {error[:150]}"
+    return line
+
+async def jobs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler for /jobs command."""
+    if not await get_user_role(update.effective_user.id, context):
+        await update.message.reply_text("❌ У вас нет доступа к этой команде.")
+        return
+
+    try:
+        if context.args:
+            name = context.args[0]
+            runs = load_runs(job=name, limit=LAST_RUNS)
+            if not runs:
+                await update.message.reply_text(f"Нет записей о запусках задачи «{name}».")
+                return
+            lines = [f"📊 Последние запуски «{name}»:", ""]
+            lines.extend(f"{run['job'][:40]}\n{_format_run(run)}" for run in reversed(runs))
+            # Telegram message limit
+            await update.message.reply_text("\n".join(lines)[:4000])
+            return
+
+        summary = summarize(load_runs())
+        if not summary:
+            await update.message.reply_text("Нет записей о запусках задач.")
+            return
+
+        lines = ["📊 Задачи по расписанию:", ""]
+        # Group the per-slot shift reminder jobs into one line
+        reminder_runs = {name: stats for name, stats in summary.items() if name.startswith('shift_reminder:')}
+        for name, stats in sorted(summary.items()):
+            if name in reminder_runs:
+                continue
+            lines.append(
+                f"{'✅' if stats['last'].get('ok') else '❌'} {name}: {stats['runs']} запусков, "
+                f"ошибок {stats['failed']}, ср. {stats['avg_duration']:.1f}s, макс. {stats['max_duration']:.1f}s"
+                + (f", макс. опоздание {stats['max_lag']:.0f}s" if stats['max_lag'] is not None else "")
+            )
+        if reminder_runs:
+            runs = sum(stats['runs'] for stats in reminder_runs.values())
+            failed = sum(stats['failed'] for stats in reminder_runs.values())
+            max_lag = max((stats['max_lag'] for stats in reminder_runs.values() if stats['max_lag'] is not None), default=None)
+            lines.append(
+                f"⏰ shift_reminder:*: {runs} запусков, ошибок {failed}"
+                + (f", макс. опоздание {max_lag:.0f}s" if max_lag is not None else "")
+            )
+
+        lines.append("")
+        lines.append(f"🗂 Кэш таблиц: {sheet_manager.get_stats()}")
+        lines.append("Подробнее: /jobs <имя задачи>")
+        await update.message.reply_text("\n".join(lines))
+
+    except Exception as e:
+        logger.error(f"Error in /jobs: {e}")
+        await update.message.reply_text(f"❌ Ошибка при получении статистики: {e}")
+
+jobs_command_handler = CommandHandler("jobs", jobs_command)
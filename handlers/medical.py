@@ -11,9 +11,8 @@ from services.medical_service import (
     get_all_roles
 )
 import logging
-import json
-import os
 from datetime import datetime
+from services.storage import storage
 
 logger = logging.getLogger(__name__)
 
@@ -29,19 +28,10 @@ REMOVE_SELECT_EMPLOYEE, REMOVE_CONFIRM = range(20, 22)
 ADMIN_SURNAMES = ["мишра", "анубхав", "ахмитенко", "смолкина", "лемехова"]
 
 def get_user_surname(user_id):
-    users_file = 'data/users.json'
-    if os.path.exists(users_file):
-        try:
-            with open(users_file, 'r', encoding='utf-8') as f:
-                users_db = json.load(f)
-                user_data = users_db.get(str(user_id))
-                if isinstance(user_data, dict):
-                    return user_data.get('surname', '').lower()
-                elif isinstance(user_data, str):
-                    return user_data.lower()
-        except Exception:
-            pass
-    return ""
+    try:
+        return (storage.get_user_name(user_id) or "").lower()
+    except Exception:
+        return ""
 
 def check_permissions(user_id):
     surname = get_user_surname(user_id)
@@ -1,23 +1,16 @@
 import logging
-import json
-import os
 from telegram import Update
 from telegram.ext import ContextTypes, MessageHandler, filters
 from services.message_collector import save_message, save_image
+from services.storage import storage
 
 logger = logging.getLogger(__name__)
 
-GROUP_FILE = 'data/group.json'
-
 def load_group_id():
     """Load the configured group ID."""
-    if not os.path.exists(GROUP_FILE):
-        return None
     try:
-        with open(GROUP_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get('group_id')
-    except:
+        return storage.get_group_id()
+    except Exception:
         return None
 
 async def text_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1,6 +1,6 @@
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters
-from services.sheets import get_preps
+from services.rendered_messages import get_preps_message
 
 DAY_SELECT, TIME_SELECT = range(2)
 
@@ -58,7 +58,7 @@ async def select_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
     day_index = context.user_data['prep_day']
     
     await update.message.reply_text("Загружаю данные...")
-    result = await get_preps(day_index, is_morning)
+    result = await get_preps_message(day_index, is_morning)
     
     # Loop back to day selection instead of main menu
     await update.message.reply_text(result, parse_mode='Markdown')
@@ -1,12 +1,11 @@
-import json
 import os
 import csv
 import httpx
 import io
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+from services.storage import storage
 
-RATINGS_FILE = "data/ratings.json"
 PHOTO_UPLOAD_1 = 0
 PHOTO_UPLOAD_2 = 1
 SCHEDULE_URL = "https://docs.google.com/spreadsheets/d/1hbvUroW0SxAbTbsn0nn-9wJyYKz-zLDJQ_PS7b83SzA/export?format=csv&gid=1833845756"
@@ -15,20 +14,8 @@ SCHEDULE_URL = "https://docs.google.com/spreadsheets/d/1hbvUroW0SxAbTbsn0nn-9wJy
 os.makedirs("data", exist_ok=True)
 
 def load_ratings():
-    if not os.path.exists(RATINGS_FILE):
-        return {"rs": [], "rp": []}
-    with open(RATINGS_FILE, "r") as f:
-        data = json.load(f)
-        # Ensure backward compatibility - convert old format to new
-        if isinstance(data.get("rs"), str) or data.get("rs") is None:
-            data["rs"] = [data["rs"]] if data.get("rs") else []
-        if isinstance(data.get("rp"), str) or data.get("rp") is None:
-            data["rp"] = [data["rp"]] if data.get("rp") else []
-        return data
-
-def save_ratings(data):
-    with open(RATINGS_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    # {"rs": [photo file_id, ...], "rp": [...]}; the old single-photo format is converted on import
+    return storage.get_ratings()
 
 async def get_ratings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = load_ratings()
@@ -136,9 +123,7 @@ async def handle_photo_choice(update: Update, context: ContextTypes.DEFAULT_TYPE
             )
             return ConversationHandler.END
 
-        ratings_data = load_ratings()
-        ratings_data[upload_type] = context.user_data['photos']
-        save_ratings(ratings_data)
+        storage.set_ratings(upload_type, context.user_data['photos'])
         
         name = "РС" if upload_type == 'rs' else "РП"
         await query.edit_message_text(
@@ -158,9 +143,7 @@ async def save_second_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     upload_type = context.user_data.get('upload_type')
     
-    data = load_ratings()
-    data[upload_type] = context.user_data['photos']
-    save_ratings(data)
+    storage.set_ratings(upload_type, context.user_data['photos'])
     
     name = "РС" if upload_type == 'rs' else "РП"
     await update.message.reply_text(
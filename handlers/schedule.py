@@ -1,22 +1,18 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler
 from services.sheets import get_schedule, get_who_on_shift
+from services.storage import storage
 from datetime import datetime, timedelta
 
 async def schedule_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     surname = context.user_data.get('surname')
     
-    # Fallback: Try loading from file if not in context
+    # Fallback: Try loading from storage if not in context
     if not surname:
         try:
-            import json
-            import os
-            if os.path.exists('data/users.json'):
-                with open('data/users.json', 'r', encoding='utf-8') as f:
-                    users = json.load(f)
-                    surname = users.get(str(update.effective_user.id))
-                    if surname:
-                        context.user_data['surname'] = surname
+            surname = storage.get_user_name(update.effective_user.id)
+            if surname:
+                context.user_data['surname'] = surname
         except Exception as e:
             print(f"Error loading user surname: {e}")
 
@@ -117,16 +113,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         surname = context.user_data.get('surname')
         
         if not surname:
-            # Fallback: Try loading from file
+            # Fallback: Try loading from storage
             try:
-                import json
-                import os
-                if os.path.exists('data/users.json'):
-                    with open('data/users.json', 'r', encoding='utf-8') as f:
-                        users = json.load(f)
-                        surname = users.get(str(update.effective_user.id))
-                        if surname:
-                            context.user_data['surname'] = surname
+                surname = storage.get_user_name(update.effective_user.id)
+                if surname:
+                    context.user_data['surname'] = surname
             except:
                 pass
 
@@ -1,29 +1,12 @@
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters, CallbackQueryHandler
 from services.sheets import get_all_employees
-import json
-import os
-
-USERS_FILE = 'data/users.json'
-
-def load_users():
-    if not os.path.exists(USERS_FILE):
-        return {}
-    try:
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return {}
-
-def save_users(users):
-    os.makedirs('data', exist_ok=True)
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
+from services.shift_reminders import request_reconcile
+from services.storage import storage
 
 async def show_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    users = load_users()
-    surname = users.get(str(user.id), 'Сотрудник')
+    surname = storage.get_user_name(user.id) or 'Сотрудник'
     
     keyboard = [
         ["Разморозка", "Заготовки"],
@@ -54,12 +37,10 @@ async def show_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    users = load_users()
+    surname = storage.get_user_name(user.id)
     
     # Check if user is already registered
-    if str(user.id) in users:
-        surname = users[str(user.id)]
-        
+    if surname:
         keyboard = [[InlineKeyboardButton("🔄 Это не я", callback_data="reset_user")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -115,10 +96,8 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if data == "reset_user":
         # Remove user
-        users = load_users()
-        if str(user.id) in users:
-            del users[str(user.id)]
-            save_users(users)
+        if storage.delete_user(user.id):
+            request_reconcile(context.job_queue)
             
         await query.edit_message_text("🔄 Регистрация сброшена.")
         
@@ -149,21 +128,17 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data.startswith("reg_"):
         selected_name = data[4:] # Remove "reg_"
         
-        users = load_users()
-        
-        # Check if name is already taken by another user
-        for chat_id, name in users.items():
-            if name == selected_name and chat_id != str(user.id):
-                await query.edit_message_text(
-                    f"⚠️ **{selected_name}** уже зарегистрирован в системе.\n\n"
-                    "Если это ваш аккаунт, попросите администратора сбросить предыдущую регистрацию.\n"
-                    "Если это не вы, пожалуйста, выберите правильную фамилию.",
-                    parse_mode='Markdown'
-                )
-                return
+        # Fails if the name is already taken by another user (checked in the same transaction)
+        if not storage.register_user(user.id, selected_name):
+            await query.edit_message_text(
+                f"⚠️ **{selected_name}** уже зарегистрирован в системе.\n\n"
+                "Если это ваш аккаунт, попросите администратора сбросить предыдущую регистрацию.\n"
+                "Если это не вы, пожалуйста, выберите правильную фамилию.",
+                parse_mode='Markdown'
+            )
+            return
         
-        users[str(user.id)] = selected_name
-        save_users(users)
+        request_reconcile(context.job_queue)
         
         await query.edit_message_text(f"✅ Вы успешно зарегистрированы как {selected_name}.")
         await show_menu(update, context)
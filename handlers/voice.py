@@ -2,7 +2,6 @@
 Voice message handler for sending audio to group.
 Only available for authorized user (anubhav/мишра).
 """
-import json
 import os
 import logging
 import tempfile
@@ -16,9 +15,10 @@ from telegram.ext import (
     filters,
 )
 
+from services.storage import storage
+
 logger = logging.getLogger(__name__)
 
-GROUP_FILE = 'data/group.json'
 WAITING_FOR_AUDIO = 1
 
 # Authorized user check (by surname in user data)
@@ -26,14 +26,11 @@ AUTHORIZED_SURNAMES = ['мишра']
 
 
 def get_group_id() -> str | None:
-    """Get the saved group ID from file."""
+    """Get the saved group ID from storage."""
     try:
-        if os.path.exists(GROUP_FILE):
-            with open(GROUP_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get('group_id')
+        return storage.get_group_id()
     except Exception as e:
-        logger.error(f"Error reading group file: {e}")
+        logger.error(f"Error reading group id: {e}")
     return None
 
 
@@ -42,13 +39,10 @@ async def is_authorized(update: Update, context: ContextTypes.DEFAULT_TYPE) -> b
     user_id = update.effective_user.id
     surname = context.user_data.get('surname')
     
-    # Try to load from users.json if not in context
+    # Try to load from storage if not in context
     if not surname:
         try:
-            if os.path.exists('data/users.json'):
-                with open('data/users.json', 'r', encoding='utf-8') as f:
-                    users = json.load(f)
-                    surname = users.get(str(user_id))
+            surname = storage.get_user_name(user_id)
         except:
             pass
     
@@ -1,6 +1,5 @@
 import logging
 import logging.handlers
-import signal
 import sys
 from telegram import Update
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, filters, ApplicationHandlerStop
@@ -28,6 +27,29 @@ async def group_restriction_handler(update: Update, context: ContextTypes.DEFAUL
         # Not authorized - Stop processing
         raise ApplicationHandlerStop
 
+async def post_init(application):
+    """
+    Startup hook: open long-lived resources before polling starts.
+    """
+    from services.sheet_manager import sheet_manager
+    from services.message_collector import migrate_legacy_messages
+    from services.storage import storage
+    storage.initialize()
+    await sheet_manager.start()
+    migrate_legacy_messages()
+
+async def post_shutdown(application):
+    """
+    Shutdown hook: release long-lived resources after polling stops.
+    run_polling() handles SIGINT/SIGTERM itself and stops the application, so this is where
+    buffered group messages get written on shutdown.
+    """
+    from services.sheet_manager import sheet_manager
+    from services.message_collector import flush_pending, message_log
+    await sheet_manager.close()
+    flush_pending()
+    message_log.close()
+
 # Production logging setup with file rotation
 import os
 log_dir = 'logs'
@@ -67,14 +89,6 @@ error_handler.setLevel(logging.ERROR)
 error_handler.setFormatter(file_formatter)
 logger.addHandler(error_handler)
 
-# Graceful shutdown handler
-def signal_handler(signum, frame):
-    logger.info(f"Received signal {signum}. Initiating graceful shutdown...")
-    sys.exit(0)
-
-signal.signal(signal.SIGTERM, signal_handler)
-signal.signal(signal.SIGINT, signal_handler)
-
 if __name__ == '__main__':
     logger.info("Starting Dodo Bot...")
     
@@ -83,7 +97,13 @@ if __name__ == '__main__':
         sys.exit(1)
 
     try:
-        application = ApplicationBuilder().token(BOT_TOKEN).build()
+        application = (
+            ApplicationBuilder()
+            .token(BOT_TOKEN)
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
     except Exception as e:
         logger.error(f"Failed to initialize bot application: {e}")
         sys.exit(1)
@@ -102,6 +122,7 @@ if __name__ == '__main__':
     from handlers.worker_instructions import worker_instructions_message_handler, instructions_callback
     from handlers.voice import voice_handler
     from handlers.announce import announce_handler
+    from handlers.job_stats import jobs_command_handler
 
     # Restriction Handler (Group -1)
     # Restrict all commands in groups to Admins/Managers
@@ -134,6 +155,9 @@ if __name__ == '__main__':
     # Command to check who's working today
     application.add_handler(CommandHandler("who", who_command_handler))
     
+    # Command to show scheduled job metrics
+    application.add_handler(jobs_command_handler)
+    
     # Commands to show ratings in group
     application.add_handler(rs_command_handler)
     application.add_handler(rp_command_handler)
@@ -146,27 +170,52 @@ if __name__ == '__main__':
     
     # Add scheduler job
     if application.job_queue:
-        from services.scheduler import check_shifts_and_notify, send_preps_notification, send_who_notification, send_feedback_notification, reset_daily_data_job, send_debug_notification
+        from services.scheduler import send_preps_notification, send_who_notification, send_feedback_notification, reset_daily_data_job, send_debug_notification, prewarm_sheets_job, summarize_feedback_job, flush_message_buffer_job
+        from services.shift_reminders import reconcile_shift_reminders, sync_shift_reminders, RECONCILE_JOB_NAME
+        from services.job_metrics import instrumented
+        from services.job_store import once_per_slot, catch_up_missed
+        from config import SHIFT_SYNC_INTERVAL, FEEDBACK_CHUNK_CHECK_INTERVAL, MESSAGE_BUFFER_FLUSH_INTERVAL
         from datetime import time
         from zoneinfo import ZoneInfo
         
-        # Run every 5 minutes (300 seconds)
-        application.job_queue.run_repeating(check_shifts_and_notify, interval=300, first=10)
+        # Every job is wrapped by instrumented() to record its runs (see /jobs)
+        # Plan shift reminders (1 hour before start) and re-plan when the schedule or users change
+        application.job_queue.run_once(instrumented(reconcile_shift_reminders), 10, name=RECONCILE_JOB_NAME)
+        application.job_queue.run_repeating(instrumented(sync_shift_reminders), interval=SHIFT_SYNC_INTERVAL, first=SHIFT_SYNC_INTERVAL)
         
-        # Schedule preps notifications (Moscow time)
-        # 8:55 and 16:55
-        tz = ZoneInfo('Europe/Moscow')
-        application.job_queue.run_daily(send_preps_notification, time(8, 55, tzinfo=tz), job_kwargs={'misfire_grace_time': 600})
-        application.job_queue.run_daily(send_preps_notification, time(16, 55, tzinfo=tz), job_kwargs={'misfire_grace_time': 600})
+        # Write buffered group messages to disk; not instrumented, a run every few seconds would flood the job history
+        application.job_queue.run_repeating(flush_message_buffer_job, interval=MESSAGE_BUFFER_FLUSH_INTERVAL, first=MESSAGE_BUFFER_FLUSH_INTERVAL)
         
-        # Schedule who's working notification at 8:00
-        application.job_queue.run_daily(send_who_notification, time(8, 0, tzinfo=tz), job_kwargs={'misfire_grace_time': 600})
+        # Summarize group messages in chunks during the day, the 23:05 feedback only merges the summaries
+        application.job_queue.run_repeating(instrumented(summarize_feedback_job), interval=FEEDBACK_CHUNK_CHECK_INTERVAL, first=FEEDBACK_CHUNK_CHECK_INTERVAL)
+        
+        tz = ZoneInfo('Europe/Moscow')
 
-        # Schedule feedback notification at 23:05 (11:05 PM)
-        application.job_queue.run_daily(send_feedback_notification, time(23, 5, tzinfo=tz), job_kwargs={'misfire_grace_time': 600})
+        # Pre-warm sheet cache shortly before the 8:00 / 8:55 / 16:55 posts
+        for warm_time in (time(7, 55, tzinfo=tz), time(8, 50, tzinfo=tz), time(16, 50, tzinfo=tz)):
+            application.job_queue.run_daily(instrumented(prewarm_sheets_job, warm_time), warm_time, job_kwargs={'misfire_grace_time': 300})
+
+        # Daily jobs: (callback, Moscow time, misfire grace, catch-up window after a restart)
+        # Each slot runs once: the state is kept in data/jobs.db, missed slots are caught up on boot
+        daily_jobs = [
+            # Preps notifications at 8:55 and 16:55
+            (send_preps_notification, time(8, 55, tzinfo=tz), 600, 90 * 60),
+            (send_preps_notification, time(16, 55, tzinfo=tz), 600, 90 * 60),
+            # Who's working notification at 8:00
+            (send_who_notification, time(8, 0, tzinfo=tz), 600, 4 * 3600),
+            # Feedback notification at 23:05 (11:05 PM), only until the midnight reset
+            (send_feedback_notification, time(23, 5, tzinfo=tz), 600, 55 * 60),
+            # Daily data cleanup at midnight
+            (reset_daily_data_job, time(0, 0, tzinfo=tz), 600, 12 * 3600),
+        ]
+        catch_up = []
+        for callback, slot_time, grace, window in daily_jobs:
+            job = once_per_slot(callback, slot_time)
+            application.job_queue.run_daily(instrumented(job, slot_time), slot_time, name=job.job_key, job_kwargs={'misfire_grace_time': grace})
+            catch_up.append((job, window))
         
-        # Schedule daily data cleanup at midnight
-        application.job_queue.run_daily(reset_daily_data_job, time(0, 0, tzinfo=tz), job_kwargs={'misfire_grace_time': 600})
+        # Feedback is listed before the reset, so a caught-up feedback still sees the day's messages
+        catch_up_missed(application.job_queue, catch_up, wrap=instrumented)
         
         # DEBUG JOB - Rescheduled to 22:55
         #application.job_queue.run_daily(send_debug_notification, time(22, 50, tzinfo=tz), job_kwargs={'misfire_grace_time': 600})
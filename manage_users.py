@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""List or remove registered users in the bot's storage (`data/bot.db`).
+
+Registrations live in SQLite since data/users.json was imported; editing that file no longer
+changes anything. Use this script instead, e.g. to free a name someone registered by mistake:
+
+    python manage_users.py list
+    python manage_users.py remove <telegram_id | name>
+
+The running bot sees the change within DATA_CACHE_CHECK_INTERVAL seconds (the change counter
+of the users table is bumped), there is no need to restart it.
+"""
+
+import sys
+from services.storage import storage
+
+def list_users():
+    users = storage.get_users()
+    for user_id, name in sorted(users.items(), key=lambda item: item[1]):
+        print(f"{user_id}\t{name}")
+    print(f"{len(users)} registered users")
+
+def remove_user(key: str):
+    users = storage.get_users()
+    if key in users:
+        user_ids = [key]
+    else:
+        user_ids = [user_id for user_id, name in users.items() if name.lower() == key.lower()]
+
+    if not user_ids:
+        print(f"No user with id or name '{key}'")
+        return False
+    for user_id in user_ids:
+        storage.delete_user(user_id)
+        print(f"Removed {user_id} ({users[user_id]})")
+    return True
+
+def main():
+    if len(sys.argv) == 2 and sys.argv[1] == 'list':
+        list_users()
+    elif len(sys.argv) == 3 and sys.argv[1] == 'remove':
+        if not remove_user(sys.argv[2]):
+            sys.exit(1)
+    else:
+        print(__doc__)
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
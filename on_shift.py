@@ -14,6 +14,7 @@ import json
 import os
 from datetime import datetime
 from services.sheets import get_shifts_for_date
+from services.atomic_file import write_json
 
 NOT_SUBSCRIBED_PATH = os.path.join(os.path.dirname(__file__), "data", "not_subscribed.json")
 OUTPUT_PATH = os.path.join(os.path.dirname(__file__), "data", "on_shift.json")
@@ -29,8 +30,7 @@ async def main():
     
     if not shifts_today:
         print(f"No shifts found for {today}")
-        with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
+        write_json(OUTPUT_PATH, [], indent=2)
         return
     
     # Extract employee names from shifts
@@ -76,8 +76,7 @@ async def main():
     on_shift_not_subscribed.sort(key=lambda x: (role_priority.get(x['role'], 99), x['name']))
     
     # Write result to JSON file
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(on_shift_not_subscribed, f, ensure_ascii=False, indent=2)
+    write_json(OUTPUT_PATH, on_shift_not_subscribed, indent=2)
     
     print(f"\n✅ Found {len(on_shift_not_subscribed)} employees on shift today who are NOT subscribed")
     print(f"📁 Saved to {OUTPUT_PATH}")
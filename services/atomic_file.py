@@ -0,0 +1,73 @@
+"""
+Crash-safe file writes.
+
+atomic_write() writes to a temp file in the target's directory, fsyncs it and renames it over the
+target, so readers see either the old or the new content, never a truncated file, even if the
+process dies mid-write. Writers in different processes (the bot, the web app, on_shift.py) are
+serialized with an flock on "<target>.lock"; the lock is held only around the write itself and
+uncontended it costs one open() and flock(). Readers need no lock: the rename is atomic.
+
+Caches that only ever hold a complete copy of something (sheet cache, processed images) can pass
+lock=False: whichever writer renames last wins, and any complete version is right.
+"""
+import json
+import logging
+import os
+import stat
+import tempfile
+from contextlib import contextmanager, nullcontext
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no flock, writes are still atomic
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_SUFFIX = '.lock'
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive cross-process lock on `path` (held on "<path>.lock"), for read-modify-write sequences."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + LOCK_SUFFIX, 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'w', lock: bool = True, encoding: str = 'utf-8'):
+    """
+    File object whose content replaces `path` when the block exits without an exception.
+    On an exception the target is left untouched and the temp file removed.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    with file_lock(path) if lock else nullcontext():
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+        try:
+            # mkstemp creates the file as 0600: keep the target's permissions
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode) if os.path.exists(path) else 0o644)
+            with os.fdopen(fd, mode, encoding=None if 'b' in mode else encoding) as f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+def write_json(path: str, data, lock: bool = True, **dump_kwargs):
+    """json.dump `data` to `path` atomically (ensure_ascii=False unless overridden)."""
+    dump_kwargs.setdefault('ensure_ascii', False)
+    with atomic_write(path, lock=lock) as f:
+        json.dump(data, f, **dump_kwargs)
@@ -26,16 +26,12 @@ async def get_user_role(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> str
     
     if not surname:
         try:
-            import json
-            import os
-            if os.path.exists('data/users.json'):
-                with open('data/users.json', 'r', encoding='utf-8') as f:
-                    users = json.load(f)
-                    surname = users.get(str(user_id))
-                    if surname:
-                        context.user_data['surname'] = surname
-        except:
-            pass
+            from services.storage import storage
+            surname = storage.get_user_name(user_id)
+            if surname:
+                context.user_data['surname'] = surname
+        except Exception as e:
+            logger.error(f"Error loading user surname: {e}")
             
     if not surname:
         return None
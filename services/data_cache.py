@@ -0,0 +1,93 @@
+"""
+In-process cache of parsed config and state data.
+
+Hot handlers used to open and parse a JSON file (group.json, defrost, preps config, ...) on every
+update. Here each value is cached under a key (a file path, or a storage table) together with a
+cheap version token: the file's mtime and size, or the table's change counter. The version is
+re-checked at most once per DATA_CACHE_CHECK_INTERVAL seconds per key, so most lookups are a dict
+access without any syscall; the value is reloaded only when the version changed. Writes done by
+this process invalidate their keys right away (see Storage._bump), so only changes made by other
+processes or by hand are seen with up to that delay. A throttled stat is used instead of inotify:
+it needs no extra dependency and works the same on every platform.
+
+Cached values are shared: callers must treat them as read-only.
+"""
+import json
+import logging
+import os
+import threading
+import time as time_module
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from config import DATA_CACHE_CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+class DataCache:
+    def __init__(self, check_interval: float = DATA_CACHE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        # key -> (value, version, monotonic time of the last version check)
+        self._entries: Dict[Hashable, Tuple[Any, Any, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, key: Hashable, version: Callable[[], Any], load: Callable[[], Any]) -> Any:
+        """
+        Cached value of `key`. version() returns a cheap token of the source's state, load() the
+        value; load() runs only when there is no entry yet or the token changed.
+        """
+        now = time_module.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[2] < self.check_interval:
+            self.hits += 1
+            return entry[0]
+
+        current = version()
+        if entry is not None and entry[1] == current:
+            with self._lock:
+                self._entries[key] = (entry[0], current, now)
+            self.hits += 1
+            return entry[0]
+
+        value = load()
+        with self._lock:
+            self._entries[key] = (value, current, now)
+        self.loads += 1
+        return value
+
+    def get_file(self, path: str, load: Optional[Callable[[str], Any]] = None, default: Any = None) -> Any:
+        """Parsed content of a file (JSON unless `load` is given), or `default` if it is missing or broken."""
+        def version():
+            try:
+                stat = os.stat(path)
+                return stat.st_mtime_ns, stat.st_size
+            except OSError:
+                return None
+
+        def load_file():
+            if not os.path.exists(path):
+                return default
+            try:
+                if load:
+                    return load(path)
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading {path}: {e}")
+                return default
+
+        return self.get(('file', os.path.abspath(path)), version, load_file)
+
+    def invalidate(self, prefix: Optional[Tuple] = None):
+        """Drop the entries whose key starts with `prefix` (a tuple), or everything."""
+        with self._lock:
+            if prefix is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if isinstance(key, tuple) and key[:len(prefix)] == prefix]:
+                del self._entries[key]
+
+    def get_stats(self) -> str:
+        return f"{len(self._entries)} entries, {self.hits} hits, {self.loads} loads"
+
+data_cache = DataCache()
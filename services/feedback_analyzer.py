@@ -1,132 +1,280 @@
+import asyncio
+import json
 import logging
 import os
 import base64
 from datetime import datetime
 import pytz
-from config import OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_MODEL
-from services.message_collector import get_daily_data
+from config import (OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_MODEL, OPENAI_TIMEOUT, OPENAI_MAX_RETRIES, FEEDBACK_ANALYSIS_DEADLINE,
+                    LLM_IMAGE_DAILY_BUDGET, LLM_IMAGE_CHUNK_BUDGET, FEEDBACK_CHUNK_MESSAGES, FEEDBACK_CHUNK_MAX_AGE)
+from services.message_collector import get_daily_data, get_current_date, MESSAGES_DIR
+from services.image_pipeline import prepare_images
+from services.atomic_file import atomic_write, write_json
 
 logger = logging.getLogger(__name__)
 
 FEEDBACK_FILE = 'data/feedback.text'
+PARTIALS_PREFIX = 'partial_summaries_'
+SYSTEM_PROMPT = "Ты - Dodo_bot, аналитик обратной связи для пиццерии Додо Пицца."
+
+# Chunk summarization and the nightly merge must not work on the partials at the same time
+_summarize_lock = asyncio.Lock()
+
+def _api_key_configured():
+    return bool(OPENAI_API_KEY) and OPENAI_API_KEY != 'your_openai_api_key_here'
+
+def _create_client():
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        base_url=OPENAI_BASE_URL,
+        timeout=OPENAI_TIMEOUT,
+        max_retries=OPENAI_MAX_RETRIES,
+    )
+
+async def _complete(client, content_parts, max_tokens):
+    response = await client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": content_parts}
+        ],
+        max_tokens=max_tokens,
+        temperature=0.7,
+    )
+    return response.choices[0].message.content
+
+def split_messages(messages):
+    """Split collected messages into text messages and image infos for the prompts."""
+    text_messages = []
+    image_data = []
+
+    for msg in messages:
+        if msg.get('type') == 'image':
+            image_data.append({
+                'user': f"{msg.get('first_name', '')} {msg.get('last_name', '')}".strip(),
+                'caption': msg.get('caption', ''),
+                'timestamp': msg.get('timestamp', ''),
+                'file_path': msg.get('file_path', '')
+            })
+        elif msg.get('text'):
+            text_messages.append({
+                'user': f"{msg.get('first_name', '')} {msg.get('last_name', '')}".strip(),
+                'text': msg.get('text', ''),
+                'timestamp': msg.get('timestamp', '')
+            })
+    return text_messages, image_data
+
+def get_partials_file(date_str=None):
+    """Path to the partial summaries of a day (today by default), next to its messages file."""
+    return os.path.join(MESSAGES_DIR, f'{PARTIALS_PREFIX}{date_str or get_current_date()}.json')
+
+def load_partials(date_str=None):
+    """
+    Partial summaries of the day, in order. Each covers messages[start:end] of the daily messages:
+    {'start', 'end', 'from', 'to', 'text_count', 'image_count', 'images', 'image_hashes', 'summary'}
+    """
+    filepath = get_partials_file(date_str)
+    if not os.path.exists(filepath):
+        return []
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading partial summaries from {filepath}: {e}")
+        return []
+
+def save_partials(partials, date_str=None):
+    filepath = get_partials_file(date_str)
+    try:
+        write_json(filepath, partials, indent=2)
+    except Exception as e:
+        logger.error(f"Error saving partial summaries to {filepath}: {e}")
+
+def _save_feedback(summary):
+    with atomic_write(FEEDBACK_FILE) as f:
+        f.write(summary)
+
+def _chunk_is_due(messages, start):
+    """Enough new messages for a chunk, or the oldest unsummarized one waited FEEDBACK_CHUNK_MAX_AGE."""
+    if len(messages) - start >= FEEDBACK_CHUNK_MESSAGES:
+        return True
+    try:
+        oldest = datetime.fromisoformat(messages[start]['timestamp'])
+        return (datetime.now(oldest.tzinfo) - oldest).total_seconds() >= FEEDBACK_CHUNK_MAX_AGE
+    except (KeyError, TypeError, ValueError):
+        return True
+
+async def _summarize_chunk(client, messages, start, end, seen_hashes, image_budget):
+    """Summarize messages[start:end] into a partial summary."""
+    text_messages, image_data = split_messages(messages[start:end])
+    images = await asyncio.to_thread(prepare_images, image_data, image_budget, seen_hashes)
+
+    content_parts = [{"type": "text", "text": create_chunk_prompt(text_messages, [img_info for img_info, _, _ in images])}]
+    content_parts.extend(await asyncio.to_thread(encode_images, images))
+    summary = await _complete(client, content_parts, max_tokens=700)
+
+    return {
+        'start': start,
+        'end': end,
+        'from': messages[start].get('timestamp', ''),
+        'to': messages[end - 1].get('timestamp', ''),
+        'text_count': len(text_messages),
+        'image_count': len(image_data),
+        'images': len(images),
+        'image_hashes': list(seen_hashes),
+        'summary': summary
+    }
+
+def chunk_image_budget(partials):
+    """Photos the next chunk may send: LLM_IMAGE_CHUNK_BUDGET, within what is left of the daily budget."""
+    remaining = LLM_IMAGE_DAILY_BUDGET - sum(p.get('images', 0) for p in partials)
+    return max(0, min(LLM_IMAGE_CHUNK_BUDGET, remaining))
+
+async def _summarize_pending(client, messages, partials, final):
+    """Add partial summaries for the messages not covered yet. Returns the number of new partials."""
+    done = partials[-1]['end'] if partials else 0
+    if done >= len(messages) or (not final and not _chunk_is_due(messages, done)):
+        return 0
+
+    seen_hashes = list(partials[-1].get('image_hashes', [])) if partials else []
+    added = 0
+    while done < len(messages):
+        end = min(done + FEEDBACK_CHUNK_MESSAGES, len(messages))
+        # A trailing chunk smaller than N waits for more messages, except for the nightly merge
+        if not final and end - done < FEEDBACK_CHUNK_MESSAGES and added:
+            break
+        image_budget = chunk_image_budget(partials)
+        partials.append(await _summarize_chunk(client, messages, done, end, seen_hashes, image_budget))
+        # Saved after every chunk, so a failed later chunk doesn't lose the earlier ones
+        await asyncio.to_thread(save_partials, partials)
+        added += 1
+        done = end
+
+    logger.info(f"Summarized messages up to #{done} into {added} new partial summaries ({len(partials)} today)")
+    return added
+
+async def summarize_pending_messages(final=False):
+    """
+    Summarize the day's new group messages into partial summaries (data/messages/partial_summaries_<date>.json).
+    Runs when FEEDBACK_CHUNK_MESSAGES new messages accumulated or the oldest of them is FEEDBACK_CHUNK_MAX_AGE old;
+    final=True summarizes whatever is left. Returns the number of new partials.
+    """
+    if not _api_key_configured():
+        return 0
+
+    async with _summarize_lock:
+        messages = await asyncio.to_thread(get_daily_data)
+        partials = await asyncio.to_thread(load_partials)
+        if not messages or (partials and partials[-1]['end'] >= len(messages)):
+            return 0
+
+        client = None
+        try:
+            client = _create_client()
+            return await _summarize_pending(client, messages, partials, final)
+        except Exception as e:
+            logger.error(f"Error summarizing feedback messages: {e}")
+            return 0
+        finally:
+            if client is not None:
+                await client.close()
 
 async def analyze_feedback():
     """
     Analyze collected messages using OpenAI-compatible LLM and generate feedback summary.
     Saves result to data/feedback.text.
+
+    The messages are summarized in chunks during the day (summarize_pending_messages): only the
+    remaining tail is summarized now and the partial summaries are merged into the final post,
+    which keeps the nightly request small.
     """
     try:
-        if not OPENAI_API_KEY or OPENAI_API_KEY == 'your_openai_api_key_here':
+        if not _api_key_configured():
             logger.warning("OpenAI API key not configured. Skipping feedback analysis.")
             return False
         
         # Get today's collected messages
-        messages = get_daily_data()
+        messages = await asyncio.to_thread(get_daily_data)
         
         if not messages:
             logger.info("No messages collected today. Skipping feedback analysis.")
             return False
         
-        # Filter and prepare messages for analysis
-        text_messages = []
-        image_data = []
-        
-        for msg in messages:
-            if msg.get('type') == 'image':
-                image_data.append({
-                    'user': f"{msg.get('first_name', '')} {msg.get('last_name', '')}".strip(),
-                    'caption': msg.get('caption', ''),
-                    'timestamp': msg.get('timestamp', ''),
-                    'file_path': msg.get('file_path', '')
-                })
-            elif msg.get('text'):
-                text_messages.append({
-                    'user': f"{msg.get('first_name', '')} {msg.get('last_name', '')}".strip(),
-                    'text': msg.get('text', ''),
-                    'timestamp': msg.get('timestamp', '')
-                })
-        
         # Call OpenAI API
+        client = None
         try:
-            from openai import OpenAI
-            
-            client = OpenAI(
-                api_key=OPENAI_API_KEY,
-                base_url=OPENAI_BASE_URL,
-            )
+            client = _create_client()
             
-            # Build message content (text + images for vision models)
-            prompt_text = create_analysis_prompt(text_messages, image_data)
+            async with _summarize_lock:
+                partials = await asyncio.to_thread(load_partials)
+                
+                await _summarize_pending(client, messages, partials, final=True)
+                content_parts = [{"type": "text", "text": create_merge_prompt(partials)}]
             
-            # Build content parts for the user message
-            content_parts = [{"type": "text", "text": prompt_text}]
+            summary = await _complete(client, content_parts, max_tokens=2000)
             
-            # Add images as base64 for vision-capable models
-            for img_info in image_data:
-                file_path = img_info.get('file_path')
-                if file_path and os.path.exists(file_path):
-                    try:
-                        with open(file_path, 'rb') as img_file:
-                            img_bytes = img_file.read()
-                        b64_image = base64.b64encode(img_bytes).decode('utf-8')
-                        
-                        # Determine mime type
-                        ext = os.path.splitext(file_path)[1].lower()
-                        mime_map = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.gif': 'image/gif', '.webp': 'image/webp'}
-                        mime_type = mime_map.get(ext, 'image/jpeg')
-                        
-                        content_parts.append({
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{mime_type};base64,{b64_image}"
-                            }
-                        })
-                        
-                        # Add context for this image
-                        img_context = f"\n[Изображение от {img_info['user']} в {img_info['timestamp']}"
-                        if img_info['caption']:
-                            img_context += f", подпись: {img_info['caption']}"
-                        img_context += "]"
-                        content_parts.append({"type": "text", "text": img_context})
-                        
-                    except Exception as e:
-                        logger.warning(f"Could not load image {file_path}: {e}")
+            # Save to feedback.text (fsynced, so off the event loop)
+            await asyncio.to_thread(_save_feedback, summary)
             
-            # Generate response
-            response = client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "Ты - Dodo_bot, аналитик обратной связи для пиццерии Додо Пицца."},
-                    {"role": "user", "content": content_parts}
-                ],
-                max_tokens=2000,
-                temperature=0.7,
-            )
-            
-            summary = response.choices[0].message.content
-            
-            # Save to feedback.text
-            with open(FEEDBACK_FILE, 'w', encoding='utf-8') as f:
-                f.write(summary)
-            
-            logger.info(f"Feedback analysis completed with {len(image_data)} images. Summary saved to {FEEDBACK_FILE}")
+            logger.info(f"Feedback analysis completed with {len(partials)} partial summaries. Summary saved to {FEEDBACK_FILE}")
             return True
             
         except Exception as e:
             logger.error(f"Error calling OpenAI API: {e}")
             return False
+        finally:
+            if client is not None:
+                await client.close()
         
     except Exception as e:
         logger.error(f"Error in analyze_feedback: {e}")
         return False
 
-def create_analysis_prompt(text_messages, image_data):
-    """Create the prompt for LLM analysis."""
-    
+async def run_feedback_analysis(deadline: float = FEEDBACK_ANALYSIS_DEADLINE) -> bool:
+    """
+    Run analyze_feedback as a background task and wait for it at most `deadline` seconds.
+    On timeout the task (and its pending LLM request) is cancelled and False is returned,
+    so the caller can fall back to the raw messages.
+    """
+    task = asyncio.create_task(analyze_feedback())
+    try:
+        return await asyncio.wait_for(task, timeout=deadline)
+    except asyncio.TimeoutError:
+        logger.error(f"Feedback analysis did not finish within {deadline:.0f}s, cancelled")
+        return False
+
+def encode_images(images):
+    """
+    Base64-encode prepared images (see prepare_images) into chat content parts (blocking, run in a thread).
+    Each image is followed by a text part with its author, time and caption.
+    """
+    content_parts = []
+    for img_info, img_bytes, mime_type in images:
+        b64_image = base64.b64encode(img_bytes).decode('utf-8')
+        
+        content_parts.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:{mime_type};base64,{b64_image}"
+            }
+        })
+        
+        # Add context for this image
+        img_context = f"\n[Изображение от {img_info['user']} в {img_info['timestamp']}"
+        if img_info['caption']:
+            img_context += f", подпись: {img_info['caption']}"
+        img_context += "]"
+        content_parts.append({"type": "text", "text": img_context})
+    return content_parts
+
+def _analysis_instructions():
+    """Task and structure of the final post, the opening of the merge prompt."""
     tz = pytz.timezone('Europe/Moscow')
     today = datetime.now(tz).strftime("%d.%m.%Y")
     
-    prompt = f"""Ты - Dodo_bot, аналитик обратной связи для пиццерии Додо Пицца. 
+    return f"""Ты - Dodo_bot, аналитик обратной связи для пиццерии Додо Пицца. 
 
 Твоя задача - проанализировать сообщения и изображения из рабочей группы за {today} и создать краткое резюме для команды.
 
@@ -146,24 +294,54 @@ def create_analysis_prompt(text_messages, image_data):
 3. Основные проблемы и жалобы (если есть)
 4. Конкретные рекомендации по улучшению
 5. Мотивирующее заключение
+"""
 
-**Собранные текстовые сообщения ({len(text_messages)} шт.):**
+ANSWER_FORMAT = """
+
+**Твой ответ должен быть готов к отправке в группу (НЕ включай заголовки типа "Анализ за..." или технические детали).**
+
+Начни с эмодзи и приветствия (например: "👋 *Привет, команда*! Dodo_bot на связи."), затем сразу к аналитике.
+Используй Markdown форматирование (жирный текст *текст*, курсив _текст_).
+Escape специальных символов для Telegram Markdown при необходимости (например, _ в Dodo\\_bot).
+"""
+
+def create_chunk_prompt(text_messages, image_data):
+    """Prompt for the summary of one chunk of the day's messages (an intermediate note, not a post)."""
+    
+    prompt = f"""Ты готовишь заметки для вечернего резюме рабочей группы пиццерии. Ниже часть сообщений за день.
+
+Выпиши кратко, по пунктам, только факты, важные для итогового резюме:
+- проблемы, жалобы, ошибки (кто, когда, что случилось)
+- что было хорошего
+- что видно на изображениях (качество продукции, чистота, проблемы)
+
+Без приветствий и выводов, не больше 15 пунктов. Если ничего важного нет, ответь "Ничего важного".
+
+**Текстовые сообщения ({len(text_messages)} шт.):**
 """
     
     for i, msg in enumerate(text_messages, 1):
         prompt += f"\n{i}. [{msg['user']}] {msg['timestamp']}: {msg['text']}"
     
     if image_data:
-        prompt += f"\n\n**Также получено изображений: {len(image_data)} шт.**"
-        prompt += "\n(Изображения прикреплены ниже для визуального анализа. Проанализируй их содержимое!)"
+        prompt += f"\n\n**Изображения ({len(image_data)} шт.) прикреплены ниже.**"
     
-    prompt += """
-
-**Твой ответ должен быть готов к отправке в группу (НЕ включай заголовки типа "Анализ за..." или технические детали).**
+    return prompt
 
-Начни с эмодзи и приветствия (например: "👋 *Привет, команда*! Dodo_bot на связи."), затем сразу к аналитике.
-Используй Markdown форматирование (жирный текст *текст*, курсив _текст_).
-Escape специальных символов для Telegram Markdown при необходимости (например, _ в Dodo\\_bot).
+def create_merge_prompt(partials):
+    """Prompt for the final post built from the partial summaries of the day."""
+    
+    text_count = sum(p.get('text_count', 0) for p in partials)
+    image_count = sum(p.get('image_count', 0) for p in partials)
+    
+    prompt = _analysis_instructions()
+    prompt += f"""
+Сообщения за день уже разобраны по частям. Ниже заметки по каждому периоду (всего {text_count} текстовых сообщений и {image_count} изображений):
 """
     
+    for p in partials:
+        prompt += f"\n**{p.get('from', '')[11:16]}–{p.get('to', '')[11:16]}:**\n{p.get('summary', '')}\n"
+    
+    prompt += ANSWER_FORMAT
+    
     return prompt
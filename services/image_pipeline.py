@@ -0,0 +1,185 @@
+"""
+Preprocessing of the collected group photos before they are sent to the LLM.
+
+Each photo is downscaled to LLM_IMAGE_MAX_EDGE, recompressed as JPEG and fingerprinted with a
+difference hash (dHash). Near-duplicates (e.g. the same pizza shot three times) are dropped and
+at most LLM_IMAGE_DAILY_BUDGET photos are kept, spread over the day. The processed image and its
+hash are cached next to the original ("<photo>.llm.jpg" / "<photo>.llm.json"), so reruns of the
+analysis don't process anything again.
+"""
+import io
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+from services.atomic_file import atomic_write, write_json
+from config import LLM_IMAGE_MAX_EDGE, LLM_IMAGE_QUALITY, LLM_IMAGE_DAILY_BUDGET, LLM_IMAGE_DUPLICATE_DISTANCE
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+PROCESSED_SUFFIX = '.llm.jpg'
+META_SUFFIX = '.llm.json'
+
+# Leading bytes of the formats vision models accept, for originals sent without Pillow
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+def dhash(image, hash_size: int = 8) -> int:
+    """Difference hash: compares neighbouring pixels of a tiny grayscale copy. Similar images differ in few bits."""
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+def _params() -> Dict:
+    return {'max_edge': LLM_IMAGE_MAX_EDGE, 'quality': LLM_IMAGE_QUALITY}
+
+def process_image(file_path: str) -> Optional[Tuple[bytes, int]]:
+    """
+    Downscaled JPEG bytes and dHash of one photo, from the sidecar cache when the original and the
+    settings are unchanged. None if the file can't be read.
+    """
+    processed_path = file_path + PROCESSED_SUFFIX
+    meta_path = file_path + META_SUFFIX
+
+    try:
+        source_mtime = os.path.getmtime(file_path)
+    except OSError:
+        return None
+
+    if os.path.exists(meta_path) and os.path.exists(processed_path):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('source_mtime') == source_mtime and meta.get('params') == _params():
+                with open(processed_path, 'rb') as f:
+                    return f.read(), meta['dhash']
+        except Exception as e:
+            logger.warning(f"Ignoring broken image cache for {file_path}: {e}")
+
+    try:
+        with Image.open(file_path) as original:
+            image = ImageOps.exif_transpose(original).convert('RGB')
+        image.thumbnail((LLM_IMAGE_MAX_EDGE, LLM_IMAGE_MAX_EDGE), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=LLM_IMAGE_QUALITY, optimize=True)
+        data = buffer.getvalue()
+        fingerprint = dhash(image)
+    except Exception as e:
+        logger.warning(f"Could not process image {file_path}: {e}")
+        return None
+
+    try:
+        # Cache files: no lock, any complete copy is right
+        with atomic_write(processed_path, 'wb', lock=False) as f:
+            f.write(data)
+        write_json(meta_path, {'source_mtime': source_mtime, 'params': _params(), 'dhash': fingerprint,
+                               'size': [image.width, image.height], 'bytes': len(data)}, lock=False)
+    except Exception as e:
+        logger.warning(f"Could not cache processed image {file_path}: {e}")
+
+    return data, fingerprint
+
+def _read_original(file_path: str, size: int = -1) -> Optional[bytes]:
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(size)
+    except OSError:
+        return None
+
+def detect_mime_type(data: bytes) -> Optional[str]:
+    """MIME type of image bytes from their signature, None if it isn't a supported format."""
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+def _spread(items: List, budget: int) -> List:
+    """Keep `budget` items evenly spread over the list (the day), preserving order."""
+    if len(items) <= budget:
+        return items
+    if budget <= 0:
+        return []
+    step = len(items) / budget
+    return [items[int(i * step)] for i in range(budget)]
+
+def prepare_images(image_data: List[Dict], budget: int = LLM_IMAGE_DAILY_BUDGET,
+                   seen_hashes: Optional[List[int]] = None) -> List[Tuple[Dict, bytes, str]]:
+    """
+    Select and preprocess the day's photos for the LLM (blocking, run in a thread).
+    image_data: [{'file_path', ...}] in chronological order.
+    seen_hashes: hashes of photos already analyzed earlier in the day (partial summaries); photos close
+    to them are dropped as well, and the hashes of the photos selected now are appended to the list.
+    Returns [(image info, image bytes, mime type)] without near-duplicates and within the budget.
+    """
+    if Image is None:
+        # Pillow missing: no resizing or dedup, only the budget applies
+        logger.warning("Pillow is not installed, sending original images")
+        # The type comes from the file's first bytes; files that aren't a supported image are left out
+        candidates = []
+        for img_info in image_data:
+            header = _read_original(img_info['file_path'], 12) if img_info.get('file_path') else None
+            if not header:
+                continue
+            mime_type = detect_mime_type(header)
+            if mime_type is None:
+                logger.warning(f"Skipping {img_info['file_path']}: not a JPEG, PNG, GIF or WebP image")
+                continue
+            candidates.append((img_info, mime_type))
+
+        selected = []
+        for img_info, mime_type in _spread(candidates, budget):
+            data = _read_original(img_info['file_path'])
+            if data:
+                selected.append((img_info, data, mime_type))
+        return selected
+
+    unique = []
+    hashes = list(seen_hashes or [])
+    duplicates = 0
+    for img_info in image_data:
+        file_path = img_info.get('file_path')
+        if not file_path or not os.path.exists(file_path):
+            continue
+        processed = process_image(file_path)
+        if not processed:
+            continue
+        data, fingerprint = processed
+        if any(hamming(fingerprint, seen) <= LLM_IMAGE_DUPLICATE_DISTANCE for seen in hashes):
+            duplicates += 1
+            continue
+        hashes.append(fingerprint)
+        unique.append(((img_info, data, 'image/jpeg'), fingerprint))
+
+    chosen = _spread(unique, budget)
+    selected = [item for item, _ in chosen]
+    # Photos over budget weren't analyzed: similar photos later in the day still count as new
+    if seen_hashes is not None:
+        seen_hashes.extend(fingerprint for _, fingerprint in chosen)
+
+    logger.info(
+        f"Images for analysis: {len(selected)} of {len(image_data)} "
+        f"({duplicates} near-duplicates, {len(unique) - len(selected)} over budget), "
+        f"{sum(len(item[1]) for item in selected) // 1024} KB"
+    )
+    return selected
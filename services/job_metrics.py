@@ -0,0 +1,175 @@
+"""
+Execution metrics for JobQueue jobs.
+
+Every scheduled job is registered through instrumented(), which records one run per execution:
+start time, duration, misfire lag (how late it started vs. its slot), phase timings, counters
+(sheets fetched, messages sent, ...) and errors. Jobs and the services they call add details with
+phase() and count() - both are no-ops outside of a job run. Runs are appended to a rolling JSONL
+file (JOB_RUNS_FILE) and summarized by /jobs.
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import time as time_module
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+from config import JOB_RUNS_FILE, JOB_RUNS_MAX_BYTES
+from services.atomic_file import atomic_write, file_lock
+
+logger = logging.getLogger(__name__)
+
+TZ = ZoneInfo('Europe/Moscow')
+
+# Record of the job run in progress in the current task, if any
+_current_run: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar('job_run', default=None)
+
+class _RunErrorHandler(logging.Handler):
+    """Attaches ERROR log records to the job run they happened in (jobs log and swallow their errors)."""
+
+    def emit(self, record):
+        run = _current_run.get()
+        if run is not None and len(run['errors']) < 10:
+            run['errors'].append(record.getMessage()[:300])
+
+_error_handler = None
+
+def _install_error_handler():
+    global _error_handler
+    if _error_handler is None:
+        _error_handler = _RunErrorHandler(level=logging.ERROR)
+        logging.getLogger().addHandler(_error_handler)
+
+@contextmanager
+def phase(name: str):
+    """Time a phase (fetch/parse/render/send/...) of the current job run."""
+    run = _current_run.get()
+    if run is None:
+        yield
+        return
+    started = time_module.perf_counter()
+    try:
+        yield
+    finally:
+        run['phases'][name] = round(run['phases'].get(name, 0) + time_module.perf_counter() - started, 3)
+
+def count(name: str, amount: int = 1):
+    """Increment a counter of the current job run."""
+    run = _current_run.get()
+    if run is not None:
+        run['counters'][name] = run['counters'].get(name, 0) + amount
+
+def _misfire_lag(context, slot: Optional[time], started: datetime) -> Optional[float]:
+    """Seconds between the planned start and the actual start, if the plan is known."""
+    planned = None
+    data = getattr(getattr(context, 'job', None), 'data', None)
+    if isinstance(data, dict) and isinstance(data.get('fire_at'), datetime):
+        planned = data['fire_at']
+    elif slot is not None:
+        local = started.astimezone(slot.tzinfo or TZ)
+        planned = local.replace(hour=slot.hour, minute=slot.minute, second=slot.second, microsecond=0)
+        # Latest occurrence of the slot (a catch-up after midnight belongs to yesterday's slot)
+        if planned > local:
+            planned -= timedelta(days=1)
+    if planned is None:
+        return None
+    return round((started - planned).total_seconds(), 3)
+
+def instrumented(callback, slot: Optional[time] = None):
+    """
+    Wrap a job callback so that each run is recorded.
+    slot: the daily time the job is scheduled for, to measure misfire lag. Jobs whose data
+    carries a 'fire_at' datetime (shift reminders) are measured against that instead.
+    """
+    _install_error_handler()
+
+    @functools.wraps(callback)
+    async def wrapper(context):
+        started_at = datetime.now(TZ)
+        job = getattr(context, 'job', None)
+        run = {
+            'job': getattr(job, 'name', None) or callback.__name__,
+            'started': started_at.isoformat(timespec='seconds'),
+            'lag': _misfire_lag(context, slot, started_at),
+            'duration': None,
+            'ok': True,
+            'phases': {},
+            'counters': {},
+            'errors': []
+        }
+        token = _current_run.set(run)
+        started = time_module.perf_counter()
+        try:
+            return await callback(context)
+        except Exception as e:
+            run['errors'].append(f"{type(e).__name__}: {e}"[:300])
+            raise
+        finally:
+            _current_run.reset(token)
+            run['duration'] = round(time_module.perf_counter() - started, 3)
+            run['ok'] = not run['errors']
+            await asyncio.to_thread(record_run, run)
+
+    return wrapper
+
+def record_run(run: Dict):
+    """Append a run to the rolling store; the oldest half is dropped once it exceeds JOB_RUNS_MAX_BYTES."""
+    try:
+        os.makedirs(os.path.dirname(JOB_RUNS_FILE) or '.', exist_ok=True)
+        # One lock around the append and the trim, so a run appended by another process can't be
+        # lost between the trim's read and its replace
+        with file_lock(JOB_RUNS_FILE):
+            with open(JOB_RUNS_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(run, ensure_ascii=False) + '\n')
+
+            if os.path.getsize(JOB_RUNS_FILE) > JOB_RUNS_MAX_BYTES:
+                with open(JOB_RUNS_FILE, 'r', encoding='utf-8') as f:
+                    lines = f.readlines()
+                with atomic_write(JOB_RUNS_FILE, lock=False) as f:
+                    f.writelines(lines[len(lines) // 2:])
+    except Exception as e:
+        # Not logger.error: that would be attached to the next run as an error
+        logger.warning(f"Error recording job run: {e}")
+
+def load_runs(job: str = None, limit: int = None) -> List[Dict]:
+    """Recorded runs, oldest first, optionally only of one job (substring match) and only the last `limit`."""
+    runs = []
+    if not os.path.exists(JOB_RUNS_FILE):
+        return runs
+    try:
+        with open(JOB_RUNS_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    run = json.loads(line)
+                except ValueError:
+                    continue
+                if job and job not in run.get('job', ''):
+                    continue
+                runs.append(run)
+    except Exception as e:
+        logger.warning(f"Error reading job runs: {e}")
+    return runs[-limit:] if limit else runs
+
+def summarize(runs: List[Dict]) -> Dict[str, Dict]:
+    """Per job: runs, failures, average/max duration, max lag and the last run."""
+    summary = {}
+    for run in runs:
+        stats = summary.setdefault(run['job'], {
+            'runs': 0, 'failed': 0, 'total_duration': 0.0, 'max_duration': 0.0, 'max_lag': None, 'last': None
+        })
+        duration = run.get('duration') or 0.0
+        stats['runs'] += 1
+        stats['failed'] += 0 if run.get('ok') else 1
+        stats['total_duration'] += duration
+        stats['max_duration'] = max(stats['max_duration'], duration)
+        if run.get('lag') is not None:
+            stats['max_lag'] = run['lag'] if stats['max_lag'] is None else max(stats['max_lag'], run['lag'])
+        stats['last'] = run
+
+    for stats in summary.values():
+        stats['avg_duration'] = round(stats.pop('total_duration') / stats['runs'], 3)
+    return summary
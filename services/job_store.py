@@ -0,0 +1,179 @@
+"""
+Persistent record of daily job slots (SQLite, JOB_STORE_FILE).
+
+The JobQueue itself lives in memory: a restart at 8:56 used to lose the 8:55 post, and the jobs
+are defined in code anyway. What has to survive a restart is which slots already ran. Each daily
+job is wrapped by once_per_slot(), which claims the (job, slot) key before running, so a slot is
+executed at most once even if it fires twice (normal run + catch-up). On boot, catch_up_missed()
+re-runs every slot that was missed within its job's catch-up window.
+"""
+import functools
+import logging
+import os
+import sqlite3
+from datetime import datetime, time, timedelta
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from config import JOB_STORE_FILE
+
+logger = logging.getLogger(__name__)
+
+TZ = ZoneInfo('Europe/Moscow')
+CATCH_UP_DELAY = 15
+KEEP_DAYS = 30
+
+class JobStore:
+    """(job, slot) -> status: 'running', 'done' or 'failed'."""
+
+    def __init__(self, path: str = JOB_STORE_FILE):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_slots (
+                    job TEXT NOT NULL,
+                    slot TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    PRIMARY KEY (job, slot)
+                )
+            """)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def claim(self, job: str, slot: str) -> bool:
+        """Mark the slot as running. False if it already ran or is running."""
+        now = datetime.now(TZ).isoformat(timespec='seconds')
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO job_slots (job, slot, status, started_at) VALUES (?, ?, 'running', ?)",
+                    (job, slot, now)
+                )
+                if cursor.rowcount:
+                    return True
+                # Failed slots may be retried
+                cursor = conn.execute(
+                    "UPDATE job_slots SET status = 'running', started_at = ?, finished_at = NULL "
+                    "WHERE job = ? AND slot = ? AND status = 'failed'",
+                    (now, job, slot)
+                )
+                return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def finish(self, job: str, slot: str, ok: bool = True):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE job_slots SET status = ?, finished_at = ? WHERE job = ? AND slot = ?",
+                    ('done' if ok else 'failed', datetime.now(TZ).isoformat(timespec='seconds'), job, slot)
+                )
+        finally:
+            conn.close()
+
+    def status(self, job: str, slot: str) -> Optional[str]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT status FROM job_slots WHERE job = ? AND slot = ?", (job, slot)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def recover(self):
+        """
+        On boot: slots still 'running' were interrupted by the previous process, mark them failed
+        so the catch-up can retry them. Also drop records older than KEEP_DAYS.
+        """
+        cutoff = (datetime.now(TZ) - timedelta(days=KEEP_DAYS)).isoformat(timespec='minutes')
+        conn = self._connect()
+        try:
+            with conn:
+                interrupted = conn.execute("UPDATE job_slots SET status = 'failed' WHERE status = 'running'").rowcount
+                conn.execute("DELETE FROM job_slots WHERE slot < ?", (cutoff,))
+            if interrupted:
+                logger.warning(f"{interrupted} job slot(s) were interrupted by the last shutdown")
+        finally:
+            conn.close()
+
+job_store = JobStore()
+
+def current_slot(slot_time: time, now: datetime = None) -> datetime:
+    """The latest occurrence of the daily slot_time at or before now."""
+    now = (now or datetime.now(TZ)).astimezone(slot_time.tzinfo or TZ)
+    slot = now.replace(hour=slot_time.hour, minute=slot_time.minute, second=slot_time.second, microsecond=0)
+    if slot > now:
+        slot -= timedelta(days=1)
+    return slot
+
+def slot_key(slot: datetime) -> str:
+    return slot.isoformat(timespec='minutes')
+
+def once_per_slot(callback, slot_time: time):
+    """
+    Wrap a daily job so that each of its slots runs at most once, across restarts.
+    The job key is "<callback>@HH:MM", the slot key the date and time of the occurrence.
+    The scheduler callbacks log and swallow their own errors and return False instead: the slot
+    is then recorded as failed (like on an exception), so the catch-up on the next boot retries it.
+    """
+    job_key = f"{callback.__name__}@{slot_time.strftime('%H:%M')}"
+
+    @functools.wraps(callback)
+    async def wrapper(context):
+        slot = slot_key(current_slot(slot_time))
+        if not job_store.claim(job_key, slot):
+            logger.info(f"Skipping {job_key} for {slot}: already done")
+            return
+
+        try:
+            result = await callback(context)
+        except Exception:
+            job_store.finish(job_key, slot, ok=False)
+            raise
+        job_store.finish(job_key, slot, ok=result is not False)
+        if result is False:
+            logger.warning(f"{job_key} failed for {slot}, it will be retried by the next catch-up")
+        return result
+
+    wrapper.job_key = job_key
+    wrapper.slot_time = slot_time
+    return wrapper
+
+def catch_up_missed(job_queue, jobs: List[Tuple], wrap=None):
+    """
+    Queue the slots missed while the bot was down, once each.
+    jobs: [(once_per_slot wrapper, catch-up window in seconds)], in the order they should run.
+    A slot is caught up if it is within its window and not done yet.
+    wrap: optional extra wrapper for the queued callback (e.g. instrumentation).
+    """
+    # Without any history (first start with the store) we can't know what already ran
+    first_start = not os.path.exists(job_store.path)
+    job_store.recover()
+    now = datetime.now(TZ)
+    delay = CATCH_UP_DELAY
+
+    for wrapper, window in jobs:
+        slot = current_slot(wrapper.slot_time, now)
+        if (now - slot).total_seconds() > window:
+            continue
+        if first_start:
+            job_store.claim(wrapper.job_key, slot_key(slot))
+            job_store.finish(wrapper.job_key, slot_key(slot))
+            continue
+        if job_store.status(wrapper.job_key, slot_key(slot)) == 'done':
+            continue
+
+        logger.info(f"Catching up {wrapper.job_key} for {slot_key(slot)}")
+        callback = wrap(wrapper, wrapper.slot_time) if wrap else wrapper
+        job_queue.run_once(callback, delay, name=f"catch_up:{wrapper.job_key}")
+        # Keep the order (e.g. feedback before the midnight reset)
+        delay += 5
@@ -1,31 +1,17 @@
-import json
 import logging
-import os
 from datetime import datetime, timedelta
+from services.storage import storage
 
 logger = logging.getLogger(__name__)
 
-MEDICAL_DATA_FILE = 'data/medical_info.json'
-
 def load_medical_data():
-    if not os.path.exists(MEDICAL_DATA_FILE):
-        return {"employees": []}
+    """All medical records: {"employees": [{name, role, status, med_commission_date, san_min_date}, ...]}"""
     try:
-        with open(MEDICAL_DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return {"employees": storage.get_medical_employees()}
     except Exception as e:
         logger.error(f"Error loading medical data: {e}")
         return {"employees": []}
 
-def save_medical_data(data):
-    try:
-        with open(MEDICAL_DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        logger.error(f"Error saving medical data: {e}")
-        return False
-
 def check_expiring_medical_exams():
     """
     Check for employees whose medical commission or sanitary minimum expires in <= 30 days.
@@ -82,27 +68,24 @@ def update_employee_medical_info(surname, med_date=None, san_date=None):
     """
     Update medical info for an employee.
     """
-    data = load_medical_data()
-    employees = data.get('employees', [])
-    updated = False
-    
-    for emp in employees:
-        if surname.lower() in emp['name'].lower():
-            if med_date:
-                emp['med_commission_date'] = med_date
-                if 'status' in emp and emp['status'] == 'missing_docs':
-                    del emp['status'] # Remove missing flag if updated
-            if san_date:
-                emp['san_min_date'] = san_date
-                if 'status' in emp and emp['status'] == 'missing_docs':
-                    del emp['status']
-            updated = True
-            break
-            
-    if updated:
-        save_medical_data(data)
+    try:
+        emp = storage.find_medical_employee(surname)
+        if not emp:
+            return False
+        
+        fields = {}
+        if med_date:
+            fields['med_commission_date'] = med_date
+        if san_date:
+            fields['san_min_date'] = san_date
+        if fields and emp.get('status') == 'missing_docs':
+            fields['status'] = None # Remove missing flag if updated
+        
+        storage.update_medical_employee(emp['name'], **fields)
         return True
-    return False
+    except Exception as e:
+        logger.error(f"Error updating medical data: {e}")
+        return False
 
 def get_all_medical_issues():
     """
@@ -177,21 +160,14 @@ def get_all_medical_issues():
     return issues
 
 def get_employee_status(surname):
-    data = load_medical_data()
-    for emp in data.get('employees', []):
-        if surname.lower() in emp['name'].lower():
-            return emp
-    return None
+    return storage.find_medical_employee(surname)
 
 def is_manager(surname):
     """
     Check if the employee with the given surname has the 'manager' role.
     """
-    data = load_medical_data()
-    for emp in data.get('employees', []):
-        if surname.lower() in emp['name'].lower():
-            return emp.get('role') == 'manager'
-    return False
+    emp = storage.find_medical_employee(surname)
+    return bool(emp) and emp.get('role') == 'manager'
 
 
 def add_employee(name, role='trainee'):
@@ -199,25 +175,20 @@ def add_employee(name, role='trainee'):
     Add a new employee to the medical data.
     Returns True if successful, False if employee already exists.
     """
-    data = load_medical_data()
-    employees = data.get('employees', [])
-    
-    # Check if employee already exists
-    for emp in employees:
-        if emp['name'].lower() == name.lower():
-            return False, "Сотрудник с таким именем уже существует"
-    
     new_employee = {
         'name': name,
         'role': role,
         'status': 'missing_docs'
     }
-    employees.append(new_employee)
-    data['employees'] = employees
     
-    if save_medical_data(data):
+    try:
+        # Checks for an existing employee with the same name in the same transaction
+        if not storage.add_medical_employee(new_employee):
+            return False, "Сотрудник с таким именем уже существует"
         return True, "Сотрудник успешно добавлен"
-    return False, "Ошибка при сохранении данных"
+    except Exception as e:
+        logger.error(f"Error adding employee: {e}")
+        return False, "Ошибка при сохранении данных"
 
 
 def remove_employee(name):
@@ -225,18 +196,13 @@ def remove_employee(name):
     Remove an employee from the medical data.
     Returns True if successful, False if employee not found.
     """
-    data = load_medical_data()
-    employees = data.get('employees', [])
-    
-    for i, emp in enumerate(employees):
-        if emp['name'].lower() == name.lower():
-            employees.pop(i)
-            data['employees'] = employees
-            if save_medical_data(data):
-                return True, "Сотрудник успешно удалён"
-            return False, "Ошибка при сохранении данных"
-    
-    return False, "Сотрудник не найден"
+    try:
+        if storage.remove_medical_employee(name):
+            return True, "Сотрудник успешно удалён"
+        return False, "Сотрудник не найден"
+    except Exception as e:
+        logger.error(f"Error removing employee: {e}")
+        return False, "Ошибка при сохранении данных"
 
 
 def get_all_roles():
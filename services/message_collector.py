@@ -1,11 +1,32 @@
+"""
+Collection of the configured group's messages and photos for the nightly feedback.
+
+Each day's messages are kept in an append-only log, data/messages/daily_messages_<date>.jsonl,
+one JSON object per line: saving a message costs one appended line however long the day gets.
+Appends are flushed right away and fsynced in batches (MESSAGE_LOG_FSYNC_BATCH messages or
+MESSAGE_LOG_FSYNC_INTERVAL seconds). JSON-array files (.json) of older versions are converted
+by migrate_legacy_messages() and are still readable until then.
+
+The handlers don't touch the disk: captured messages are queued in memory (write-behind) and
+flush_pending() writes them once MESSAGE_BUFFER_MAX_MESSAGES are queued, every
+MESSAGE_BUFFER_FLUSH_INTERVAL seconds (flush job), before the messages are read and at shutdown.
+A crash loses at most the messages of the last flush interval.
+"""
+import asyncio
 import logging
 import json
 import os
+import shutil
+import threading
+import time as time_module
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 from telegram import Update, PhotoSize
 from telegram.ext import ContextTypes
 import pytz
+from services.atomic_file import atomic_write
+from config import MESSAGE_LOG_FSYNC_BATCH, MESSAGE_LOG_FSYNC_INTERVAL, MESSAGE_BUFFER_MAX_MESSAGES
 
 logger = logging.getLogger(__name__)
 
@@ -17,11 +38,15 @@ def get_current_date():
     tz = pytz.timezone('Europe/Moscow')
     return datetime.now(tz).strftime("%Y-%m-%d")
 
-def get_messages_file():
-    """Get the path to today's messages file."""
-    date_str = get_current_date()
+def get_messages_file(date_str=None):
+    """Get the path to a day's message log (today by default)."""
+    date_str = date_str or get_current_date()
     os.makedirs(MESSAGES_DIR, exist_ok=True)
-    return os.path.join(MESSAGES_DIR, f'daily_messages_{date_str}.json')
+    return os.path.join(MESSAGES_DIR, f'daily_messages_{date_str}.jsonl')
+
+def _legacy_file(log_path):
+    """JSON-array file of older versions for the same day (.json instead of .jsonl)."""
+    return log_path[:-1]
 
 def get_images_dir():
     """Get the path to today's images directory."""
@@ -30,27 +55,187 @@ def get_images_dir():
     os.makedirs(images_path, exist_ok=True)
     return images_path
 
-def load_daily_messages():
-    """Load today's messages from file."""
-    filepath = get_messages_file()
-    if not os.path.exists(filepath):
-        return []
-    
+def _migrate_file(log_path):
+    """Convert the legacy JSON array of a day into its log; messages already in the log stay after them."""
+    legacy_path = _legacy_file(log_path)
+    if not os.path.exists(legacy_path):
+        return
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+
+        # Only the bot writes the log, and the caller holds message_log's lock
+        with atomic_write(log_path, lock=False) as out:
+            for message in legacy:
+                out.write(json.dumps(message, ensure_ascii=False) + '\n')
+            if os.path.exists(log_path):
+                with open(log_path, 'r', encoding='utf-8') as f:
+                    shutil.copyfileobj(f, out)
+        os.remove(legacy_path)
+        logger.info(f"Migrated {len(legacy)} messages from {legacy_path} to {log_path}")
     except Exception as e:
-        logger.error(f"Error loading messages from {filepath}: {e}")
-        return []
+        logger.error(f"Error migrating messages from {legacy_path}: {e}")
+
+class MessageLog:
+    """Appends messages to the current day's log, keeping the file open and batching fsyncs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self._unsynced = 0
+        self._last_sync = 0.0
+
+    def _open(self, path):
+        self._close()
+        _migrate_file(path)
+        # A line torn by a crash would swallow the next message: terminate it
+        torn = False
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        self._file = open(path, 'a', encoding='utf-8')
+        if torn:
+            self._file.write('\n')
+        self._path = path
+
+    def _sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time_module.monotonic()
+
+    def _close(self):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+        self._file = None
+        self._path = None
+
+    @property
+    def unsynced(self):
+        return self._unsynced
+
+    def append_many(self, messages):
+        """
+        Append messages to the log of the day they were captured (by timestamp). The first message after
+        a quiet period is fsynced at once, messages of a burst together every MESSAGE_LOG_FSYNC_BATCH /
+        MESSAGE_LOG_FSYNC_INTERVAL. With no messages only a due fsync is done.
+        """
+        with self._lock:
+            for message in messages:
+                path = get_messages_file(_message_date(message))
+                if path != self._path:
+                    self._open(path)
+                self._file.write(json.dumps(message, ensure_ascii=False) + '\n')
+                self._unsynced += 1
+            if self._file is not None:
+                self._file.flush()
+            if (self._unsynced >= MESSAGE_LOG_FSYNC_BATCH
+                    or time_module.monotonic() - self._last_sync >= MESSAGE_LOG_FSYNC_INTERVAL):
+                self._sync()
+
+    def append(self, message):
+        self.append_many([message])
+
+    def close(self):
+        """Fsync and close the log (shutdown)."""
+        with self._lock:
+            self._close()
 
-def save_daily_messages(messages):
-    """Save messages to today's file."""
-    filepath = get_messages_file()
+message_log = MessageLog()
+
+def _message_date(message):
+    """Day of a captured message: its Moscow timestamp, so a message buffered over midnight stays in its day."""
+    timestamp = message.get('timestamp', '')
+    return timestamp[:10] if len(timestamp) >= 10 else get_current_date()
+
+# Write-behind buffer, filled by the handlers on the event loop and drained by flush_pending()
+_pending = deque()
+_flush_lock = threading.Lock()
+_flush_future = None
+
+def buffer_message(message):
+    """Queue a captured message for the log (no disk I/O unless the buffer is full)."""
+    global _flush_future
+    _pending.append(message)
+    if len(_pending) < MESSAGE_BUFFER_MAX_MESSAGES:
+        return
+    if _flush_future is not None and not _flush_future.done():
+        return
+    try:
+        _flush_future = asyncio.get_running_loop().run_in_executor(None, flush_pending)
+    except RuntimeError:
+        flush_pending()
+
+def flush_pending():
+    """
+    Write the buffered messages to the log (blocking, run in a thread from the event loop).
+    Returns the number written.
+    """
+    _flush_lock.acquire()
+    batch = []
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(messages, f, ensure_ascii=False, indent=2)
+        while _pending:
+            batch.append(_pending.popleft())
+        message_log.append_many(batch)
+        return len(batch)
     except Exception as e:
-        logger.error(f"Error saving messages to {filepath}: {e}")
+        logger.error(f"Error writing {len(batch)} buffered messages: {e}")
+        # Keep them for the next flush
+        _pending.extendleft(reversed(batch))
+        return 0
+    finally:
+        _flush_lock.release()
+
+def has_pending():
+    """Anything buffered or not yet fsynced."""
+    return bool(_pending) or message_log.unsynced > 0
+
+def migrate_legacy_messages():
+    """Convert all daily JSON-array message files to logs (at startup)."""
+    if not os.path.exists(MESSAGES_DIR):
+        return
+    with message_log._lock:
+        message_log._close()
+        for filename in sorted(os.listdir(MESSAGES_DIR)):
+            if filename.startswith('daily_messages_') and filename.endswith('.json'):
+                _migrate_file(os.path.join(MESSAGES_DIR, filename + 'l'))
+
+def iter_daily_messages(date_str=None):
+    """Stream a day's messages (today by default) in the order they were saved."""
+    log_path = get_messages_file(date_str)
+
+    # Not migrated yet
+    legacy_path = _legacy_file(log_path)
+    if os.path.exists(legacy_path):
+        try:
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                yield from json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading messages from {legacy_path}: {e}")
+
+    if not os.path.exists(log_path):
+        return
+    try:
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    # Still being written
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping broken line in {log_path}")
+    except Exception as e:
+        logger.error(f"Error loading messages from {log_path}: {e}")
+
+def load_daily_messages():
+    """Load today's messages from file."""
+    return list(iter_daily_messages())
 
 async def save_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Save a text message to daily log."""
@@ -72,11 +257,10 @@ async def save_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'message_id': message.message_id
         }
         
-        messages = load_daily_messages()
-        messages.append(message_data)
-        save_daily_messages(messages)
+        buffer_message(message_data)
         
-        logger.info(f"Saved message from {message.from_user.first_name}: {message.text[:50]}...")
+        # Debug level: a log line per group message would be disk I/O on every update again
+        logger.debug(f"Queued message from {message.from_user.first_name}: {message.text[:50]}...")
         
     except Exception as e:
         logger.error(f"Error saving message: {e}")
@@ -118,12 +302,10 @@ async def save_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'file_id': photo.file_id
         }
         
-        messages = load_daily_messages()
-        messages.append({
+        buffer_message({
             'type': 'image',
             **image_data
         })
-        save_daily_messages(messages)
         
         logger.info(f"Saved image from {message.from_user.first_name} to {filepath}")
         
@@ -132,6 +314,7 @@ async def save_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 def get_daily_data():
     """Get all collected messages and images for today."""
+    flush_pending()
     messages = load_daily_messages()
     return messages
 
@@ -141,7 +324,8 @@ def reset_daily_data():
         # Clean up old message files
         if os.path.exists(MESSAGES_DIR):
             for filename in os.listdir(MESSAGES_DIR):
-                if filename.startswith('daily_messages_'):
+                # Messages and their partial feedback summaries
+                if filename.startswith(('daily_messages_', 'partial_summaries_')):
                     filepath = os.path.join(MESSAGES_DIR, filename)
                     # Get file modification time
                     file_time = datetime.fromtimestamp(os.path.getmtime(filepath))
@@ -0,0 +1,106 @@
+"""
+Ledger of sent shift reminders, stored in the notifications table (services/storage.py).
+
+One row per reminded shift start (user_id, "DD.MM", "HH:MM"), so a split shift ("9-13 17-23")
+gets both of its reminders. Entries imported from the old notifications.json format
+({user_id: "DD.MM"}) have the start ANY_START: everything on that date was reminded. Only
+yesterday, today and tomorrow (Moscow dates) are kept on save. The rows of that window are
+loaded once and refresh() reloads them only when the table or the date changed, so lookups are
+plain dict/set operations.
+
+A reminder being sent is claimed first: until it is marked sent or released it counts as sent,
+so a re-plan running while a batch is in flight doesn't schedule it again.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Set, Tuple
+from zoneinfo import ZoneInfo
+from services.storage import Storage, storage as default_storage
+
+logger = logging.getLogger(__name__)
+
+# Legacy entries don't know which shift was reminded: they cover the whole date
+ANY_START = '*'
+# Reminder dates are Moscow dates (see shift_reminders), the server runs on UTC
+TZ = ZoneInfo('Europe/Moscow')
+
+def _window(now: datetime = None) -> List[str]:
+    """Dates ("DD.MM") the ledger keeps: yesterday, today and tomorrow in Moscow."""
+    now = now or datetime.now(TZ)
+    return [(now + timedelta(days=offset)).strftime("%d.%m") for offset in (-1, 0, 1)]
+
+class NotificationLedger:
+    def __init__(self, storage: Storage = default_storage):
+        self.storage = storage
+        self._sent: Dict[str, Dict[str, Set[str]]] = {}
+        self._unsaved: List[Tuple[str, str, str]] = []
+        # Claimed by a batch in flight, in memory only
+        self._pending: Set[Tuple[str, str, str]] = set()
+        self._version = None
+
+    def refresh(self):
+        """(Re)load the ledger if the table changed since the last read. Call once per scheduling pass."""
+        try:
+            # Also reload when the day moved on: the window then covers a new date
+            version = (self.storage.version('notifications'), tuple(_window()))
+            if version == self._version:
+                return
+
+            sent = {}
+            for user_id, date, start in self.storage.get_notifications(list(version[1])):
+                sent.setdefault(user_id, {}).setdefault(date, set()).add(start)
+            # Reminders recorded but not saved yet stay recorded
+            for user_id, date, start in self._unsaved:
+                sent.setdefault(user_id, {}).setdefault(date, set()).add(start)
+        except Exception as e:
+            logger.error(f"Error loading sent reminders: {e}")
+            return
+
+        self._sent = sent
+        self._version = version
+
+    def was_sent(self, user_id: str, date: str, start: str) -> bool:
+        """Sent, or claimed by a batch that is sending it right now."""
+        if (str(user_id), date, start) in self._pending:
+            return True
+        starts = self._sent.get(str(user_id), {}).get(date)
+        return bool(starts) and (start in starts or ANY_START in starts)
+
+    def claim(self, user_id: str, date: str, start: str) -> bool:
+        """Reserve a reminder for sending. False if it was already sent or claimed."""
+        if self.was_sent(user_id, date, start):
+            return False
+        self._pending.add((str(user_id), date, start))
+        return True
+
+    def release(self, user_id: str, date: str, start: str):
+        """Give up a claim without sending (the next plan may schedule it again)."""
+        self._pending.discard((str(user_id), date, start))
+
+    def mark_sent(self, user_id: str, date: str, start: str):
+        """Record a reminder in memory (ending its claim); call save() once after a batch."""
+        self._pending.discard((str(user_id), date, start))
+        self._sent.setdefault(str(user_id), {}).setdefault(date, set()).add(start)
+        self._unsaved.append((str(user_id), date, start))
+
+    def compact(self, now: datetime = None):
+        """Drop everything older than yesterday (dates are "DD.MM", so keep a fixed window)."""
+        keep = set(_window(now))
+        for user_id in list(self._sent):
+            dates = {date: starts for date, starts in self._sent[user_id].items() if date in keep}
+            if dates:
+                self._sent[user_id] = dates
+            else:
+                del self._sent[user_id]
+
+    def save(self, now: datetime = None):
+        """Write the reminders recorded since the last save (one transaction) and drop old dates."""
+        self.compact(now)
+        try:
+            self.storage.add_notifications(self._unsaved, _window(now))
+            self._unsaved = []
+            self._version = (self.storage.version('notifications'), tuple(_window()))
+        except Exception as e:
+            logger.error(f"Error saving sent reminders: {e}")
+
+ledger = NotificationLedger()
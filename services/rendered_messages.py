@@ -0,0 +1,79 @@
+"""
+Pre-rendered group messages (preps, "who's working").
+
+Rendering needs the schedule/preps sheets, so it is done ahead of the scheduled posts by
+prerender_group_messages() and kept together with the version of its source data. The 8:00 /
+8:55 / 16:55 jobs and the manual /prep and /who commands reuse a rendered text as long as the
+source version is unchanged and only render again when the data moved on. Renders built from a
+failed load (error text, "no shifts" because the sheet didn't come) are returned but never kept.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+from zoneinfo import ZoneInfo
+from services.sheets import render_preps, get_preps_version, render_who_on_shift, get_date_version
+
+logger = logging.getLogger(__name__)
+
+TZ = ZoneInfo('Europe/Moscow')
+MAX_WHO_DATES = 4
+
+# (kind, params) -> (source version, text)
+_rendered: Dict[Tuple, Tuple] = {}
+
+async def _get_rendered(key: Tuple, get_version, render) -> str:
+    """render() returns (text, complete); only complete renders are cached."""
+    try:
+        version = await get_version()
+    except Exception as e:
+        logger.error(f"Error checking source version for {key}: {e}")
+        text, _ = await render()
+        return text
+
+    cached = _rendered.get(key)
+    if cached and version is not None and cached[0] == version:
+        return cached[1]
+
+    text, complete = await render()
+    if not complete:
+        logger.warning(f"Not caching {key}: rendered from incomplete data")
+        return text
+    try:
+        # Taken after rendering: the render may have loaded the data the version refers to
+        version = await get_version()
+    except Exception:
+        version = None
+    if version is not None:
+        _rendered[key] = (version, text)
+    return text
+
+async def get_preps_message(day_index: int, is_morning: bool) -> str:
+    """get_preps() text, rendered at most once per preps sheet / config version."""
+    return await _get_rendered(
+        ('preps', day_index, is_morning),
+        get_preps_version,
+        lambda: render_preps(day_index, is_morning)
+    )
+
+async def get_who_message(target_date: str) -> str:
+    """get_who_on_shift() text without a personal header, rendered at most once per schedule version."""
+    who_dates = [key for key in _rendered if key[0] == 'who' and key[1] != target_date]
+    for key in who_dates[:-MAX_WHO_DATES]:
+        del _rendered[key]
+
+    return await _get_rendered(
+        ('who', target_date),
+        lambda: get_date_version(target_date),
+        lambda: render_who_on_shift(target_date)
+    )
+
+async def prerender_group_messages(now: datetime = None):
+    """Render everything the next group posts and /prep, /who need: today's list and today's/tomorrow's preps."""
+    now = now or datetime.now(TZ)
+    day_index = now.weekday()
+    tomorrow_index = (day_index + 1) % 7
+
+    await get_who_message(now.strftime("%d.%m"))
+    await get_who_message((now + timedelta(days=1)).strftime("%d.%m"))
+    for target_day, is_morning in [(day_index, True), (day_index, False), (tomorrow_index, True)]:
+        await get_preps_message(target_day, is_morning)
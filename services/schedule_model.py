@@ -0,0 +1,248 @@
+import csv
+import io
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# First names of the dishwashers ("Мойка" section) - the kitchen schedule ends where they start
+STOP_NAMES = ['ольга', 'екатерина', 'наталья']
+
+# Role headers mapping
+ROLE_HEADERS = {
+    'менеджер': 'менеджер',
+    'наставник': 'наставник',
+    'инструктор': 'инструктор',
+    'универсал': 'универсал',
+    'кассир': 'кассир',
+    'пиццамейкер': 'пиццамейкер',
+    'стажёр': 'стажёр',
+    'стажер': 'стажёр',
+}
+
+def detect_role_header(row_text: str) -> str | None:
+    """Detect if a row is a role header and return the role name"""
+    if not row_text:
+        return None
+
+    row_lower = row_text.lower().strip()
+
+    for header_key, role in ROLE_HEADERS.items():
+        if header_key in row_lower:
+            return role
+
+    return None
+
+def is_section_end(full_name: str) -> bool:
+    """True for the first row of the "Мойка" section, where the kitchen schedule ends."""
+    name_lower = full_name.lower()
+    return 'мойка' in name_lower or name_lower in STOP_NAMES
+
+def iter_employee_rows(rows: Iterable[List[str]]) -> Iterator[Tuple[Optional[str], str, List[str]]]:
+    """
+    Lazily walk the body of a schedule sheet (everything after the date and weekday rows).
+    Yields (role, full_name, row) per employee row; role header rows only switch the role.
+    Stops at the "Мойка" section, so with a csv.reader the rest of the sheet is never parsed.
+    """
+    current_role = None
+    for row in rows:
+        if not row: continue
+
+        full_name = row[0].strip()
+        if is_section_end(full_name):
+            return
+
+        detected_role = detect_role_header(full_name)
+        if detected_role:
+            current_role = detected_role
+            continue
+
+        yield current_role, full_name, row
+
+def normalize_name(name: str) -> str:
+    """Collapse repeated spaces and lowercase, for name lookups."""
+    return ' '.join(name.split()).lower()
+
+def parse_start_date(date_str: str, now: datetime = None) -> datetime:
+    """
+    Parse the first date of a sheet ("DD.MM") into a datetime, guessing the year.
+    Returns datetime.min if the date can't be parsed.
+    """
+    try:
+        date_str = date_str.strip()
+        if not date_str:
+            return datetime.min
+
+        # Add year. If it's late in the year and date is Jan, it's next year.
+        now = now or datetime.now()
+        dt = datetime.strptime(f"{date_str}.{now.year}", "%d.%m.%Y")
+
+        # Heuristic for year transition:
+        # If current month is Nov/Dec and sheet date is Jan/Feb, add 1 year.
+        # If current month is Jan/Feb and sheet date is Nov/Dec, subtract 1 year.
+        if now.month >= 11 and dt.month <= 2:
+            dt = dt.replace(year=now.year + 1)
+        elif now.month <= 2 and dt.month >= 11:
+            dt = dt.replace(year=now.year - 1)
+
+        return dt
+    except Exception:
+        return datetime.min
+
+class ScheduleModel:
+    """
+    One weekly schedule sheet parsed once into lookup tables.
+
+    Sheet layout: row 0 holds dates ("DD.MM"), row 1 weekday abbreviations, then role header
+    rows ("Менеджер", "Пиццамейкер", ...) each followed by employee rows with one shift per date column.
+    Parsing stops at the "Мойка" section.
+    """
+
+    def __init__(self, rows: Iterable[List[str]], version: int = 0):
+        self.version = version
+        self.dates: List[str] = []
+        self.days: List[str] = []
+        self.start_date = datetime.min
+        # Each employee: {'name': str, 'role': str | None, 'cells': List[str]}
+        self.employees: List[Dict] = []
+        self.date_to_col: Dict[str, int] = {}
+        # "DD.MM" -> date with the year resolved relative to the sheet start date
+        self.full_dates: Dict[str, datetime] = {}
+
+        self._by_name: Dict[str, Dict] = {}
+        self._shifts_by_date: Dict[str, List[Dict]] = {}
+        self._search_cache: Dict[str, Optional[Dict]] = {}
+
+        rows = iter(rows)
+        dates = next(rows, None)
+        days = next(rows, None)
+        if dates is None or days is None:
+            return
+
+        self.dates = [d.strip() for d in dates]
+        self.days = [d.strip() for d in days]
+        if len(self.dates) > 1:
+            self.start_date = parse_start_date(self.dates[1])
+
+        for i, date in enumerate(self.dates):
+            if date and date not in self.date_to_col:
+                self.date_to_col[date] = i
+                full_date = self._resolve_year(date)
+                if full_date:
+                    self.full_dates[date] = full_date
+
+        for role, full_name, row in iter_employee_rows(rows):
+            employee = {
+                'name': full_name,
+                'role': role,
+                'cells': [cell.strip() for cell in row]
+            }
+            self.employees.append(employee)
+            self._by_name.setdefault(normalize_name(full_name), employee)
+
+        for date, col in self.date_to_col.items():
+            shifts = []
+            for employee in self.employees:
+                cells = employee['cells']
+                if col < len(cells) and cells[col]:
+                    shifts.append({
+                        'name': employee['name'],
+                        'role': employee['role'],
+                        'shift': cells[col]
+                    })
+            self._shifts_by_date[date] = shifts
+
+    def _resolve_year(self, date: str) -> Optional[datetime]:
+        """Attach a year to a "DD.MM" column header, handling weeks that cross New Year."""
+        if self.start_date == datetime.min:
+            full_date = parse_start_date(date)
+            return None if full_date == datetime.min else full_date
+        try:
+            day, month = (int(part) for part in date.split('.')[:2])
+            year = self.start_date.year + (1 if month < self.start_date.month else 0)
+            return datetime(year, month, day)
+        except ValueError:
+            return None
+
+    @classmethod
+    def from_csv(cls, content: str, version: int = 0) -> 'ScheduleModel':
+        # csv.reader is consumed lazily, parsing stops at the "Мойка" section
+        return cls(csv.reader(io.StringIO(content)), version)
+
+    def has_date(self, date: str) -> bool:
+        return date in self.date_to_col
+
+    def shifts_on(self, date: str) -> List[Dict]:
+        """All shifts on a date: list of {'name': str, 'role': str, 'shift': str}."""
+        return self._shifts_by_date.get(date, [])
+
+    def find_employee(self, surname: str) -> Optional[Dict]:
+        """
+        Find an employee by full name or by a part of it (e.g. the surname).
+        Exact names are a dict lookup; partial matches are resolved once per model and memoized.
+        """
+        key = normalize_name(surname)
+        employee = self._by_name.get(key)
+        if employee:
+            return employee
+
+        if key not in self._search_cache:
+            match = None
+            for candidate in self.employees:
+                if surname.lower() in candidate['name'].lower():
+                    match = candidate
+                    break
+            self._search_cache[key] = match
+        return self._search_cache[key]
+
+class DateIndex:
+    """
+    Maps "DD.MM" to the schedule sheets that contain it, so a date lookup touches exactly one sheet.
+    Entries of a sheet are replaced whenever its model version changes.
+    """
+
+    def __init__(self):
+        # "DD.MM" -> [(gid, column, full date)]
+        self._entries: Dict[str, List[Tuple[str, int, datetime]]] = {}
+        # gid -> model version the entries were built from
+        self._versions: Dict[str, int] = {}
+
+    def is_current(self, gid: str, version: int) -> bool:
+        return self._versions.get(gid) == version
+
+    def _drop(self, gid: str):
+        for date in list(self._entries):
+            remaining = [entry for entry in self._entries[date] if entry[0] != gid]
+            if remaining:
+                self._entries[date] = remaining
+            else:
+                del self._entries[date]
+        self._versions.pop(gid, None)
+
+    def update(self, gid: str, model: ScheduleModel):
+        """(Re)index the dates of one sheet."""
+        if self.is_current(gid, model.version):
+            return
+        self._drop(gid)
+        for date, col in model.date_to_col.items():
+            self._entries.setdefault(date, []).append((gid, col, model.full_dates.get(date, datetime.min)))
+        self._versions[gid] = model.version
+
+    def retain(self, gids: List[str]):
+        """Forget sheets that are no longer in the spreadsheet."""
+        for gid in list(self._versions):
+            if gid not in gids:
+                self._drop(gid)
+
+    def lookup(self, date: str, now: datetime = None) -> Optional[Tuple[str, int]]:
+        """
+        Return (gid, column) of the sheet containing date.
+        If several sheets have the same "DD.MM" (e.g. a year apart), the one closest to now wins.
+        """
+        entries = self._entries.get(date)
+        if not entries:
+            return None
+        now = now or datetime.now()
+        gid, col, _ = min(entries, key=lambda entry: abs((entry[2] - now).total_seconds()) if entry[2] != datetime.min else float('inf'))
+        return gid, col
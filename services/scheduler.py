@@ -1,34 +1,17 @@
 import logging
-import json
 import os
+import re
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime
 from telegram.ext import ContextTypes
-from services.sheets import get_shifts_for_date, get_preps
+from services.sheets import PREPS_URL
+from services.rendered_messages import get_preps_message, get_who_message, prerender_group_messages
+from services.job_metrics import phase, count
+from services.sheet_manager import sheet_manager
+from services.storage import storage
 
 logger = logging.getLogger(__name__)
 
-USERS_FILE = 'data/users.json'
-NOTIFICATIONS_FILE = 'data/notifications.json'
-GROUP_FILE = 'data/group.json'
-
-def load_json(filepath):
-    if not os.path.exists(filepath):
-        return {}
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading {filepath}: {e}")
-        return {}
-
-def save_json(filepath, data):
-    try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.error(f"Error saving {filepath}: {e}")
-
 def parse_start_time(shift_str):
     """
     Parse start time from shift string like '9-17' or '09:00-17:00'.
@@ -53,15 +36,53 @@ def parse_start_time(shift_str):
     except:
         return None, None
 
+def parse_shift_starts(shift_str):
+    """
+    Parse all start times of a shift cell: '9-17' -> [(9, 0)], split shifts like
+    '9-13 17-23' or '9:30-13/17-23' -> [(9, 30), (17, 0)].
+    Falls back to parse_start_time for cells without a full range.
+    """
+    starts = []
+    # The start can't begin in the middle of a number ('09.00-17.00' must not match '00-17')
+    for h, m in re.findall(r'(?<![\d.:])(\d{1,2})(?::(\d{2}))?\s*-\s*\d{1,2}(?::\d{2})?', shift_str or ''):
+        h, m = int(h), int(m or 0)
+        if h < 24 and m < 60 and (h, m) not in starts:
+            starts.append((h, m))
+    if starts:
+        return starts
+
+    start_h, start_m = parse_start_time(shift_str or '')
+    if start_h is None or not (0 <= start_h < 24 and 0 <= start_m < 60):
+        return []
+    return [(start_h, start_m)]
+
+async def prewarm_sheets_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Refresh all schedule sheets and the preps sheet into the cache and pre-render the group messages.
+    Scheduled a few minutes before the 8:00 / 8:55 / 16:55 group posts, so they only have to send.
+    """
+    try:
+        sheets = await sheet_manager.get_sheets()
+        urls = [sheet_manager.export_url(sheet['gid']) for sheet in sheets] + [PREPS_URL]
+        with phase('fetch'):
+            await sheet_manager.prewarm(urls)
+        logger.info(f"Pre-warmed {len(urls)} sheets. Cache stats: {sheet_manager.get_stats()}")
+
+        with phase('render'):
+            await prerender_group_messages()
+        logger.info("Pre-rendered group messages")
+    except Exception as e:
+        logger.error(f"Error in prewarm_sheets_job: {e}")
+
 async def send_preps_notification(context: ContextTypes.DEFAULT_TYPE):
     """
     Send preps notification to the group.
     Scheduled to run at specific times (Morning and Evening).
+    Returns False if it failed (the error is logged here), so the job store can retry the slot.
     """
     try:
         # Load group ID
-        group_data = load_json(GROUP_FILE)
-        group_id = group_data.get('group_id')
+        group_id = storage.get_group_id()
         
         if not group_id:
             return
@@ -105,32 +126,36 @@ async def send_preps_notification(context: ContextTypes.DEFAULT_TYPE):
                 is_morning = False
             logger.warning(f"Unexpected execution time. Defaulting to Morning={is_morning}")
             
-        # Fetch preps
-        preps_text = await get_preps(day_index, is_morning)
+        # Pre-rendered by prewarm_sheets_job (rendered now if missing or outdated)
+        with phase('render'):
+            preps_text = await get_preps_message(day_index, is_morning)
         
         # Add header
         header = "🔔 **Напоминание о заготовках**\n\n"
         message = header + preps_text
         
-        await context.bot.send_message(
-            chat_id=group_id,
-            text=message,
-            parse_mode='Markdown'
-        )
+        with phase('send'):
+            await context.bot.send_message(
+                chat_id=group_id,
+                text=message,
+                parse_mode='Markdown'
+            )
+        count('messages_sent')
         logger.info(f"Sent preps notification to group {group_id} (Morning={is_morning})")
+        return True
         
     except Exception as e:
         logger.error(f"Error sending preps notification: {e}")
+        return False
 
 async def send_who_notification(context: ContextTypes.DEFAULT_TYPE):
     """
     Send "who's working today" notification to the group.
-    Scheduled to run daily at 8:00.
+    Scheduled to run daily at 8:00. Returns False if it failed.
     """
     try:
         # Load group ID
-        group_data = load_json(GROUP_FILE)
-        group_id = group_data.get('group_id')
+        group_id = storage.get_group_id()
         
         if not group_id:
             return
@@ -140,142 +165,47 @@ async def send_who_notification(context: ContextTypes.DEFAULT_TYPE):
         now = datetime.now(tz)
         today_str = now.strftime("%d.%m")
         
-        # Fetch who's on shift
-        from services.sheets import get_who_on_shift
-        who_text = await get_who_on_shift(today_str)
+        # Pre-rendered by prewarm_sheets_job (rendered now if missing or outdated)
+        with phase('render'):
+            who_text = await get_who_message(today_str)
         
         # Add header
         header = "🔔 **Кто сегодня работает**\n\n"
         message = header + who_text
         
-        await context.bot.send_message(
-            chat_id=group_id,
-            text=message
-        )
+        with phase('send'):
+            await context.bot.send_message(
+                chat_id=group_id,
+                text=message
+            )
+        count('messages_sent')
         logger.info(f"Sent who's working notification to group {group_id}")
+        return True
         
     except Exception as e:
         logger.error(f"Error sending who's working notification: {e}")
-
-async def check_shifts_and_notify(context: ContextTypes.DEFAULT_TYPE):
-    """
-    Check shifts for today and tomorrow and notify users 1 hour before start.
-    """
-    try:
-        from zoneinfo import ZoneInfo
-        tz = ZoneInfo('Europe/Moscow')
-        now = datetime.now(tz)
-        
-        # Check today and tomorrow to handle midnight shifts
-        dates_to_check = [now, now + timedelta(days=1)]
-        
-        # Load data
-        users = load_json(USERS_FILE)
-        notifications = load_json(NOTIFICATIONS_FILE)
-        
-        if not users:
-            return
-
-        for date_obj in dates_to_check:
-            date_str = date_obj.strftime("%d.%m")
-            
-            # Get shifts for date
-            shifts = await get_shifts_for_date(date_str)
-            if not shifts:
-                continue
-
-            for shift_data in shifts:
-                name = shift_data['name']
-                shift_time = shift_data['shift']
-                
-                # Find ALL user_ids for this name (handle duplicates)
-                matching_user_ids = []
-                for uid, user_surname in users.items():
-                    # Strict check: if user_surname is full name (new system) or surname (old system)
-                    # New system: user_surname == "Ivanov Ivan" -> exact match or contained
-                    # Old system: user_surname == "Ivanov" -> contained
-                    
-                    if user_surname.lower() in name.lower():
-                        matching_user_ids.append(uid)
-                
-                if not matching_user_ids:
-                    continue
-                    
-                for user_id in matching_user_ids:
-                    # Check if already notified for this date
-                    # We store "date_str" in notifications. 
-                    # If a user has multiple shifts in a day (rare), this might skip the second one.
-                    # But usually one shift per day.
-                    last_notified = notifications.get(user_id)
-                    if last_notified == date_str:
-                        continue
-                        
-                    # Parse start time
-                    start_h, start_m = parse_start_time(shift_time)
-                    if start_h is None:
-                        continue
-                        
-                    # Construct shift start datetime
-                    # We need to be careful with the date. 
-                    # shift_data comes from 'date_str' which corresponds to 'date_obj'
-                    
-                    shift_start = date_obj.replace(hour=start_h, minute=start_m, second=0, microsecond=0)
-                    
-                    # Handle case where parsed hour is < 24 but technically it might be next day?
-                    # No, get_shifts_for_date returns shifts for that specific calendar date.
-                    # So if date is 24.11 and shift is 00:00, it means 00:00 on 24.11.
-                    # Wait, usually 00:00 shift is considered start of the day.
-                    # If the schedule says "17-02", the 02 is next day.
-                    # But parse_start_time only returns start time.
-                    # If shift is "00-12", start is 00.
-                    
-                    # Calculate time difference
-                    # We want to notify if we are roughly 1 hour before.
-                    
-                    time_until_shift = shift_start - now
-                    minutes_until = time_until_shift.total_seconds() / 60
-                    
-                    # Notify if within 60 minutes (and not passed)
-                    # Range: 0 < minutes <= 65
-                    
-                    if 0 < minutes_until <= 65:
-                        try:
-                            await context.bot.send_message(
-                                chat_id=user_id,
-                                text=f"⏰ Напоминание!\nТвоя смена начинается через час ({shift_time}).\nПора собираться на работу!"
-                            )
-                            logger.info(f"Sent notification to {name} ({user_id}) for shift {shift_time} on {date_str}")
-                            
-                            # Mark as notified for this date
-                            notifications[user_id] = date_str
-                            save_json(NOTIFICATIONS_FILE, notifications)
-                            
-                        except Exception as e:
-                            logger.error(f"Failed to send notification to {user_id}: {e}")
-
-    except Exception as e:
-        logger.error(f"Error in check_shifts_and_notify: {e}")
+        return False
 
 async def send_feedback_notification(context: ContextTypes.DEFAULT_TYPE):
     """
     Analyze collected messages with LLM, then send feedback notification to the group.
     If LLM analysis fails, send raw collected messages as fallback.
-    Scheduled to run daily at 22:52.
+    Scheduled to run daily at 22:52. Returns False if it failed.
     """
     try:
         # First, analyze the day's messages with LLM
-        from services.feedback_analyzer import analyze_feedback
+        from services.feedback_analyzer import run_feedback_analysis
         from services.message_collector import get_daily_data
         
         logger.info("Starting feedback analysis with LLM...")
-        success = await analyze_feedback()
+        with phase('analyze'):
+            success = await run_feedback_analysis()
         
         # Load group ID
-        group_data = load_json(GROUP_FILE)
-        group_id = group_data.get('group_id')
+        group_id = storage.get_group_id()
         
         if not group_id:
-            logger.warning("Group ID not found in group.json")
+            logger.warning("Group ID not found, set it with /set_group")
             return
 
         feedback_file = 'data/feedback.text'
@@ -307,7 +237,7 @@ async def send_feedback_notification(context: ContextTypes.DEFAULT_TYPE):
             logger.warning("No existing feedback.text found, creating fallback message from raw data...")
             
             # Get collected messages
-            messages = get_daily_data()
+            messages = await asyncio.to_thread(get_daily_data)
             
             if not messages:
                 logger.info("No messages collected today and no feedback.text. Skipping feedback notification.")
@@ -347,26 +277,63 @@ async def send_feedback_notification(context: ContextTypes.DEFAULT_TYPE):
             logger.warning("No feedback content to send")
             return
         
-        await context.bot.send_message(
-            chat_id=group_id,
-            text=message
-        )
+        with phase('send'):
+            await context.bot.send_message(
+                chat_id=group_id,
+                text=message
+            )
+        count('messages_sent')
         logger.info(f"Sent feedback notification to group {group_id}")
+        return True
         
     except Exception as e:
         logger.error(f"Error sending feedback notification: {e}")
+        return False
+
+async def summarize_feedback_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Summarize the group messages collected so far into partial summaries, so the nightly
+    feedback analysis only has to merge them. Runs every FEEDBACK_CHUNK_CHECK_INTERVAL.
+    """
+    try:
+        from zoneinfo import ZoneInfo
+        from services.feedback_analyzer import summarize_pending_messages
+
+        # After the 23:05 feedback post the rest of the day isn't analyzed anymore
+        if datetime.now(ZoneInfo('Europe/Moscow')).hour >= 23:
+            return
+
+        with phase('summarize'):
+            added = await summarize_pending_messages()
+        count('partial_summaries', added)
+    except Exception as e:
+        logger.error(f"Error in summarize_feedback_job: {e}")
+
+async def flush_message_buffer_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Write the buffered group messages to the daily log (and fsync when due).
+    Runs every MESSAGE_BUFFER_FLUSH_INTERVAL seconds.
+    """
+    try:
+        from services.message_collector import flush_pending, has_pending
+        if has_pending():
+            await asyncio.to_thread(flush_pending)
+    except Exception as e:
+        logger.error(f"Error in flush_message_buffer_job: {e}")
 
 async def reset_daily_data_job(context: ContextTypes.DEFAULT_TYPE):
     """
     Job to clean up old message files.
-    Scheduled to run daily at midnight.
+    Scheduled to run daily at midnight. Returns False if it failed.
     """
     try:
         from services.message_collector import reset_daily_data
         reset_daily_data()
         logger.info("Daily data reset completed")
+        return True
     except Exception as e:
         logger.error(f"Error in reset_daily_data_job: {e}")
+        return False
 
 async def send_debug_notification(context: ContextTypes.DEFAULT_TYPE):
     """
@@ -374,8 +341,7 @@ async def send_debug_notification(context: ContextTypes.DEFAULT_TYPE):
     """
     try:
         # Load group ID
-        group_data = load_json(GROUP_FILE)
-        group_id = group_data.get('group_id')
+        group_id = storage.get_group_id()
         
         if not group_id:
             return
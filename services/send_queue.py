@@ -0,0 +1,106 @@
+"""
+Concurrent, rate-limited message sending for notification fan-outs.
+
+Telegram allows roughly 30 messages per second per bot and about one message per second
+to the same chat. Messages of a batch are sent concurrently, spaced out to stay under both
+limits, and retried after the delay Telegram asks for on flood control (RetryAfter).
+Each send reports SENT, FAILED (may work later) or UNDELIVERABLE (blocked bot, deleted account,
+bad chat id: retrying won't help), so callers can stop retrying the latter.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from telegram.error import RetryAfter, Forbidden, BadRequest
+from config import TELEGRAM_SEND_RATE, TELEGRAM_SEND_CONCURRENCY
+from services.job_metrics import count
+
+logger = logging.getLogger(__name__)
+
+PER_CHAT_INTERVAL = 1.0
+MAX_ATTEMPTS = 3
+
+# Outcome of a send
+SENT = 'sent'
+FAILED = 'failed'
+UNDELIVERABLE = 'undeliverable'
+
+class RateLimiter:
+    """Hands out send slots: at most `rate` per second overall and one per `per_chat_interval` per chat."""
+
+    def __init__(self, rate: float, per_chat_interval: float):
+        self._interval = 1.0 / rate
+        self._per_chat_interval = per_chat_interval
+        self._next_global = 0.0
+        self._next_by_chat: Dict[str, float] = {}
+
+    def _reserve(self, chat_id: str, now: float) -> float:
+        # No awaits in here, so reservations can't interleave
+        slot = max(now, self._next_global)
+        self._next_global = slot + self._interval
+        slot = max(slot, self._next_by_chat.get(chat_id, 0.0))
+        self._next_by_chat[chat_id] = slot + self._per_chat_interval
+
+        if len(self._next_by_chat) > 1000:
+            self._next_by_chat = {chat: t for chat, t in self._next_by_chat.items() if t > now}
+        return slot
+
+    async def wait(self, chat_id: str):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        delay = self._reserve(str(chat_id), now) - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def back_off(self, seconds: float):
+        """Flood control is per bot: hold every sender for the requested time."""
+        loop = asyncio.get_running_loop()
+        self._next_global = max(self._next_global, loop.time() + seconds)
+
+# Shared by all batches, the limits are per bot
+rate_limiter = RateLimiter(TELEGRAM_SEND_RATE, PER_CHAT_INTERVAL)
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    # int in python-telegram-bot 21, timedelta in later versions
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+async def send_message(bot, chat_id, text: str, **kwargs) -> str:
+    """Send one message under the rate limits. Returns SENT, FAILED or UNDELIVERABLE."""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        await rate_limiter.wait(chat_id)
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            count('messages_sent')
+            return SENT
+        except RetryAfter as e:
+            count('rate_limited')
+            seconds = _retry_after_seconds(e)
+            logger.warning(f"Flood control for {chat_id}, retrying in {seconds}s (attempt {attempt}/{MAX_ATTEMPTS})")
+            rate_limiter.back_off(seconds)
+        except (Forbidden, BadRequest) as e:
+            # Blocked the bot, deleted account, bad chat id: retrying won't help
+            logger.error(f"Failed to send message to {chat_id}: {e}")
+            return UNDELIVERABLE
+        except Exception as e:
+            logger.error(f"Failed to send message to {chat_id}: {e}")
+            return FAILED
+
+    logger.error(f"Giving up on message to {chat_id} after {MAX_ATTEMPTS} attempts")
+    return FAILED
+
+async def send_batch(bot, messages: List[Dict], concurrency: Optional[int] = None) -> List[str]:
+    """
+    Send many messages concurrently.
+    messages: [{'chat_id': ..., 'text': ..., **send_message kwargs}]
+    Returns the outcome of each message (SENT / FAILED / UNDELIVERABLE), in order.
+    """
+    semaphore = asyncio.Semaphore(concurrency or TELEGRAM_SEND_CONCURRENCY)
+
+    async def send(message):
+        message = dict(message)
+        chat_id = message.pop('chat_id')
+        text = message.pop('text')
+        async with semaphore:
+            return await send_message(bot, chat_id, text, **message)
+
+    return list(await asyncio.gather(*(send(message) for message in messages)))
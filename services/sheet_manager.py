@@ -1,70 +1,495 @@
 import re
+import os
+import json
+import time
+import asyncio
+import hashlib
 import logging
 import httpx
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from services.job_metrics import count
+from services.atomic_file import write_json
+from config import (
+    SHEETS_HTTP2, SHEETS_MAX_CONNECTIONS, SHEETS_MAX_KEEPALIVE, SHEETS_KEEPALIVE_EXPIRY,
+    SHEETS_CONNECT_TIMEOUT, SHEETS_READ_TIMEOUT, SHEETS_STALE_MAX_AGE,
+    SHEETS_CACHE_DIR, SHEETS_CACHE_MAX_BYTES, SHEETS_CACHE_MAX_AGE, SHEETS_FETCH_CONCURRENCY
+)
 
 logger = logging.getLogger(__name__)
 
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+SHEETS_META_FILE = 'sheets.json'
+BOOTSTRAP_MARKER = 'var bootstrapData = '
+
+# Static sheet list: used instead of discovery when "static_only" is set, otherwise as the fallback
+SHEETS_CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'sheets_config.json')
+
 class SheetManager:
     SPREADSHEET_ID = "1hbvUroW0SxAbTbsn0nn-9wJyYKz-zLDJQ_PS7b83SzA"
     BASE_URL = f"https://docs.google.com/spreadsheets/d/{SPREADSHEET_ID}/edit"
+    EXPORT_URL = f"https://docs.google.com/spreadsheets/d/{SPREADSHEET_ID}/export?format=csv&gid={{gid}}"
     
     def __init__(self):
         self._sheets_cache: List[Dict] = []
         self._last_fetch = None
-        self._csv_cache: Dict[str, dict] = {} # url -> {'content': str, 'timestamp': datetime}
-    
-    async def get_csv_content(self, url: str, ttl_seconds: int = 300) -> str:
+        # url -> {'content': str, 'timestamp': datetime, 'etag': str, 'last_modified': str, 'digest': str, 'version': int}
+        self._csv_cache: Dict[str, dict] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = None # the bot's event loop, registered by start()
+        self._inflight: Dict[str, asyncio.Task] = {} # key -> shared download task
+        self._background_tasks = set()
+        self._stats = {'hit': 0, 'miss': 0, 'stale': 0, 'refresh_error': 0, 'not_modified': 0, 'unchanged': 0, 'degraded': 0}
+        self._disk_loaded = False
+
+    def export_url(self, gid: str) -> str:
+        """CSV export URL for a sheet of the schedule spreadsheet."""
+        return self.EXPORT_URL.format(gid=gid)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Cache counters since startup: hit / miss / stale (served while refreshing) / refresh_error,
+        plus not_modified (304 responses), unchanged (200 with identical content digest)
+        and degraded (cached content served because the download failed).
+        """
+        return {**self._stats, 'cached_urls': len(self._csv_cache)}
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """Build a pooled client with keep-alive (and HTTP/2 when the h2 package is available)."""
+        http2 = SHEETS_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("h2 package not installed, falling back to HTTP/1.1 for sheet downloads")
+                http2 = False
+
+        return httpx.AsyncClient(
+            follow_redirects=True,
+            http2=http2,
+            headers=HEADERS,
+            limits=httpx.Limits(
+                max_connections=SHEETS_MAX_CONNECTIONS,
+                max_keepalive_connections=SHEETS_MAX_KEEPALIVE,
+                keepalive_expiry=SHEETS_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(SHEETS_READ_TIMEOUT, connect=SHEETS_CONNECT_TIMEOUT),
+        )
+
+    def _on_bot_loop(self) -> bool:
+        """True when running on the long-lived loop registered by start() (not asyncio.run in the web app or a script)."""
+        return self._loop is not None and self._loop is asyncio.get_running_loop()
+
+    @asynccontextmanager
+    async def _client_session(self):
+        """
+        The shared pooled client on the bot's loop. Pooled connections are bound to the loop that
+        opened them, so other callers (web app, scripts using asyncio.run) get a client of their
+        own that is closed when the request is done.
+        """
+        if self._on_bot_loop():
+            if self._client is None or self._client.is_closed:
+                self._client = self._create_client()
+            yield self._client
+            return
+        async with self._create_client() as client:
+            yield client
+
+    async def start(self):
+        """Load the on-disk cache and open the shared HTTP client. Called from Application.post_init."""
+        self.load_disk_cache()
+        self._loop = asyncio.get_running_loop()
+        self._client = self._create_client()
+        logger.info("SheetManager HTTP client started")
+
+    # --- On-disk cache ---
+
+    def _disk_path(self, url: str) -> str:
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(SHEETS_CACHE_DIR, f"{name}.json")
+
+    def _write_disk_file(self, path: str, payload: dict):
+        """Write payload as JSON atomically (temp file + fsync + rename) and enforce the size bound."""
+        try:
+            # No lock: every writer has a complete copy of the sheet, the last rename wins
+            write_json(path, payload, lock=False)
+            self._evict_disk_cache()
+        except Exception as e:
+            logger.warning(f"Could not write sheet cache file {path}: {e}")
+
+    def _evict_disk_cache(self):
+        """Drop the least recently validated files until the cache fits in SHEETS_CACHE_MAX_BYTES."""
+        files = []
+        for name in os.listdir(SHEETS_CACHE_DIR):
+            if not name.endswith('.json') or name == SHEETS_META_FILE:
+                continue
+            path = os.path.join(SHEETS_CACHE_DIR, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= SHEETS_CACHE_MAX_BYTES:
+                break
+            os.remove(path)
+            total -= size
+            logger.info(f"Evicted sheet cache file {path}")
+
+    def _persist_entry(self, url: str, entry: dict, changed: bool):
+        path = self._disk_path(url)
+        if not changed and os.path.exists(path):
+            # Content is the same: just mark the file as recently validated
+            os.utime(path)
+            return
+        self._write_disk_file(path, {
+            'url': url,
+            'content': entry['content'],
+            'timestamp': entry['timestamp'].isoformat(),
+            'etag': entry.get('etag'),
+            'last_modified': entry.get('last_modified'),
+            'digest': entry.get('digest'),
+            'version': entry['version']
+        })
+
+    def load_disk_cache(self):
+        """
+        Load CSVs and sheet metadata saved by a previous run, skipping files older than SHEETS_CACHE_MAX_AGE.
+        Loaded entries are fresh, stale or expired by the timestamp of their download, like in-memory ones;
+        an expired entry is still served if downloading it fails.
+        """
+        if self._disk_loaded:
+            return
+        self._disk_loaded = True
+
+        if not os.path.isdir(SHEETS_CACHE_DIR):
+            return
+
+        loaded = 0
+        now = time.time()
+        for name in os.listdir(SHEETS_CACHE_DIR):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(SHEETS_CACHE_DIR, name)
+            try:
+                if now - os.path.getmtime(path) > SHEETS_CACHE_MAX_AGE:
+                    os.remove(path)
+                    continue
+
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+
+                if name == SHEETS_META_FILE:
+                    if not self._sheets_cache and data.get('sheets'):
+                        self._sheets_cache = data['sheets']
+                        self._last_fetch = datetime.fromisoformat(data['timestamp'])
+                    continue
+
+                url = data['url']
+                if url in self._csv_cache:
+                    continue
+                self._csv_cache[url] = {
+                    'content': data['content'],
+                    'timestamp': datetime.fromisoformat(data['timestamp']),
+                    'etag': data.get('etag'),
+                    'last_modified': data.get('last_modified'),
+                    'digest': data.get('digest'),
+                    'version': data.get('version', 1)
+                }
+                loaded += 1
+            except Exception as e:
+                logger.warning(f"Skipping unreadable sheet cache file {path}: {e}")
+
+        logger.info(f"Loaded {loaded} sheets and {len(self._sheets_cache)} sheet names from disk cache")
+
+    async def close(self):
+        """Close the shared HTTP client. Called from Application.post_shutdown."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("SheetManager HTTP client closed")
+        self._client = None
+        self._loop = None
+
+    async def _single_flight(self, key: str, factory):
+        """
+        Run factory() at most once per key at a time.
+        Concurrent callers with the same key await the same task and get the same result.
+        """
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+
+            def _done(t, key=key):
+                if self._inflight.get(key) is t:
+                    del self._inflight[key]
+                # Mark the exception as retrieved even if every waiter was cancelled
+                if not t.cancelled():
+                    t.exception()
+
+            task.add_done_callback(_done)
+        else:
+            logger.debug(f"Joining in-flight request for {key}")
+
+        # Shield so that one cancelled caller does not abort the download for the others
+        return await asyncio.shield(task)
+
+    def get_csv_version(self, url: str) -> int:
+        """
+        Version of the cached content for url (0 if never downloaded).
+        It only increases when the content actually changes, so derived data can be keyed off it.
+        """
+        cached = self._csv_cache.get(url)
+        return cached['version'] if cached else 0
+
+    async def _download_csv(self, url: str) -> dict:
+        """
+        Download url with a conditional GET and return the (possibly unchanged) cache entry.
+        Google often omits validators on exports, so a content digest decides whether the version moves.
+        """
+        cached = self._csv_cache.get(url)
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        logger.info(f"Downloading CSV from {url}")
+        async with self._client_session() as client:
+            response = await client.get(url, headers=headers)
+
+        if cached and response.status_code == 304:
+            self._stats['not_modified'] += 1
+            count('sheets_not_modified')
+            logger.debug(f"CSV not modified: {url}")
+            cached['timestamp'] = datetime.now()
+            await asyncio.to_thread(self._persist_entry, url, cached, False)
+            return cached
+
+        response.raise_for_status()
+        count('sheets_downloaded')
+        content = response.text
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+        if cached and cached.get('digest') == digest:
+            self._stats['unchanged'] += 1
+            logger.debug(f"CSV unchanged: {url}")
+            version = cached['version']
+        else:
+            version = (cached['version'] if cached else 0) + 1
+
+        entry = {
+            'content': content,
+            'timestamp': datetime.now(),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'digest': digest,
+            'version': version
+        }
+        self._csv_cache[url] = entry
+        changed = not cached or cached.get('digest') != digest or cached.get('etag') != entry['etag']
+        await asyncio.to_thread(self._persist_entry, url, entry, changed)
+        return entry
+
+    async def _run_background(self, key: str, factory):
+        try:
+            await self._single_flight(key, factory)
+        except Exception as e:
+            self._stats['refresh_error'] += 1
+            logger.warning(f"Background refresh failed for {key}: {e}")
+
+    def _schedule_refresh(self, key: str, factory):
+        """
+        Start a background refresh for key unless one is already running.
+        Only on the bot's loop: a task started under asyncio.run is cancelled when the loop closes.
+        """
+        if key in self._inflight:
+            return
+        task = asyncio.ensure_future(self._run_background(key, factory))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def get_csv_content(self, url: str, ttl_seconds: int = 300, allow_stale: bool = True) -> str:
         """
         Fetch CSV content from URL, caching it in memory for ttl_seconds (default 5 min).
+        With allow_stale, on the bot's loop, content up to SHEETS_STALE_MAX_AGE past its TTL is
+        returned immediately and refreshed in the background (stale-while-revalidate). Short-lived
+        callers (web app, scripts) have no loop to run that refresh, so they download in the foreground.
         """
+        entry = await self._get_entry(url, ttl_seconds, allow_stale)
+        return entry['content']
+
+    async def get_csv_versioned(self, url: str, ttl_seconds: int = 300, allow_stale: bool = True) -> Tuple[str, int]:
+        """
+        Same as get_csv_content but also returns the content version.
+        Callers that cache parsed data can skip re-parsing while the version is unchanged.
+        """
+        entry = await self._get_entry(url, ttl_seconds, allow_stale)
+        return entry['content'], entry['version']
+
+    async def _get_entry(self, url: str, ttl_seconds: int, allow_stale: bool) -> dict:
+        self.load_disk_cache()
         now = datetime.now()
         
         # Return from cache if valid
         cached = self._csv_cache.get(url)
-        if cached and (now - cached['timestamp']).total_seconds() < ttl_seconds:
-            logger.debug(f"Returning cached CSV for {url}")
-            return cached['content']
-            
-        logger.info(f"Downloading CSV from {url}")
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(url, headers={'User-Agent': 'Mozilla/5.0'})
-            response.raise_for_status()
-            content = response.text
-            
-        self._csv_cache[url] = {'content': content, 'timestamp': now}
-        return content
+        if cached:
+            age = (now - cached['timestamp']).total_seconds()
+            if age < ttl_seconds:
+                self._stats['hit'] += 1
+                logger.debug(f"Returning cached CSV for {url}")
+                return cached
+
+            # Entries restored from disk follow the same rule: past the stale window they are downloaded first
+            if allow_stale and self._on_bot_loop() and age < ttl_seconds + SHEETS_STALE_MAX_AGE:
+                self._stats['stale'] += 1
+                logger.debug(f"Returning stale CSV for {url} ({int(age)}s old), refreshing in background")
+                self._schedule_refresh(url, lambda: self._download_csv(url))
+                return cached
+
+        self._stats['miss'] += 1
+        try:
+            return await self._single_flight(url, lambda: self._download_csv(url))
+        except Exception as e:
+            if not cached:
+                raise
+            # Degraded mode: Google is slow or failing, answer from the last known content
+            self._stats['degraded'] += 1
+            logger.warning(f"Download failed for {url}, serving cached copy from {cached['timestamp']}: {e}")
+            return cached
+
+    async def _gather_limited(self, urls: List[str], fetch, concurrency: int) -> list:
+        """Run fetch(url) for all urls with at most `concurrency` in flight; exceptions are returned, not raised."""
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(url):
+            async with semaphore:
+                return await fetch(url)
+
+        return await asyncio.gather(*(run(url) for url in urls), return_exceptions=True)
+
+    async def get_many_versioned(self, urls: List[str], ttl_seconds: int = 300,
+                                 concurrency: int = SHEETS_FETCH_CONCURRENCY,
+                                 allow_stale: bool = True) -> Dict[str, Tuple[str, int]]:
+        """
+        Fetch several CSVs in parallel (bounded by concurrency) through the same cache as get_csv_content.
+        Returns url -> (content, version). A failing URL is logged and left out; it does not affect the others.
+        """
+        urls = list(dict.fromkeys(urls))
+        results = await self._gather_limited(urls, lambda url: self._get_entry(url, ttl_seconds, allow_stale), concurrency)
+
+        fetched = {}
+        for url, result in zip(urls, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Error fetching {url}: {result}")
+                continue
+            fetched[url] = (result['content'], result['version'])
+        return fetched
+
+    async def get_many(self, urls: List[str], ttl_seconds: int = 300,
+                       concurrency: int = SHEETS_FETCH_CONCURRENCY) -> Dict[str, str]:
+        """Same as get_many_versioned, returning url -> content."""
+        fetched = await self.get_many_versioned(urls, ttl_seconds, concurrency)
+        return {url: content for url, (content, _) in fetched.items()}
+
+    async def prewarm(self, urls: List[str]):
+        """
+        Force a fresh download of every URL so that upcoming readers hit a warm cache.
+        Failures are logged and leave the previous cache entry in place.
+        """
+        results = await self._gather_limited(
+            urls,
+            lambda url: self._single_flight(url, lambda: self._download_csv(url)),
+            SHEETS_FETCH_CONCURRENCY
+        )
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                self._stats['refresh_error'] += 1
+                logger.warning(f"Pre-warm failed for {url}: {result}")
+
+    def get_cached_sheets(self) -> List[Dict]:
+        """The last known sheet list, without any network access."""
+        return list(self._sheets_cache)
 
     async def get_sheets(self, force_refresh: bool = False) -> List[Dict]:
         """
         Get list of sheets with their GIDs and names.
         Returns list of dicts: {'name': str, 'gid': str}
         """
+        self.load_disk_cache()
         now = datetime.now()
         if self._sheets_cache and not force_refresh:
             # Refresh cache if older than 1 hour
             if self._last_fetch and (now - self._last_fetch).total_seconds() < 3600:
                 return self._sheets_cache
-        
-        self._last_fetch = now
-            
+
+            # Known sheet list (possibly restored from disk): answer now, refresh in background
+            if self._on_bot_loop():
+                self._schedule_refresh('__sheets__', self._discover_sheets)
+                return self._sheets_cache
+
+        return await self._single_flight('__sheets__', self._discover_sheets)
+
+    def _load_static_sheets(self) -> Tuple[List[Dict], bool]:
+        """Read data/sheets_config.json. Returns (sheets, static_only)."""
+        try:
+            if not os.path.exists(SHEETS_CONFIG_FILE):
+                return [], False
+            with open(SHEETS_CONFIG_FILE, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            sheets = [{'name': s['name'], 'gid': str(s['gid'])} for s in config.get('sheets', [])]
+            return sheets, bool(config.get('static_only'))
+        except Exception as e:
+            logger.error(f"Error loading sheets config: {e}")
+            return [], False
+
+    async def _fetch_bootstrap_data(self) -> Optional[str]:
+        """
+        Stream the spreadsheet /edit page and return the `bootstrapData` object literal.
+        The download is abandoned as soon as the object is complete, so the rest of the
+        (multi-megabyte) page is never read or regex-scanned.
+        """
+        async with self._client_session() as client, client.stream('GET', self.BASE_URL) as response:
+            response.raise_for_status()
+
+            buffer = ''
+            found = False
+            search_from = 0
+            async for chunk in response.aiter_text():
+                buffer += chunk
+                if not found:
+                    start = buffer.find(BOOTSTRAP_MARKER)
+                    if start < 0:
+                        # Keep just enough to catch a marker split across chunks
+                        buffer = buffer[-len(BOOTSTRAP_MARKER):]
+                        continue
+                    buffer = buffer[start + len(BOOTSTRAP_MARKER):]
+                    found = True
+
+                # Same boundary as the old `var bootstrapData = ({.*?});` regex: the first "};"
+                end = buffer.find('};', search_from)
+                if end >= 0:
+                    return buffer[:end + 1] if buffer.startswith('{') else None
+                search_from = max(0, len(buffer) - 1)
+
+        return None
+
+    async def _discover_sheets(self) -> List[Dict]:
+        self._last_fetch = datetime.now()
+
+        static_sheets, static_only = self._load_static_sheets()
+        if static_only and static_sheets:
+            self._sheets_cache = static_sheets
+            return static_sheets
+
         try:
             logger.info("Fetching spreadsheet metadata...")
-            # Use httpx instead of urllib
-            async with httpx.AsyncClient(follow_redirects=True) as client:
-                response = await client.get(self.BASE_URL, headers={'User-Agent': 'Mozilla/5.0'})
-                response.raise_for_status()
-                content = response.text
-            
             sheets = []
             
             # Extract bootstrapData
-            match = re.search(r'var bootstrapData = ({.*?});', content, re.DOTALL)
-            if match:
-                data = match.group(1)
-		
-                
+            data = await self._fetch_bootstrap_data()
+            if data:
                 # Let's look for the pattern: `[\d+,0,"(\d+)",\[\{"1":\[\[0,0,"([^"]+)"`
                 # Note the escaped quotes in the JSON string.
                 
@@ -97,13 +522,29 @@ class SheetManager:
                             'name': name,
                             'gid': gid
                         })
+
+            if not sheets and static_sheets:
+                logger.warning("No sheets found in spreadsheet metadata, using static sheet list")
+                sheets = static_sheets
                         
             self._sheets_cache = sheets
             logger.info(f"Discovered {len(sheets)} sheets: {[s['name'] for s in sheets]}")
+            if sheets:
+                await asyncio.to_thread(
+                    self._write_disk_file,
+                    os.path.join(SHEETS_CACHE_DIR, SHEETS_META_FILE),
+                    {'sheets': sheets, 'timestamp': self._last_fetch.isoformat()}
+                )
             return sheets
             
         except Exception as e:
             logger.error(f"Error discovering sheets: {e}")
+            if self._sheets_cache:
+                # Degraded mode: keep using the last known sheet list
+                self._stats['degraded'] += 1
+                return self._sheets_cache
+            if static_sheets:
+                return static_sheets
             # Fallback to known GID if discovery fails
             return [{
                 'name': 'Fallback',
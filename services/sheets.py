@@ -1,8 +1,12 @@
 import csv
 import io
 import logging
-from datetime import datetime
+import os
+from itertools import islice
+from services.data_cache import data_cache
 from services.sheet_manager import sheet_manager
+from services.schedule_model import ScheduleModel, DateIndex
+from services.user_index import get_user_index, load_employees_config, canonical_employee_name
 
 logger = logging.getLogger(__name__)
 
@@ -62,32 +66,70 @@ def get_hourly_rate_by_role(role: str) -> int:
     # Default to Pizzamaker rate if no role match
     return 205
 
-def detect_role_header(row_text: str) -> str | None:
-    """Detect if a row is a role header and return the role name"""
-    if not row_text:
-        return None
-    
-    row_lower = row_text.lower().strip()
-    
-    # Role headers mapping
-    role_headers = {
-        'менеджер': 'менеджер',
-        'наставник': 'наставник',
-        'инструктор': 'инструктор',
-        'универсал': 'универсал',
-        'кассир': 'кассир',
-        'пиццамейкер': 'пиццамейкер',
-        'стажёр': 'стажёр',
-        'стажер': 'стажёр',
-    }
-    
-    for header_key, role in role_headers.items():
-        if header_key in row_lower:
-            return role
-    
-    return None
+# url -> (content version, max_rows, parsed rows); rows are re-parsed only when the sheet content changes
+_rows_cache = {}
 
-from services.sheet_manager import sheet_manager
+# url -> ScheduleModel built from the current content version
+_model_cache = {}
+
+async def get_sheet_rows(url: str, max_rows: int = None):
+    """
+    Get the CSV rows of a sheet, parsing the download only when its content version changes.
+    With max_rows, parsing stops after that many rows.
+    """
+    content, version = await sheet_manager.get_csv_versioned(url)
+
+    cached = _rows_cache.get(url)
+    if cached and cached[0] == version and cached[1] == max_rows:
+        return cached[2]
+
+    rows = list(islice(csv.reader(io.StringIO(content)), max_rows))
+    _rows_cache[url] = (version, max_rows, rows)
+    return rows
+
+def _build_model(url: str, content: str, version: int) -> ScheduleModel:
+    cached = _model_cache.get(url)
+    if cached and cached.version == version:
+        return cached
+
+    model = ScheduleModel.from_csv(content, version)
+    _model_cache[url] = model
+    return model
+
+async def get_schedule_model(url: str) -> ScheduleModel:
+    """Get the parsed model of a schedule sheet, rebuilding it only when its content version changes."""
+    content, version = await sheet_manager.get_csv_versioned(url)
+    return _build_model(url, content, version)
+
+# "DD.MM" -> sheet holding that date, maintained as sheet models are (re)built
+_date_index = DateIndex()
+
+async def get_sheet_model(gid: str) -> ScheduleModel:
+    """Get the model of a schedule sheet by GID and keep the date index in sync with it."""
+    model = await get_schedule_model(sheet_manager.export_url(gid))
+    _date_index.update(gid, model)
+    return model
+
+async def get_sheet_models(gids):
+    """
+    Get the models of several sheets, downloading them in parallel.
+    Returns gid -> ScheduleModel; sheets that fail to download or parse are left out.
+    """
+    urls = {gid: sheet_manager.export_url(gid) for gid in gids}
+    fetched = await sheet_manager.get_many_versioned(list(urls.values()))
+
+    models = {}
+    for gid, url in urls.items():
+        if url not in fetched:
+            continue
+        try:
+            model = _build_model(url, *fetched[url])
+        except Exception as e:
+            logger.error(f"Error parsing sheet {gid}: {e}")
+            continue
+        _date_index.update(gid, model)
+        models[gid] = model
+    return models
 
 async def get_schedule(surname: str):
     if not surname:
@@ -104,151 +146,114 @@ async def get_schedule(surname: str):
             return []
             
         schedules = []
+        models = await get_sheet_models([sheet['gid'] for sheet in sheets])
         
         for sheet in sheets:
             gid = sheet['gid']
             sheet_name = sheet['name']
             
-            url = f"https://docs.google.com/spreadsheets/d/1hbvUroW0SxAbTbsn0nn-9wJyYKz-zLDJQ_PS7b83SzA/export?format=csv&gid={gid}"
-            
             try:
-                content = await sheet_manager.get_csv_content(url)
-                
-                reader = list(csv.reader(io.StringIO(content)))
-                
-                if not reader or len(reader) < 2:
+                model = models.get(gid)
+                if not model:
                     continue
 
-                dates = reader[0]
-                days = reader[1]
-                
-                # Parse start date from the first date column (index 1)
-                start_date_dt = datetime.min
-                if len(dates) > 1:
-                    try:
-                        # Date format is DD.MM
-                        # We assume current year or next year
-                        date_str = dates[1].strip()
-                        if date_str:
-                            # Add year. If it's late in the year and date is Jan, it's next year.
-                            now = datetime.now()
-                            dt = datetime.strptime(f"{date_str}.{now.year}", "%d.%m.%Y")
-                            
-                            # Heuristic for year transition:
-                            # If current month is Nov/Dec and sheet date is Jan/Feb, add 1 year.
-                            # If current month is Jan/Feb and sheet date is Nov/Dec, subtract 1 year.
-                            if now.month >= 11 and dt.month <= 2:
-                                dt = dt.replace(year=now.year + 1)
-                            elif now.month <= 2 and dt.month >= 11:
-                                dt = dt.replace(year=now.year - 1)
-                                
-                            start_date_dt = dt
-                    except:
-                        pass
+                employee = model.find_employee(surname)
+                if not employee:
+                    continue
+
+                full_name = employee['name']
+                current_role = employee['role']
+                row = employee['cells']
+                dates = model.dates
+                days = model.days
+                start_date_dt = model.start_date
+
+                hourly_rate = get_hourly_rate_by_role(current_role)
                 
-                current_role = None
+                shifts = []
+                total_hours = 0
+                total_payment = 0
                 
-                for row in reader[2:]:
-                    if not row: continue
-                    
-                    full_name = row[0].strip()
+                for i in range(1, len(row)):
+                    if i >= len(dates): break
                     
-                    if 'мойка' in full_name.lower() or full_name.lower() in ['ольга', 'екатерина', 'наталья']:
-                        break
+                    shift = row[i].strip()
+                    date = dates[i].strip()
+                    day = days[i].strip() if i < len(days) else ""
                     
-                    detected_role = detect_role_header(full_name)
-                    if detected_role:
-                        current_role = detected_role
-                        continue
-                    
-                    if surname.lower() in full_name.lower():
-                        hourly_rate = get_hourly_rate_by_role(current_role)
-                        
-                        shifts = []
-                        total_hours = 0
-                        total_payment = 0
+                    if shift:
+                        hours = calculate_shift_hours(shift)
                         
-                        for i in range(1, len(row)):
-                            if i >= len(dates): break
+                        # Only include valid shifts with actual dates and hours > 0
+                        if date and hours > 0:
+                            payment = hours * hourly_rate
+                            total_hours += hours
+                            total_payment += payment
                             
-                            shift = row[i].strip()
-                            date = dates[i].strip()
-                            day = days[i].strip() if i < len(days) else ""
+                            day_map = {
+                                'пн': 'Понедельник', 'вт': 'Вторник', 'ср': 'Среда',
+                                'чт': 'Четверг', 'пт': 'Пятница', 'сб': 'Суббота', 'вс': 'Воскресенье'
+                            }
+                            day_full = day_map.get(day.lower(), day)
                             
-                            if shift:
-                                hours = calculate_shift_hours(shift)
-                                
-                                # Only include valid shifts with actual dates and hours > 0
-                                if date and hours > 0:
-                                    payment = hours * hourly_rate
-                                    total_hours += hours
-                                    total_payment += payment
-                                    
-                                    day_map = {
-                                        'пн': 'Понедельник', 'вт': 'Вторник', 'ср': 'Среда',
-                                        'чт': 'Четверг', 'пт': 'Пятница', 'сб': 'Суббота', 'вс': 'Воскресенье'
-                                    }
-                                    day_full = day_map.get(day.lower(), day)
-                                    
-                                    shifts.append(f"• {day_full}, {date} — {shift}")
+                            shifts.append(f"• {day_full}, {date} — {shift}")
+                
+                if shifts:
+                    role_display = current_role.capitalize() if current_role else "Не указана"
+                    
+                    # Extract date range from sheet name if possible, else use sheet name
+                    # Sheet names: "Кухня 17 - 23", "кухня 24-30"
+                    # We want "17 - 23" or "17.11 — 23.11" if we can guess month
+                    # Let's stick to the sheet name numbers for now but clean it up
+                    
+                    clean_sheet_name = sheet_name.replace('кухня', '').replace('Кухня', '').strip()
+                    # Remove trailing dots or chars
+                    clean_sheet_name = clean_sheet_name.strip('.')
+                    
+                    header = f"🗓 <b>График работы</b> ({clean_sheet_name})\n👤 <b>{full_name}</b>\n💼 {role_display}\n"
+                    
+                    stats = ""
+                    if total_hours > 0:
+                        stats += f"📊 <b>Итоги недели:</b>\n"
+                        stats += f"⏱ {int(total_hours)} часов  |  💰 {int(total_payment):,}₽ (без учёта надбавки за стаж)\n".replace(',', ' ')
+                    
+                    shifts_text = "\n📋 <b>Смены:</b>\n"
+                    for shift_item in shifts:
+                        # shift_item is "• Понедельник, 17.11 — 9-23"
+                        # We want "🔹 Пн, 17.11: 9-23 (14ч)"
                         
-                        if shifts:
-                            role_display = current_role.capitalize() if current_role else "Не указана"
+                        # Parse the existing format
+                        # "• DayFull, Date — Shift"
+                        try:
+                            parts = shift_item.split('—')
+                            left = parts[0].replace('•', '').strip() # "Понедельник, 17.11"
+                            shift_time = parts[1].strip() # "9-23"
                             
-                            # Extract date range from sheet name if possible, else use sheet name
-                            # Sheet names: "Кухня 17 - 23", "кухня 24-30"
-                            # We want "17 - 23" or "17.11 — 23.11" if we can guess month
-                            # Let's stick to the sheet name numbers for now but clean it up
+                            day_date = left.split(',')
+                            day_full = day_date[0].strip()
+                            date_short = day_date[1].strip()
                             
-                            clean_sheet_name = sheet_name.replace('кухня', '').replace('Кухня', '').strip()
-                            # Remove trailing dots or chars
-                            clean_sheet_name = clean_sheet_name.strip('.')
+                            # Shorten day
+                            day_map_short = {
+                                'Понедельник': 'Пн', 'Вторник': 'Вт', 'Среда': 'Ср',
+                                'Четверг': 'Чт', 'Пятница': 'Пт', 'Суббота': 'Сб', 'Воскресенье': 'Вс'
+                            }
+                            day_short = day_map_short.get(day_full, day_full[:2])
                             
-                            header = f"🗓 <b>График работы</b> ({clean_sheet_name})\n👤 <b>{full_name}</b>\n💼 {role_display}\n"
+                            # Calculate duration again for display
+                            duration = calculate_shift_hours(shift_time)
                             
-                            stats = ""
-                            if total_hours > 0:
-                                stats += f"📊 <b>Итоги недели:</b>\n"
-                                stats += f"⏱ {int(total_hours)} часов  |  💰 {int(total_payment):,}₽ (без учёта надбавки за стаж)\n".replace(',', ' ')
-                            
-                            shifts_text = "\n📋 <b>Смены:</b>\n"
-                            for shift_item in shifts:
-                                # shift_item is "• Понедельник, 17.11 — 9-23"
-                                # We want "🔹 Пн, 17.11: 9-23 (14ч)"
-                                
-                                # Parse the existing format
-                                # "• DayFull, Date — Shift"
-                                try:
-                                    parts = shift_item.split('—')
-                                    left = parts[0].replace('•', '').strip() # "Понедельник, 17.11"
-                                    shift_time = parts[1].strip() # "9-23"
-                                    
-                                    day_date = left.split(',')
-                                    day_full = day_date[0].strip()
-                                    date_short = day_date[1].strip()
-                                    
-                                    # Shorten day
-                                    day_map_short = {
-                                        'Понедельник': 'Пн', 'Вторник': 'Вт', 'Среда': 'Ср',
-                                        'Четверг': 'Чт', 'Пятница': 'Пт', 'Суббота': 'Сб', 'Воскресенье': 'Вс'
-                                    }
-                                    day_short = day_map_short.get(day_full, day_full[:2])
-                                    
-                                    # Calculate duration again for display
-                                    duration = calculate_shift_hours(shift_time)
-                                    
-                                    shifts_text += f"🔹 {day_short}, {date_short}: {shift_time} ({int(duration)}ч)\n"
-                                except:
-                                    shifts_text += f"{shift_item}\n"
-                            
-                            text = header + "\n" + stats + shifts_text
-                            
-                            schedules.append({
-                                'text': text,
-                                'start_date': start_date_dt,
-                                'sheet_name': sheet_name
-                            })
-                        break
+                            shifts_text += f"🔹 {day_short}, {date_short}: {shift_time} ({int(duration)}ч)\n"
+                        except:
+                            shifts_text += f"{shift_item}\n"
+                    
+                    text = header + "\n" + stats + shifts_text
+                    
+                    schedules.append({
+                        'text': text,
+                        'start_date': start_date_dt,
+                        'sheet_name': sheet_name
+                    })
                         
             except Exception as e:
                 logger.error(f"Error processing sheet {sheet_name}: {e}")
@@ -268,86 +273,64 @@ async def get_shifts_for_date(target_date: str):
     Get all shifts for a specific date.
     Returns a list of dicts: {'name': str, 'role': str, 'shift': str}
     """
+    shifts, _ = await find_shifts_for_date(target_date)
+    return shifts
+
+async def find_shifts_for_date(target_date: str):
+    """
+    Same as get_shifts_for_date but also tells whether the answer is complete: (shifts, complete).
+    complete is False when the sheet list or a sheet that may hold the date failed to load,
+    i.e. an empty list doesn't mean there are no shifts.
+    """
     try:
         sheets = await sheet_manager.get_sheets()
         if not sheets:
-            return []
+            return [], False
             
-        target_sheet_content = None
-        actual_date = None
+        gids = [sheet['gid'] for sheet in sheets]
+        _date_index.retain(gids)
+        complete = True
         
-        for sheet in sheets:
-            gid = sheet['gid']
-            url = f"https://docs.google.com/spreadsheets/d/1hbvUroW0SxAbTbsn0nn-9wJyYKz-zLDJQ_PS7b83SzA/export?format=csv&gid={gid}"
-            
+        # Fast path: the index knows which sheet has this date (revalidated through the TTL cache)
+        located = _date_index.lookup(target_date)
+        if located:
             try:
-                content = await sheet_manager.get_csv_content(url)
-                
-                reader = list(csv.reader(io.StringIO(content)))
-                
-                if not reader or len(reader) < 2:
-                    continue
-                    
-                dates = reader[0]
-                
-                # Check if target_date is in this sheet
-                if target_date in [d.strip() for d in dates]:
-                    target_sheet_content = reader
-                    actual_date = target_date
-                    break
-            except:
-                continue
+                model = await get_sheet_model(located[0])
+                if model.has_date(target_date):
+                    return list(model.shifts_on(target_date)), True
+            except Exception as e:
+                logger.error(f"Error loading indexed sheet {located[0]}: {e}")
+                complete = False
         
-        if not target_sheet_content:
-             return []
-
-        reader = target_sheet_content
-        dates = reader[0]
+        # Not where the index says: revalidate every sheet (cache hits within the TTL, conditional
+        # GETs past it), so an edit to an already indexed sheet is seen too. Only sheets whose
+        # content changed are re-parsed and re-indexed.
+        models = await get_sheet_models(gids)
+        complete = complete and len(models) == len(gids)
         
-        # Find column index
-        target_col = -1
-        for i, date in enumerate(dates):
-            if date.strip() == actual_date:
-                target_col = i
-                break
-                
-        if target_col == -1:
-            return []
-
-        # Collect employees
-        shifts_data = []
-        current_role = None
+        located = _date_index.lookup(target_date)
+        if located:
+            model = models.get(located[0])
+            if model and model.has_date(target_date):
+                return list(model.shifts_on(target_date)), True
         
-        for row in reader[2:]:
-            if not row: continue
-            
-            full_name = row[0].strip()
-            
-            # Stop at Мойка section
-            if 'мойка' in full_name.lower() or full_name.lower() in ['ольга', 'екатерина', 'наталья']:
-                break
-            
-            # Check if this is a role header
-            detected_role = detect_role_header(full_name)
-            if detected_role:
-                current_role = detected_role
-                continue
-            
-            # Check if employee has a shift on this date
-            if target_col < len(row):
-                shift = row[target_col].strip()
-                if shift:
-                    shifts_data.append({
-                        'name': full_name,
-                        'role': current_role,
-                        'shift': shift
-                    })
-        
-        return shifts_data
+        return [], complete
 
     except Exception as e:
         logger.error(f"Error fetching shifts for date: {e}")
-        return []
+        return [], False
+
+async def get_date_version(target_date: str):
+    """
+    Version of the schedule data for target_date: the sheet list and the content version of the
+    sheet holding the date. None if the date hasn't been indexed yet.
+    """
+    located = _date_index.lookup(target_date)
+    if not located:
+        return None
+    gid, _ = located
+    _, version = await sheet_manager.get_csv_versioned(sheet_manager.export_url(gid))
+    return tuple(sheet['gid'] for sheet in sheet_manager.get_cached_sheets()), gid, version
 
 async def get_who_on_shift(target_date: str, surname: str = None):
     """
@@ -355,11 +338,21 @@ async def get_who_on_shift(target_date: str, surname: str = None):
     target_date: format "DD.MM" e.g. "24.11"
     surname: optional, to show the user's shift time in the header
     """
+    text, _ = await render_who_on_shift(target_date, surname)
+    return text
+
+async def render_who_on_shift(target_date: str, surname: str = None):
+    """
+    Same as get_who_on_shift but returns (text, complete). complete is False when text is an
+    error or was built from a failed load, so it must not be reused once the data is back.
+    """
     try:
-        shifts_data = await get_shifts_for_date(target_date)
+        shifts_data, complete = await find_shifts_for_date(target_date)
         
         if not shifts_data:
-             return f"На {target_date} нет смен в графике или график не найден."
+             return f"На {target_date} нет смен в графике или график не найден.", complete
+
+        user_index = get_user_index() if surname else None
 
         # Group by role
         employees_by_role = {}
@@ -376,7 +369,7 @@ async def get_who_on_shift(target_date: str, surname: str = None):
                     employees_by_role[role] = []
                 employees_by_role[role].append(f"👤 {name} ({shift})")
             
-            if surname and surname.lower() in name.lower():
+            if surname and user_index.matches(surname, name):
                 user_shift_time = shift
         
         # Build output
@@ -406,45 +399,51 @@ async def get_who_on_shift(target_date: str, surname: str = None):
                 lines.extend(employees)
                 lines.append("")  # Empty line between roles
         
-        return "\n".join(lines)
+        return "\n".join(lines), True
         
     except Exception as e:
         logger.error(f"Error fetching who's on shift: {e}")
-        return "Произошла ошибка при получении данных о смене."
+        return "Произошла ошибка при получении данных о смене.", False
 
 PREPS_URL = "https://docs.google.com/spreadsheets/d/1TdoxhVu3l2blTtpf_ekoIESR7MYQDxs1/export?format=csv&gid=1242464660"
+# Morning rows are 2-8, evening rows 10-16: nothing below row 16 is used
+PREPS_MAX_ROWS = 17
 
 
 
+PREPS_CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'preps_config.json')
+
+async def get_preps_version():
+    """Version of everything get_preps reads: the preps sheet and preps_config.json."""
+    _, version = await sheet_manager.get_csv_versioned(PREPS_URL)
+    config_mtime = os.path.getmtime(PREPS_CONFIG_FILE) if os.path.exists(PREPS_CONFIG_FILE) else None
+    return version, config_mtime
+
 def load_preps_config():
-    try:
-        import json
-        import os
-        # Use absolute path relative to this file
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        config_path = os.path.join(base_dir, 'data', 'preps_config.json')
-        if not os.path.exists(config_path):
-            return None
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading preps config: {e}")
-        return None
+    """data/preps_config.json, cached until the file changes (don't modify the result)."""
+    return data_cache.get_file(PREPS_CONFIG_FILE)
 
 async def get_preps(day_index: int, is_morning: bool):
     """
     day_index: 0=Mon, 1=Tue, ..., 6=Sun
     is_morning: True for Morning, False for Evening
     """
+    text, _ = await render_preps(day_index, is_morning)
+    return text
+
+async def render_preps(day_index: int, is_morning: bool):
+    """
+    Same as get_preps but returns (text, complete). complete is False when text is an error
+    or lacks the vegetables because the sheet came back short.
+    """
     try:
         # 1. Fetch Vegetables from Sheet (Existing Logic)
-        content = await sheet_manager.get_csv_content(PREPS_URL)
-            
-        reader = list(csv.reader(io.StringIO(content)))
+        reader = await get_sheet_rows(PREPS_URL, PREPS_MAX_ROWS)
+        complete = bool(reader and len(reader) >= 15)
         
         items = []
         
-        if reader and len(reader) >= 15:
+        if complete:
             # Define rows based on Morning/Evening
             # Morning: Rows 2-8 (indices 2-8)
             # Evening: Rows 10-16 (indices 10-16)
@@ -553,7 +552,7 @@ async def get_preps(day_index: int, is_morning: bool):
                         items.append(f"• {sauce['name']}: `{sauce['quantity']}`")
         
         if not items:
-            return "Нет заготовок на этот день/смену."
+            return "Нет заготовок на этот день/смену.", complete
             
         title = "☀️ Утро" if is_morning else "🌙 Вечер"
         days = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
@@ -561,37 +560,18 @@ async def get_preps(day_index: int, is_morning: bool):
         header = f"🔪 **Заготовки на {days[day_index]}** ({title})\n━━━━━━━━━━━━\n"
         body = "\n".join(items)
         
-        return header + body
+        return header + body, complete
 
     except Exception as e:
         logger.error(f"Error fetching preps: {e}")
-        return "Произошла ошибка при получении заготовок."
+        return "Произошла ошибка при получении заготовок.", False
 
 async def get_all_employees():
     """
     Get a list of all unique employee names from the schedule.
     """
     try:
-        # Load config
-        import json
-        import os
-        # Use absolute path relative to this file
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        config_path = os.path.join(base_dir, 'data', 'employees_config.json')
-        blacklist = []
-        aliases = {}
-        
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    blacklist = [name.lower() for name in config.get('blacklist', [])]
-                    # Flatten aliases for reverse lookup: "Variant" -> "Canonical"
-                    for canonical, variants in config.get('aliases', {}).items():
-                        for variant in variants:
-                            aliases[variant.lower()] = canonical
-            except Exception as e:
-                logger.error(f"Error loading employees config: {e}")
+        blacklist, aliases = load_employees_config()
 
         sheets = await sheet_manager.get_sheets()
         if not sheets:
@@ -604,51 +584,28 @@ async def get_all_employees():
         for manual_emp in MANUAL_EMPLOYEES:
             employees.add(manual_emp)
         
+        models = await get_sheet_models([sheet['gid'] for sheet in sheets])
+        
         for sheet in sheets:
             gid = sheet['gid']
-            url = f"https://docs.google.com/spreadsheets/d/1hbvUroW0SxAbTbsn0nn-9wJyYKz-zLDJQ_PS7b83SzA/export?format=csv&gid={gid}"
-            
             try:
-                content = await sheet_manager.get_csv_content(url)
-                
-                reader = list(csv.reader(io.StringIO(content)))
-                
-                if not reader or len(reader) < 2:
+                model = models.get(gid)
+                if not model:
                     continue
                 
-                for row in reader[2:]:
-                    if not row: continue
-                    
-                    full_name = row[0].strip()
+                for employee in model.employees:
+                    full_name = employee['name']
                     
                     # Skip empty or specific non-employee rows
                     if not full_name: continue
-                    if 'мойка' in full_name.lower(): break # Stop at Moyka
-                    if full_name.lower() in ['ольга', 'екатерина', 'наталья']: break 
-                    
-                    if detect_role_header(full_name):
-                        continue
                         
                     # Also skip if it looks like a date or empty
                     if len(full_name) < 2: continue
                     
-                    # Normalization
-                    # 1. Replace multiple spaces with single space
-                    normalized_name = ' '.join(full_name.split())
-                    
-                    # 2. Check blacklist
-                    is_blacklisted = False
-                    for black_name in blacklist:
-                        if black_name in normalized_name.lower():
-                            is_blacklisted = True
-                            break
-                    if is_blacklisted:
+                    # Single spaces, blacklist and aliases/duplicates
+                    normalized_name = canonical_employee_name(full_name, blacklist, aliases)
+                    if not normalized_name:
                         continue
-                        
-                    # 3. Handle aliases/duplicates
-                    # Check if this name is an alias for something else
-                    if normalized_name.lower() in aliases:
-                        normalized_name = aliases[normalized_name.lower()]
                     
                     employees.add(normalized_name)
                     
@@ -0,0 +1,275 @@
+"""
+Shift reminder planner.
+
+Instead of scanning the schedule every few minutes, the planner builds the exact reminder
+timeline (shift start minus SHIFT_REMINDER_LEAD_MINUTES) for today and tomorrow and keeps
+one JobQueue job per fire time, holding every reminder due at that moment. It re-plans only
+when an input changes: the schedule sheets, the registered users or the calendar day. Re-planning only
+adds and removes the jobs that differ.
+
+There is no job per reminder: a job is named shift_reminder:<DD.MM:HH:MM> after its fire time and
+sends to all its recipients as one batch. Duplicates are prevented by the ledger, not by the job
+names: the batch claims its reminders before sending, so a re-plan running meanwhile skips them.
+"""
+import logging
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from telegram.ext import ContextTypes
+from config import SHIFT_REMINDER_LEAD_MINUTES
+from services.scheduler import parse_shift_starts
+from services.sheets import find_shifts_for_date
+from services.sheet_manager import sheet_manager
+from services.user_index import get_user_index, index_version
+from services.send_queue import send_batch, SENT, UNDELIVERABLE
+from services.notification_ledger import ledger
+from services.job_metrics import instrumented, phase, count
+
+logger = logging.getLogger(__name__)
+
+TZ = ZoneInfo('Europe/Moscow')
+REMINDER_JOB_PREFIX = 'shift_reminder:'
+RECONCILE_JOB_NAME = 'reconcile_shift_reminders'
+# Reminders whose send failed (network error, flood control exhausted) are retried a few times
+REMINDER_RETRY_DELAY = 60
+REMINDER_MAX_ATTEMPTS = 3
+
+def _lead_text(minutes: int) -> str:
+    """'через час', 'через 30 минут', 'через 2 часа', 'через 1 ч 30 мин' for the reminder lead time."""
+    def plural(n, one, few, many):
+        if n % 10 == 1 and n % 100 != 11:
+            return one
+        if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+            return few
+        return many
+
+    hours, mins = divmod(minutes, 60)
+    if hours and mins:
+        return f"через {hours} ч {mins} мин"
+    if hours == 1:
+        return "через час"
+    if hours:
+        return f"через {hours} {plural(hours, 'час', 'часа', 'часов')}"
+    return f"через {mins} {plural(mins, 'минуту', 'минуты', 'минут')}"
+
+# Inputs the current plan was built from
+_last_signature = None
+
+def _inputs_signature(now: datetime):
+    """Everything the plan depends on: the day, the registered users (and name aliases) and the versions of all schedule sheets."""
+    sheet_versions = tuple(
+        (sheet['gid'], sheet_manager.get_csv_version(sheet_manager.export_url(sheet['gid'])))
+        for sheet in sheet_manager.get_cached_sheets()
+    )
+    return now.strftime("%d.%m"), index_version(), sheet_versions
+
+async def _build_plan(now: datetime):
+    """
+    Desired reminders for today and tomorrow, grouped by fire time.
+    Returns (plan, incomplete dates): plan is job name -> {'fire_at': datetime, 'reminders':
+    [{'user_id', 'name', 'shift', 'date', 'start'}]}; the dates whose shifts failed to load are
+    not in it. A split shift gives one reminder per start.
+    """
+    user_index = get_user_index()
+    plan = {}
+    incomplete = set()
+
+    if not user_index:
+        return plan, incomplete
+
+    ledger.refresh()
+
+    # Today and tomorrow, to handle reminders for shifts right after midnight
+    for date_obj in [now, now + timedelta(days=1)]:
+        date_str = date_obj.strftime("%d.%m")
+
+        shifts, complete = await find_shifts_for_date(date_str)
+        if not complete:
+            incomplete.add(date_str)
+            continue
+        for shift_data in shifts:
+            name = shift_data['name']
+            shift_time = shift_data['shift']
+
+            # All user_ids registered under this name (handles duplicates)
+            user_ids = user_index.user_ids_for(name)
+            if not user_ids:
+                continue
+
+            for start_h, start_m in parse_shift_starts(shift_time):
+                shift_start = date_obj.replace(hour=start_h, minute=start_m, second=0, microsecond=0)
+                if shift_start <= now:
+                    continue
+                start = f"{start_h:02d}:{start_m:02d}"
+
+                for uid in user_ids:
+                    # Already reminded for this shift start
+                    if ledger.was_sent(uid, date_str, start):
+                        continue
+
+                    fire_at = shift_start - timedelta(minutes=SHIFT_REMINDER_LEAD_MINUTES)
+                    job_name = f"{REMINDER_JOB_PREFIX}{fire_at.strftime('%d.%m:%H:%M')}"
+                    slot = plan.setdefault(job_name, {'fire_at': fire_at, 'reminders': []})
+                    slot['reminders'].append({
+                        'user_id': uid,
+                        'name': name,
+                        'shift': shift_time,
+                        'date': date_str,
+                        'start': start
+                    })
+
+    # Stable order, so an unchanged slot compares equal to its scheduled job
+    for slot in plan.values():
+        slot['reminders'].sort(key=lambda r: (r['user_id'], r['date'], r['start']))
+
+    return plan, incomplete
+
+async def reconcile_shift_reminders(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Rebuild the reminder plan and apply only the differences to the JobQueue.
+    Reminders whose time already passed but whose shift hasn't started fire right away.
+    """
+    global _last_signature
+    try:
+        now = datetime.now(TZ)
+        with phase('plan'):
+            plan, incomplete = await _build_plan(now)
+        job_queue = context.job_queue
+
+        existing = {
+            job.name: job for job in job_queue.jobs()
+            if job.name and job.name.startswith(REMINDER_JOB_PREFIX)
+        }
+
+        # A date whose schedule failed to load keeps the reminders planned before
+        for job_name, job in existing.items():
+            if job_name not in plan and any(r['date'] in incomplete for r in job.data['reminders']):
+                plan[job_name] = job.data
+
+        removed = 0
+        for job_name, job in existing.items():
+            if plan.get(job_name) != job.data:
+                job.schedule_removal()
+                removed += 1
+
+        added = 0
+        for job_name, data in plan.items():
+            job = existing.get(job_name)
+            if job and job.data == data:
+                continue
+            when = max(data['fire_at'], now + timedelta(seconds=1))
+            job_queue.run_once(instrumented(send_shift_reminders), when=when, name=job_name, data=data)
+            added += 1
+
+        # Taken after building the plan, which may itself have refreshed some sheets.
+        # With a date missing, the next sync plans again even if nothing changed.
+        _last_signature = None if incomplete else _inputs_signature(now)
+        if incomplete:
+            logger.warning(f"Shifts for {sorted(incomplete)} failed to load, kept their planned reminders")
+        planned = sum(len(slot['reminders']) for slot in plan.values())
+        count('reminders_planned', planned)
+        count('jobs_added', added)
+        count('jobs_removed', removed)
+        logger.info(f"Shift reminders reconciled: {planned} planned in {len(plan)} slots, {added} added, {removed} removed")
+
+    except Exception as e:
+        logger.error(f"Error in reconcile_shift_reminders: {e}")
+
+async def sync_shift_reminders(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Periodic cheap check: revalidate the schedule sheets and re-plan only if the schedule, the
+    users or the day changed. Sheets still within their TTL aren't downloaded; the others are
+    revalidated with conditional GETs before the versions are compared, not in the background.
+    """
+    try:
+        sheets = await sheet_manager.get_sheets()
+        with phase('fetch'):
+            await sheet_manager.get_many_versioned(
+                [sheet_manager.export_url(sheet['gid']) for sheet in sheets], allow_stale=False
+            )
+
+        if _inputs_signature(datetime.now(TZ)) != _last_signature:
+            await reconcile_shift_reminders(context)
+    except Exception as e:
+        logger.error(f"Error in sync_shift_reminders: {e}")
+
+def request_reconcile(job_queue, delay: float = 1):
+    """Queue a re-plan soon (e.g. after a registration change). Repeated requests are coalesced."""
+    if not job_queue:
+        return
+    if job_queue.get_jobs_by_name(RECONCILE_JOB_NAME):
+        return
+    job_queue.run_once(instrumented(reconcile_shift_reminders), delay, name=RECONCILE_JOB_NAME)
+
+async def send_shift_reminders(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Send all reminders of one fire time concurrently and record them in a single write.
+    The reminders are claimed in the ledger before the first await, so a reconcile running
+    during the batch sees them as sent and doesn't plan them again. A chat that can't receive
+    messages (blocked bot, deleted account) is recorded too: retrying it on every re-plan won't help.
+    Reminders that failed otherwise are sent again by a retry job, up to REMINDER_MAX_ATTEMPTS times.
+    """
+    reminders = context.job.data['reminders']
+    due = []
+    recorded = set()
+
+    try:
+        ledger.refresh()
+        due = [r for r in reminders if ledger.claim(r['user_id'], r['date'], r['start'])]
+        if not due:
+            return
+
+        with phase('send'):
+            outcomes = await send_batch(context.bot, [
+                {
+                    'chat_id': r['user_id'],
+                    'text': f"⏰ Напоминание!\nТвоя смена начинается {_lead_text(SHIFT_REMINDER_LEAD_MINUTES)} ({r['shift']}).\nПора собираться на работу!"
+                }
+                for r in due
+            ])
+
+        sent = undeliverable = 0
+        for reminder, outcome in zip(due, outcomes):
+            if outcome == SENT:
+                sent += 1
+                logger.info(f"Sent notification to {reminder['name']} ({reminder['user_id']}) for shift {reminder['shift']} on {reminder['date']}")
+            elif outcome == UNDELIVERABLE:
+                undeliverable += 1
+            else:
+                continue
+            ledger.mark_sent(reminder['user_id'], reminder['date'], reminder['start'])
+            recorded.add((reminder['user_id'], reminder['date'], reminder['start']))
+
+        if sent or undeliverable:
+            with phase('save'):
+                ledger.save()
+        if undeliverable:
+            count('reminders_undeliverable', undeliverable)
+        logger.info(f"Shift reminders sent: {sent}/{len(due)}" + (f", {undeliverable} undeliverable" if undeliverable else ""))
+
+    except Exception as e:
+        logger.error(f"Error in send_shift_reminders: {e}")
+    finally:
+        # Whatever wasn't marked sent can be planned again
+        for r in due:
+            ledger.release(r['user_id'], r['date'], r['start'])
+        failed = [r for r in due if (r['user_id'], r['date'], r['start']) not in recorded]
+        if failed:
+            _schedule_retry(context.job_queue, context.job.data, failed)
+
+def _schedule_retry(job_queue, data: dict, failed: list):
+    """
+    Send failed reminders again in REMINDER_RETRY_DELAY seconds. The slot's own job is used up and
+    a re-plan only happens when an input changes, so nothing else would. A re-plan in the meantime
+    drops the retry job (it isn't in the plan) and plans the reminders itself.
+    """
+    attempt = data.get('attempt', 1) + 1
+    if attempt > REMINDER_MAX_ATTEMPTS:
+        count('reminders_failed', len(failed))
+        logger.error(f"Giving up on {len(failed)} shift reminders after {REMINDER_MAX_ATTEMPTS} attempts")
+        return
+    job_name = f"{REMINDER_JOB_PREFIX}retry:{data['fire_at'].strftime('%d.%m:%H:%M')}:{attempt}"
+    job_queue.run_once(
+        instrumented(send_shift_reminders), when=REMINDER_RETRY_DELAY, name=job_name,
+        data={'fire_at': data['fire_at'], 'reminders': failed, 'attempt': attempt}
+    )
+    logger.warning(f"{len(failed)} shift reminders failed, retrying in {REMINDER_RETRY_DELAY}s (attempt {attempt}/{REMINDER_MAX_ATTEMPTS})")
@@ -0,0 +1,414 @@
+"""
+SQLite storage of the bot's state (STORAGE_DB_FILE, WAL mode).
+
+Registered users, sent shift reminders, settings (group id), ratings photos and the medical
+records used to live in JSON files that were read and rewritten whole on every change. Here each
+change is a row-level write in its own transaction, and WAL lets the bot, the web app and the
+scripts (not_subscribed.py) read while another process writes.
+
+On the first connection of a process (initialize()) the old JSON files found in data/ are
+imported and renamed to "<file>.imported". Importing only adds rows (a user registered since is
+never dropped), so editing an old users.json is not a way to change the bot's state: use
+manage_users.py (or the bot's own commands). The group messages are not in here, they have
+their own append-only log (services/message_collector.py).
+
+versions counts the changes per table, so in-memory views (user index, reminder ledger) can tell
+cheaply whether they are stale. The hot reads (users, settings, medical records) go through
+services/data_cache.py keyed by that counter, and every committed transaction drops this
+database's cache entries, so the writing process sees its own changes at once.
+"""
+import json
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import STORAGE_DB_FILE
+from services.data_cache import data_cache
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = 'data'
+IMPORTED_SUFFIX = '.imported'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_name ON users (name);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    start TEXT NOT NULL,
+    PRIMARY KEY (user_id, date, start)
+);
+CREATE INDEX IF NOT EXISTS notifications_date ON notifications (date);
+
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS ratings (
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    file_id TEXT NOT NULL,
+    PRIMARY KEY (kind, position)
+);
+
+CREATE TABLE IF NOT EXISTS medical (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    role TEXT,
+    status TEXT,
+    med_commission_date TEXT,
+    san_min_date TEXT,
+    extra TEXT
+);
+
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS imports (
+    file TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+"""
+
+MEDICAL_COLUMNS = ('name', 'role', 'status', 'med_commission_date', 'san_min_date')
+
+def _medical_row(row: sqlite3.Row) -> Dict:
+    """Medical record as the dict the handlers know (absent fields are left out, not None)."""
+    employee = json.loads(row['extra']) if row['extra'] else {}
+    for column in MEDICAL_COLUMNS:
+        if row[column] is not None:
+            employee[column] = row[column]
+    return employee
+
+def _medical_values(employee: Dict) -> Tuple:
+    extra = {key: value for key, value in employee.items() if key not in MEDICAL_COLUMNS}
+    return tuple(employee.get(column) for column in MEDICAL_COLUMNS) + (json.dumps(extra, ensure_ascii=False) if extra else None,)
+
+def _user_name(value) -> Optional[str]:
+    # Very old users.json entries were {"surname": ...}
+    if isinstance(value, dict):
+        value = value.get('surname') or value.get('name')
+    return value if isinstance(value, str) and value else None
+
+class Storage:
+    def __init__(self, path: str = STORAGE_DB_FILE, data_dir: str = DATA_DIR):
+        self.path = path
+        self.data_dir = data_dir
+        self._initialized = False
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        # Durable at every checkpoint; in WAL mode this can't corrupt the database
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def initialize(self):
+        """Create the schema and import the old JSON files. Done on the first connection, or explicitly at startup."""
+        if self._initialized:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = self._open()
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SCHEMA)
+            conn.commit()
+        finally:
+            conn.close()
+        self._initialized = True
+        self.import_json_files()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.initialize()
+        return self._open()
+
+    @contextmanager
+    def transaction(self):
+        """Connection in a transaction: committed on success, rolled back on an exception."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                yield conn
+        finally:
+            conn.close()
+        data_cache.invalidate((self.path,))
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, name: str):
+        conn.execute(
+            "INSERT INTO versions (name, version) VALUES (?, 1) "
+            "ON CONFLICT (name) DO UPDATE SET version = version + 1",
+            (name,)
+        )
+
+    def version(self, name: str) -> int:
+        """Change counter of a table (0 if it never changed)."""
+        rows = self._query("SELECT version FROM versions WHERE name = ?", (name,))
+        return rows[0]['version'] if rows else 0
+
+    def _cached(self, name: str, load):
+        """load() result cached until the `name` table changes. Shared: callers return copies."""
+        return data_cache.get((self.path, name), lambda: self.version(name), load)
+
+    # --- Users ---
+
+    def get_users(self) -> Dict[str, str]:
+        """user_id -> the name picked at registration."""
+        return dict(self._cached('users', self._load_users))
+
+    def _load_users(self) -> Dict[str, str]:
+        return {row['user_id']: row['name'] for row in self._query("SELECT user_id, name FROM users")}
+
+    def get_user_name(self, user_id) -> Optional[str]:
+        return self._cached('users', self._load_users).get(str(user_id))
+
+    def register_user(self, user_id, name: str) -> bool:
+        """Register user_id as `name`. False if another user already registered that name."""
+        with self.transaction() as conn:
+            taken = conn.execute(
+                "SELECT 1 FROM users WHERE name = ? AND user_id != ?", (name, str(user_id))
+            ).fetchone()
+            if taken:
+                return False
+            conn.execute(
+                "INSERT INTO users (user_id, name) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET name = excluded.name",
+                (str(user_id), name)
+            )
+            self._bump(conn, 'users')
+            return True
+
+    def delete_user(self, user_id) -> bool:
+        with self.transaction() as conn:
+            deleted = conn.execute("DELETE FROM users WHERE user_id = ?", (str(user_id),)).rowcount
+            if deleted:
+                self._bump(conn, 'users')
+            return deleted > 0
+
+    # --- Sent shift reminders ---
+
+    def get_notifications(self, dates: Iterable[str]) -> List[Tuple[str, str, str]]:
+        """(user_id, "DD.MM", "HH:MM") of the reminders sent on the given dates."""
+        dates = list(dates)
+        rows = self._query(
+            f"SELECT user_id, date, start FROM notifications WHERE date IN ({', '.join('?' * len(dates))})",
+            tuple(dates)
+        )
+        return [(row['user_id'], row['date'], row['start']) for row in rows]
+
+    def add_notifications(self, sent: Iterable[Tuple[str, str, str]], keep_dates: Iterable[str]):
+        """Record sent reminders and drop those of dates outside keep_dates, in one transaction."""
+        keep_dates = list(keep_dates)
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO notifications (user_id, date, start) VALUES (?, ?, ?)", list(sent))
+            conn.execute(
+                f"DELETE FROM notifications WHERE date NOT IN ({', '.join('?' * len(keep_dates))})",
+                tuple(keep_dates)
+            )
+            self._bump(conn, 'notifications')
+
+    # --- Settings ---
+
+    def get_setting(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        value = self._cached('settings', self._load_settings).get(key)
+        return value if value is not None else default
+
+    def _load_settings(self) -> Dict[str, Optional[str]]:
+        return {row['key']: row['value'] for row in self._query("SELECT key, value FROM settings")}
+
+    def set_setting(self, key: str, value: Optional[str]):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO settings (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+            self._bump(conn, 'settings')
+
+    def get_group_id(self) -> Optional[str]:
+        """Id of the pizzeria group chat set with /set_group."""
+        return self.get_setting('group_id')
+
+    def set_group_id(self, group_id):
+        self.set_setting('group_id', str(group_id))
+
+    # --- Ratings photos ---
+
+    def get_ratings(self) -> Dict[str, List[str]]:
+        """{'rs': [file_id, ...], 'rp': [...]}"""
+        ratings = {'rs': [], 'rp': []}
+        for row in self._query("SELECT kind, file_id FROM ratings ORDER BY kind, position"):
+            ratings.setdefault(row['kind'], []).append(row['file_id'])
+        return ratings
+
+    def set_ratings(self, kind: str, file_ids: List[str]):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM ratings WHERE kind = ?", (kind,))
+            conn.executemany(
+                "INSERT INTO ratings (kind, position, file_id) VALUES (?, ?, ?)",
+                [(kind, position, file_id) for position, file_id in enumerate(file_ids) if file_id]
+            )
+            self._bump(conn, 'ratings')
+
+    # --- Medical records ---
+
+    def get_medical_employees(self) -> List[Dict]:
+        """Medical records in the order they were added."""
+        # Copies: the handlers sort and edit what they get
+        return [dict(employee) for employee in self._cached('medical', self._load_medical)]
+
+    def _load_medical(self) -> List[Dict]:
+        return [_medical_row(row) for row in self._query("SELECT * FROM medical ORDER BY id")]
+
+    def find_medical_employee(self, surname: str) -> Optional[Dict]:
+        """First record whose name contains `surname`, case-insensitive (done in Python: SQLite's lower() is ASCII-only)."""
+        surname = surname.lower()
+        for employee in self.get_medical_employees():
+            if surname in employee['name'].lower():
+                return employee
+        return None
+
+    def update_medical_employee(self, name: str, **fields) -> bool:
+        """Set fields of the record `name`; a None value removes the field."""
+        columns = [column for column in fields if column in MEDICAL_COLUMNS[1:]]
+        if not columns:
+            return False
+        with self.transaction() as conn:
+            updated = conn.execute(
+                f"UPDATE medical SET {', '.join(f'{column} = ?' for column in columns)} WHERE name = ?",
+                tuple(fields[column] for column in columns) + (name,)
+            ).rowcount
+            if updated:
+                self._bump(conn, 'medical')
+            return updated > 0
+
+    def add_medical_employee(self, employee: Dict) -> bool:
+        """Add a record. False if a record with the same name (case-insensitive) exists."""
+        with self.transaction() as conn:
+            names = [row['name'].lower() for row in conn.execute("SELECT name FROM medical")]
+            if employee['name'].lower() in names:
+                return False
+            conn.execute(
+                f"INSERT INTO medical ({', '.join(MEDICAL_COLUMNS)}, extra) VALUES (?, ?, ?, ?, ?, ?)",
+                _medical_values(employee)
+            )
+            self._bump(conn, 'medical')
+            return True
+
+    def remove_medical_employee(self, name: str) -> bool:
+        """Remove the record named `name` (case-insensitive)."""
+        with self.transaction() as conn:
+            for row in conn.execute("SELECT id, name FROM medical").fetchall():
+                if row['name'].lower() == name.lower():
+                    conn.execute("DELETE FROM medical WHERE id = ?", (row['id'],))
+                    self._bump(conn, 'medical')
+                    return True
+            return False
+
+    # --- Import of the old JSON files ---
+    # Additive only: rows already in the database win, nothing is deleted.
+
+    def _import_users(self, conn, data):
+        for user_id, value in data.items():
+            name = _user_name(value)
+            if name:
+                conn.execute("INSERT OR IGNORE INTO users (user_id, name) VALUES (?, ?)", (str(user_id), name))
+        self._bump(conn, 'users')
+
+    def _import_notifications(self, conn, data):
+        for user_id, entry in data.items():
+            # Old format: {user_id: "DD.MM"}, the whole date was reminded
+            dates = {entry: ['*']} if isinstance(entry, str) else entry
+            for date, starts in dates.items():
+                conn.executemany(
+                    "INSERT OR IGNORE INTO notifications (user_id, date, start) VALUES (?, ?, ?)",
+                    [(str(user_id), date, start) for start in starts]
+                )
+        self._bump(conn, 'notifications')
+
+    def _import_group(self, conn, data):
+        # group.json is how deploy_group_json.sh sets the group: its values are applied
+        for key, value in data.items():
+            conn.execute(
+                "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, str(value) if value is not None else None)
+            )
+        self._bump(conn, 'settings')
+
+    def _import_ratings(self, conn, data):
+        for kind in ('rs', 'rp'):
+            if conn.execute("SELECT 1 FROM ratings WHERE kind = ?", (kind,)).fetchone():
+                continue
+            file_ids = data.get(kind) or []
+            if isinstance(file_ids, str):
+                file_ids = [file_ids]
+            conn.executemany(
+                "INSERT INTO ratings (kind, position, file_id) VALUES (?, ?, ?)",
+                [(kind, position, file_id) for position, file_id in enumerate(file_ids) if file_id]
+            )
+        self._bump(conn, 'ratings')
+
+    def _import_medical(self, conn, data):
+        names = {row['name'].lower() for row in conn.execute("SELECT name FROM medical")}
+        for employee in data.get('employees', []):
+            if employee.get('name') and employee['name'].lower() not in names:
+                conn.execute(
+                    f"INSERT OR IGNORE INTO medical ({', '.join(MEDICAL_COLUMNS)}, extra) VALUES (?, ?, ?, ?, ?, ?)",
+                    _medical_values(employee)
+                )
+                names.add(employee['name'].lower())
+        self._bump(conn, 'medical')
+
+    def import_json_files(self):
+        """
+        Import the JSON state files of older versions, then rename each to "<file>.imported" so it is
+        imported only once. A file put back later (e.g. group.json by deploy_group_json.sh) is
+        imported on the next start the same way; its rows are added, never replacing live ones.
+        """
+        importers = {
+            'users.json': self._import_users,
+            'notifications.json': self._import_notifications,
+            'group.json': self._import_group,
+            'ratings.json': self._import_ratings,
+            'medical_info.json': self._import_medical,
+        }
+        for filename, importer in importers.items():
+            path = os.path.join(self.data_dir, filename)
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                with self.transaction() as conn:
+                    importer(conn, data)
+                    conn.execute(
+                        "INSERT INTO imports (file, mtime) VALUES (?, ?) ON CONFLICT (file) DO UPDATE SET mtime = excluded.mtime",
+                        (filename, os.path.getmtime(path))
+                    )
+                imported_path = path + IMPORTED_SUFFIX
+                if os.path.exists(imported_path):
+                    imported_path += '.' + datetime.now().strftime('%Y%m%d%H%M%S')
+                os.replace(path, imported_path)
+                logger.info(f"Imported {path} into {self.path}, renamed to {imported_path}")
+            except Exception as e:
+                logger.error(f"Error importing {path}: {e}")
+
+storage = Storage()
@@ -0,0 +1,134 @@
+"""
+Registered users indexed by employee name.
+
+The users table maps user_id -> the name picked at registration, shift rows carry the name as it
+is written in the schedule. Both sides are canonicalized with the aliases and blacklist from
+data/employees_config.json (the same rules as get_all_employees), so matching a shift row to its
+subscribers is a dict lookup. The index is rebuilt only when the users or the config change.
+"""
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+from services.data_cache import data_cache
+from services.schedule_model import normalize_name
+from services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+EMPLOYEES_CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'employees_config.json')
+
+def _parse_employees_config(path: str) -> Tuple[List[str], Dict[str, str]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    blacklist = [name.lower() for name in config.get('blacklist', [])]
+    # Flatten aliases for reverse lookup: "Variant" -> "Canonical"
+    aliases = {}
+    for canonical, variants in config.get('aliases', {}).items():
+        for variant in variants:
+            aliases[variant.lower()] = canonical
+    return blacklist, aliases
+
+def load_employees_config() -> Tuple[List[str], Dict[str, str]]:
+    """
+    Load data/employees_config.json (cached until the file changes; don't modify the result).
+    Returns (blacklist, aliases): lowercased blacklisted names and "variant" (lowercased) -> "Canonical Name".
+    """
+    return data_cache.get_file(EMPLOYEES_CONFIG_FILE, load=_parse_employees_config, default=([], {}))
+
+def canonical_employee_name(full_name: str, blacklist: List[str], aliases: Dict[str, str]) -> Optional[str]:
+    """Canonical form of a schedule name (single spaces, aliases resolved), or None if blacklisted."""
+    normalized_name = ' '.join(full_name.split())
+    name_lower = normalized_name.lower()
+
+    for black_name in blacklist:
+        if black_name in name_lower:
+            return None
+
+    return aliases.get(name_lower, normalized_name)
+
+class UserIndex:
+    """Canonical employee name -> subscribed user_ids."""
+
+    def __init__(self, users: Dict[str, str], blacklist: List[str], aliases: Dict[str, str]):
+        self.blacklist = blacklist
+        self.aliases = aliases
+        self._by_name: Dict[str, List[str]] = {}
+        # Old registrations stored only a surname: (surname, user_id), matched as a substring
+        self._by_surname: List[Tuple[str, str]] = []
+        # Schedule name -> user_ids, each distinct row is resolved once per index
+        self._cache: Dict[str, List[str]] = {}
+
+        for uid, registered_name in users.items():
+            key = self._registered_key(registered_name)
+            if not key:
+                continue
+            if ' ' in key:
+                self._by_name.setdefault(key, []).append(uid)
+            else:
+                self._by_surname.append((key, uid))
+
+    def __len__(self):
+        return sum(len(uids) for uids in self._by_name.values()) + len(self._by_surname)
+
+    def _registered_key(self, registered_name: str) -> str:
+        key = normalize_name(registered_name)
+        return normalize_name(self.aliases.get(key, key))
+
+    def canonical(self, full_name: str) -> Optional[str]:
+        """Lookup key of a schedule name, or None if the name is blacklisted."""
+        name = canonical_employee_name(full_name, self.blacklist, self.aliases)
+        return normalize_name(name) if name else None
+
+    def user_ids_for(self, schedule_name: str) -> List[str]:
+        """All user_ids subscribed to the employee in this schedule row (duplicates included)."""
+        if schedule_name not in self._cache:
+            key = self.canonical(schedule_name)
+            uids = []
+            if key:
+                uids.extend(self._by_name.get(key, []))
+                raw = normalize_name(schedule_name)
+                uids.extend(uid for surname, uid in self._by_surname if surname in key or surname in raw)
+            self._cache[schedule_name] = uids
+        return self._cache[schedule_name]
+
+    def matches(self, registered_name: str, schedule_name: str) -> bool:
+        """True if a schedule row belongs to the employee registered under registered_name."""
+        key = self.canonical(schedule_name)
+        if not key:
+            return False
+        registered_key = self._registered_key(registered_name)
+        if ' ' in registered_key:
+            return registered_key == key
+        return registered_key in key or registered_key in normalize_name(schedule_name)
+
+def _mtime(path: str) -> Optional[float]:
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+def _current_version() -> Tuple[int, Optional[float]]:
+    return storage.version('users'), _mtime(EMPLOYEES_CONFIG_FILE)
+
+def _build_index() -> Tuple[Tuple[int, Optional[float]], UserIndex]:
+    version = _current_version()
+    try:
+        users = storage.get_users()
+    except Exception as e:
+        logger.error(f"Error loading users: {e}")
+        users = {}
+    blacklist, aliases = load_employees_config()
+    return version, UserIndex(users, blacklist, aliases)
+
+def _cached_index() -> Tuple[Tuple[int, Optional[float]], UserIndex]:
+    # Under the storage path, so registrations made by this process invalidate it right away
+    return data_cache.get((storage.path, 'user_index'), _current_version, _build_index)
+
+def index_version() -> Tuple[int, Optional[float]]:
+    """
+    Version of the index inputs: change counter of the users table and mtime of employees_config.json.
+    Like the other cached data it is re-checked at most once per DATA_CACHE_CHECK_INTERVAL.
+    """
+    return _cached_index()[0]
+
+def get_user_index() -> UserIndex:
+    """The index for the current users, rebuilt only after the users or the config changed."""
+    return _cached_index()[1]
@@ -0,0 +1,62 @@
+import json
+import multiprocessing
+import os
+import stat
+import tempfile
+from checks import check, finish
+
+def _writer(path, worker, rounds):
+    from services.atomic_file import write_json
+    for i in range(rounds):
+        write_json(path, {'worker': worker, 'round': i, 'payload': ['x' * 100] * 200})
+
+def test_atomic_write():
+    print("Testing atomic writes...")
+    from services.atomic_file import atomic_write, write_json
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'state.json')
+    write_json(path, {'a': 1})
+    with open(path, encoding='utf-8') as f:
+        check("content written", json.load(f) == {'a': 1})
+    check("permissions are not 0600", stat.S_IMODE(os.stat(path).st_mode) == 0o644)
+
+    try:
+        with atomic_write(path) as f:
+            f.write('{"a": ')
+            raise RuntimeError("crash mid-write")
+    except RuntimeError:
+        pass
+    with open(path, encoding='utf-8') as f:
+        check("failed write leaves the old content", json.load(f) == {'a': 1})
+    check("no temp file left", sorted(os.listdir(directory)) == ['state.json', 'state.json.lock'])
+
+    write_json(os.path.join(directory, 'cache.json'), [], lock=False)
+    check("no lock file without lock", not os.path.exists(os.path.join(directory, 'cache.json.lock')))
+
+def test_concurrent_writers():
+    print("Testing concurrent writers...")
+    path = os.path.join(tempfile.mkdtemp(), 'shared.json')
+    workers = [multiprocessing.Process(target=_writer, args=(path, worker, 50)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+
+    broken = 0
+    while any(worker.is_alive() for worker in workers):
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    json.load(f)
+            except json.JSONDecodeError:
+                broken += 1
+    for worker in workers:
+        worker.join()
+
+    check("readers never see a partial file", broken == 0)
+    with open(path, encoding='utf-8') as f:
+        check("last write complete", json.load(f)['round'] == 49)
+
+if __name__ == "__main__":
+    test_atomic_write()
+    test_concurrent_writers()
+    finish()
@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+from checks import check, finish
+
+def write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+def test_file_cache():
+    print("Testing cached file reads...")
+    from services.data_cache import DataCache
+
+    cache = DataCache(check_interval=0)
+    path = os.path.join(tempfile.mkdtemp(), 'config.json')
+    check("missing file gives the default", cache.get_file(path, default={}) == {})
+
+    write_json(path, {'a': 1})
+    check("file loaded once created", cache.get_file(path) == {'a': 1})
+    loads = cache.loads
+    cache.get_file(path)
+    check("unchanged file not parsed again", cache.loads == loads)
+
+    write_json(path, {'a': 2, 'b': 3})
+    check("changed file reloaded", cache.get_file(path) == {'a': 2, 'b': 3})
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"a": ')
+    check("broken file gives the default", cache.get_file(path, default={}) == {})
+
+    throttled = DataCache(check_interval=3600)
+    write_json(path, {'a': 1})
+    throttled.get_file(path)
+    write_json(path, {'a': 1, 'changed': True})
+    check("version not checked within the interval", throttled.get_file(path) == {'a': 1})
+    throttled.invalidate()
+    check("invalidate drops the entry", throttled.get_file(path) == {'a': 1, 'changed': True})
+
+def test_storage_cache():
+    print("Testing cached storage reads...")
+    from services.storage import Storage
+
+    data_dir = tempfile.mkdtemp()
+    path = os.path.join(data_dir, 'bot.db')
+    storage = Storage(path, data_dir=data_dir)
+    other = Storage(path, data_dir=data_dir)
+
+    storage.set_group_id(-100)
+    check("group id read", storage.get_group_id() == '-100')
+    other.set_group_id(-200)
+    check("write seen at once in the same process", storage.get_group_id() == '-200')
+
+    storage.register_user(1, 'Иванов Иван')
+    users = storage.get_users()
+    users['2'] = 'Чужой'
+    check("returned users are a copy", storage.get_users() == {'1': 'Иванов Иван'})
+    check("user name lookup", storage.get_user_name(1) == 'Иванов Иван' and storage.get_user_name(2) is None)
+
+    storage.add_medical_employee({'name': 'Петров Пётр', 'role': 'cashier'})
+    employees = storage.get_medical_employees()
+    employees[0]['role'] = 'manager'
+    check("returned medical records are copies", storage.get_medical_employees()[0]['role'] == 'cashier')
+    storage.update_medical_employee('Петров Пётр', status='missing_docs')
+    check("medical update seen", storage.get_medical_employees()[0].get('status') == 'missing_docs')
+
+if __name__ == "__main__":
+    test_file_cache()
+    test_storage_cache()
+    finish()
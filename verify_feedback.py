@@ -1,11 +1,25 @@
 import asyncio
 import logging
-from unittest.mock import AsyncMock, MagicMock
+import os
+import tempfile
+from unittest.mock import AsyncMock, MagicMock, patch
 from services.scheduler import send_feedback_notification
+from checks import check, finish, use_temp_storage
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
+storage = use_temp_storage()
+storage.set_group_id(-100123456789)
+
+# send_feedback_notification reads data/feedback.text relative to the working directory:
+# run from a temp directory with a fresh one instead of the checkout's
+work_dir = tempfile.mkdtemp()
+os.makedirs(os.path.join(work_dir, 'data'))
+with open(os.path.join(work_dir, 'data', 'feedback.text'), 'w', encoding='utf-8') as f:
+    f.write("📋 Обратная связь за сегодня\n\n✅ Гости довольны скоростью выдачи заказов.")
+os.chdir(work_dir)
+
 async def verify_feedback():
     print("Verifying feedback notification...")
     
@@ -13,26 +27,22 @@ async def verify_feedback():
     context = MagicMock()
     context.bot.send_message = AsyncMock()
     
-    # Call the function
-    await send_feedback_notification(context)
+    # Call the function, without the LLM analysis (it would rewrite feedback.text)
+    with patch('services.feedback_analyzer.run_feedback_analysis', AsyncMock(return_value=False)):
+        await send_feedback_notification(context)
     
     # Check if send_message was called
+    check("send_message was called", context.bot.send_message.called)
     if context.bot.send_message.called:
-        print("SUCCESS: send_message was called.")
         args, kwargs = context.bot.send_message.call_args
         print(f"Chat ID: {kwargs.get('chat_id')}")
         print(f"Message length: {len(kwargs.get('text'))}")
         print("Message content preview:")
         print(kwargs.get('text')[:100] + "...")
         
-        # Verify markdown parsing
-        if kwargs.get('parse_mode') == 'Markdown':
-            print("SUCCESS: parse_mode is Markdown")
-        else:
-            print(f"FAILURE: parse_mode is {kwargs.get('parse_mode')}")
-            
-    else:
-        print("FAILURE: send_message was NOT called.")
+        check("sent to the group", str(kwargs.get('chat_id')) == '-100123456789')
+        check("feedback.text is sent", 'Гости довольны' in kwargs.get('text'))
 
 if __name__ == "__main__":
     asyncio.run(verify_feedback())
+    finish()
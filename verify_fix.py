@@ -1,15 +1,15 @@
 import asyncio
-import json
 from unittest.mock import AsyncMock, MagicMock
 from handlers.schedule import schedule_handler
+from checks import use_temp_storage
 
 # Mock data
 USER_ID = 123456789
 SURNAME = "Тестовый"
 
-# Setup users.json
-with open('data/users.json', 'w', encoding='utf-8') as f:
-    json.dump({str(USER_ID): SURNAME}, f)
+# Setup a registered user in a temporary storage (shared by every module, not just handlers.schedule)
+test_storage = use_temp_storage()
+test_storage.register_user(USER_ID, SURNAME)
 
 async def test_schedule_handler():
     print("Testing schedule_handler fallback...")
@@ -45,7 +45,7 @@ async def test_schedule_handler():
         
     # Check if context.user_data was updated
     if context.user_data.get('surname') == SURNAME:
-        print("SUCCESS: Surname loaded from file into context.")
+        print("SUCCESS: Surname loaded from storage into context.")
     else:
         print("FAILURE: Surname NOT loaded into context.")
         
@@ -53,7 +53,7 @@ async def test_schedule_handler():
     if update.message.reply_text.called:
         args, _ = update.message.reply_text.call_args
         if "Сначала введи" in args[0]:
-            print("FAILURE: Handler asked to register despite user existing in file.")
+            print("FAILURE: Handler asked to register despite user existing in storage.")
         else:
             print(f"Handler replied with: {args[0]}")
 
@@ -1,8 +1,12 @@
 from services.medical_service import get_all_medical_issues
+from checks import use_temp_storage
 import logging
 
 logging.basicConfig(level=logging.INFO)
 
+# Report on a copy of the medical records, the checkout's data/ stays untouched
+use_temp_storage(copy_data=True)
+
 def test_formatted_report():
     print("--- Testing Formatted Report Logic ---")
     
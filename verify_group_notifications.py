@@ -20,10 +20,10 @@ async def test_group_notification():
     mock_preps = "🔪 **Заготовки на Понедельник** (☀️ Утро)\n━━━━━━━━━━━━\n• **Тесто**: `10` лекс."
     
     # Patch dependencies
-    with patch('services.scheduler.load_json') as mock_load:
-        mock_load.return_value = mock_group
+    with patch('services.scheduler.storage') as mock_storage:
+        mock_storage.get_group_id.return_value = mock_group['group_id']
         
-        with patch('services.scheduler.get_preps') as mock_get_preps:
+        with patch('services.scheduler.get_preps_message') as mock_get_preps:
             mock_get_preps.return_value = mock_preps
             
             # Mock context
@@ -57,5 +57,48 @@ async def test_group_notification():
                 print("\nTesting Evening Notification:")
                 await send_preps_notification(mock_context)
 
+async def test_prerendered_messages():
+    print("\nStarting pre-rendered message verification...")
+    from services import rendered_messages
+
+    renders = []
+    sheet_ok = {'value': True}
+    async def mock_render_preps(day_index, is_morning):
+        renders.append((day_index, is_morning))
+        if not sheet_ok['value']:
+            return "Произошла ошибка при получении заготовок.", False
+        return f"preps {day_index} {is_morning}", True
+
+    version = {'value': (1, None)}
+    async def mock_version():
+        return version['value']
+
+    with patch('services.rendered_messages.render_preps', side_effect=mock_render_preps), \
+         patch('services.rendered_messages.get_preps_version', side_effect=mock_version):
+        first = await rendered_messages.get_preps_message(0, True)
+        second = await rendered_messages.get_preps_message(0, True)
+        if first == second and len(renders) == 1:
+            print("✅ Rendered once, reused while the sheet is unchanged.")
+        else:
+            print(f"❌ Rendered {len(renders)} times.")
+
+        version['value'] = (2, None)
+        await rendered_messages.get_preps_message(0, True)
+        if len(renders) == 2:
+            print("✅ Re-rendered after the sheet changed.")
+        else:
+            print("❌ Outdated message reused.")
+
+        sheet_ok['value'] = False
+        version['value'] = (3, None)
+        failed = await rendered_messages.get_preps_message(0, True)
+        sheet_ok['value'] = True
+        recovered = await rendered_messages.get_preps_message(0, True)
+        if failed.startswith("Произошла ошибка") and recovered == "preps 0 True" and len(renders) == 4:
+            print("✅ Failed render not cached, re-rendered once the sheet is back.")
+        else:
+            print(f"❌ Failed render reused: {recovered!r}")
+
 if __name__ == "__main__":
     asyncio.run(test_group_notification())
+    asyncio.run(test_prerendered_messages())
@@ -0,0 +1,71 @@
+import os
+import tempfile
+from unittest.mock import patch
+from PIL import Image, ImageDraw
+from services.image_pipeline import prepare_images, process_image, detect_mime_type, PROCESSED_SUFFIX
+from checks import check, finish
+
+def make_photo(path, size, shape):
+    image = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(image)
+    w, h = size
+    if shape == 'circle':
+        draw.ellipse((w * 0.2, h * 0.2, w * 0.8, h * 0.8), fill='red')
+    else:
+        draw.rectangle((0, 0, w * 0.4, h), fill='blue')
+        draw.rectangle((w * 0.6, h * 0.5, w, h), fill='green')
+    image.save(path, quality=95)
+
+def test_image_pipeline():
+    print("Testing image pipeline...")
+    tmp = tempfile.mkdtemp()
+    infos = []
+    for i, (size, shape) in enumerate([((4000, 3000), 'circle'), ((3990, 2990), 'circle'), ((3000, 4000), 'bars')]):
+        path = os.path.join(tmp, f"photo_{i}.jpg")
+        make_photo(path, size, shape)
+        infos.append({'file_path': path, 'user': 'Test', 'timestamp': str(i), 'caption': ''})
+    infos.append({'file_path': os.path.join(tmp, 'missing.jpg'), 'user': 'Test', 'timestamp': '9', 'caption': ''})
+
+    images = prepare_images(infos, budget=10)
+    check("near-duplicate dropped", [info['timestamp'] for info, _, _ in images] == ['0', '2'])
+
+    with Image.open(infos[0]['file_path'] + PROCESSED_SUFFIX) as processed:
+        check("downscaled to max edge", max(processed.size) == 1024)
+    check("smaller than original", len(images[0][1]) < os.path.getsize(infos[0]['file_path']))
+
+    # Second run is served from the sidecar cache
+    mtime = os.path.getmtime(infos[0]['file_path'] + PROCESSED_SUFFIX)
+    process_image(infos[0]['file_path'])
+    check("cached per file", os.path.getmtime(infos[0]['file_path'] + PROCESSED_SUFFIX) == mtime)
+
+    check("daily budget", len(prepare_images(infos, budget=1)) == 1)
+
+    seen = []
+    selected = prepare_images(infos, budget=1, seen_hashes=seen)
+    check("only sent photos count as seen", len(selected) == 1 and len(seen) == 1)
+    later = prepare_images(infos[2:3], budget=10, seen_hashes=seen)
+    check("photo over budget sent later", len(later) == 1 and len(seen) == 2)
+
+def test_without_pillow():
+    print("Testing originals sent without Pillow...")
+    tmp = tempfile.mkdtemp()
+    infos = []
+    for name, fmt in [('photo.jpg', 'JPEG'), ('screenshot.png', 'PNG')]:
+        path = os.path.join(tmp, name)
+        Image.new('RGB', (64, 48), 'white').save(path, format=fmt)
+        infos.append({'file_path': path, 'user': 'Test', 'timestamp': name, 'caption': ''})
+    document = os.path.join(tmp, 'report.pdf')
+    with open(document, 'wb') as f:
+        f.write(b'%PDF-1.4 not an image')
+    infos.append({'file_path': document, 'user': 'Test', 'timestamp': 'report.pdf', 'caption': ''})
+
+    with patch('services.image_pipeline.Image', None):
+        images = prepare_images(infos, budget=10)
+    check("type detected from content", [mime_type for _, _, mime_type in images] == ['image/jpeg', 'image/png'])
+    check("non-images skipped", all(info['timestamp'] != 'report.pdf' for info, _, _ in images))
+    check("webp detected", detect_mime_type(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'image/webp')
+
+if __name__ == "__main__":
+    test_image_pipeline()
+    test_without_pillow()
+    finish()
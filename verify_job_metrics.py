@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import os
+import tempfile
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from zoneinfo import ZoneInfo
+from checks import check, finish
+
+# Errors must reach the root logger to be attached to job runs, but stay off the console
+logging.basicConfig(level=logging.ERROR, handlers=[logging.NullHandler()])
+
+async def test_job_metrics():
+    print("Testing job metrics...")
+    from services import job_metrics
+    from services.job_metrics import instrumented, phase, count, load_runs, summarize
+
+    runs_file = os.path.join(tempfile.mkdtemp(), 'job_runs.jsonl')
+
+    async def good_job(context):
+        with phase('fetch'):
+            await asyncio.sleep(0.01)
+        count('messages_sent', 3)
+
+    async def failing_job(context):
+        # Jobs log and swallow their errors
+        logging.getLogger('some.service').error("Sheet download failed")
+
+    with patch.object(job_metrics, 'JOB_RUNS_FILE', runs_file):
+        context = MagicMock()
+        context.job.name = 'good_job'
+        context.job.data = None
+        slot = (datetime.now(ZoneInfo('Europe/Moscow'))).time().replace(second=0, microsecond=0, tzinfo=ZoneInfo('Europe/Moscow'))
+        await instrumented(good_job, slot)(context)
+
+        context.job.name = 'failing_job'
+        await instrumented(failing_job)(context)
+
+        runs = load_runs()
+        check("two runs recorded", [run['job'] for run in runs] == ['good_job', 'failing_job'])
+        check("phase timed", runs[0]['phases'].get('fetch', 0) >= 0.01)
+        check("counter recorded", runs[0]['counters'] == {'messages_sent': 3})
+        check("misfire lag measured", runs[0]['lag'] is not None and 0 <= runs[0]['lag'] < 61)
+        check("logged error attached", not runs[1]['ok'] and runs[1]['errors'] == ["Sheet download failed"])
+
+        summary = summarize(runs)
+        check("summary per job", summary['good_job']['runs'] == 1 and summary['failing_job']['failed'] == 1)
+
+        # Outside of a job run these are no-ops
+        with phase('fetch'):
+            count('messages_sent')
+        check("no run outside of jobs", len(load_runs()) == 2)
+
+    # The store is trimmed to its newest half once it grows past JOB_RUNS_MAX_BYTES
+    runs_file = os.path.join(tempfile.mkdtemp(), 'job_runs.jsonl')
+    with patch.object(job_metrics, 'JOB_RUNS_FILE', runs_file), patch.object(job_metrics, 'JOB_RUNS_MAX_BYTES', 2000):
+        for i in range(40):
+            job_metrics.record_run({'job': f'job_{i}', 'ok': True, 'errors': ['x' * 100]})
+        runs = load_runs()
+        check("store trimmed", os.path.getsize(runs_file) <= 2000 and 0 < len(runs) < 40)
+        check("newest runs kept", runs[-1]['job'] == 'job_39')
+
+if __name__ == "__main__":
+    asyncio.run(test_job_metrics())
+    finish()
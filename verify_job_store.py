@@ -0,0 +1,71 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime, time
+from unittest.mock import MagicMock, patch
+from zoneinfo import ZoneInfo
+from checks import check, finish
+
+TZ = ZoneInfo('Europe/Moscow')
+
+async def test_job_store():
+    print("Testing job store...")
+    from services import job_store as job_store_module
+    from services.job_store import JobStore, once_per_slot, catch_up_missed, current_slot, slot_key
+
+    store = JobStore(os.path.join(tempfile.mkdtemp(), 'jobs.db'))
+    runs = []
+
+    async def send_preps_notification(context):
+        runs.append(datetime.now(TZ))
+
+    with patch.object(job_store_module, 'job_store', store):
+        slot_time = time(8, 55, tzinfo=TZ)
+        check("slot before time is yesterday's", current_slot(slot_time, datetime(2025, 11, 24, 8, 0, tzinfo=TZ)).day == 23)
+        check("slot after time is today's", current_slot(slot_time, datetime(2025, 11, 24, 9, 0, tzinfo=TZ)).day == 24)
+
+        job = once_per_slot(send_preps_notification, slot_time)
+        await job(MagicMock())
+        await job(MagicMock())
+        check("slot runs once", len(runs) == 1)
+
+        # Restart: the slot is done, nothing to catch up
+        job_queue = MagicMock()
+        catch_up_missed(job_queue, [(job, 24 * 3600)])
+        check("done slot not caught up", not job_queue.run_once.called)
+
+        # Restart after the previous process died while running the slot
+        conn = store._connect()
+        with conn:
+            conn.execute("UPDATE job_slots SET status = 'running'")
+        conn.close()
+        catch_up_missed(job_queue, [(job, 24 * 3600)])
+        check("interrupted slot caught up", job_queue.run_once.call_count == 1)
+
+        await job_queue.run_once.call_args[0][0](MagicMock())
+        check("caught-up slot runs once", len(runs) == 2)
+
+        # A job that swallowed its error and returned False is retried by the catch-up
+        async def send_who_notification(context):
+            runs.append(datetime.now(TZ))
+            return False if len(runs) == 3 else True
+
+        failing = once_per_slot(send_who_notification, time(8, 0, tzinfo=TZ))
+        await failing(MagicMock())
+        check("failed run recorded as failed", store.status(failing.job_key, slot_key(current_slot(failing.slot_time))) == 'failed')
+        job_queue = MagicMock()
+        catch_up_missed(job_queue, [(failing, 24 * 3600)])
+        check("failed slot caught up", job_queue.run_once.call_count == 1)
+        await job_queue.run_once.call_args[0][0](MagicMock())
+        check("retried slot done", store.status(failing.job_key, slot_key(current_slot(failing.slot_time))) == 'done')
+
+        # Very first start: nothing is known, so nothing is repeated
+        fresh = JobStore(os.path.join(tempfile.mkdtemp(), 'jobs.db'))
+        with patch.object(job_store_module, 'job_store', fresh):
+            job_queue = MagicMock()
+            catch_up_missed(job_queue, [(job, 24 * 3600)])
+            check("first start doesn't repeat slots", not job_queue.run_once.called)
+
+if __name__ == "__main__":
+    asyncio.run(test_job_store())
+    finish()
@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+from checks import check, finish
+
+def test_message_log():
+    print("Testing message log...")
+    from services import message_collector
+    from services.message_collector import MessageLog, get_messages_file, load_daily_messages, migrate_legacy_messages
+
+    messages_dir = os.path.join(tempfile.mkdtemp(), 'messages')
+    with patch.object(message_collector, 'MESSAGES_DIR', messages_dir), \
+         patch.object(message_collector, 'message_log', MessageLog()):
+        log_path = get_messages_file()
+
+        # Legacy JSON array of the day, as written by older versions
+        with open(log_path[:-1], 'w', encoding='utf-8') as f:
+            json.dump([{'text': 'старое 1'}, {'text': 'старое 2'}], f, ensure_ascii=False)
+        check("legacy file readable before migration", [m['text'] for m in load_daily_messages()] == ['старое 1', 'старое 2'])
+
+        migrate_legacy_messages()
+        check("legacy file removed", not os.path.exists(log_path[:-1]))
+
+        message_collector.message_log.append({'text': 'новое'})
+        check("appended after legacy messages", [m['text'] for m in load_daily_messages()] == ['старое 1', 'старое 2', 'новое'])
+
+        size = os.path.getsize(log_path)
+        message_collector.message_log.append({'text': 'ещё'})
+        check("one line appended", os.path.getsize(log_path) - size == len(json.dumps({'text': 'ещё'}, ensure_ascii=False).encode()) + 1)
+
+        # Crash in the middle of a line
+        message_collector.message_log.close()
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write('{"text": "обры')
+        check("torn line skipped", len(load_daily_messages()) == 4)
+        message_collector.message_log.append({'text': 'после сбоя'})
+        check("next message not lost after torn line", load_daily_messages()[-1]['text'] == 'после сбоя')
+        message_collector.message_log.close()
+
+def test_message_buffer():
+    print("Testing message buffer...")
+    from services import message_collector
+    from services.message_collector import MessageLog, buffer_message, flush_pending, get_daily_data, iter_daily_messages, load_daily_messages
+
+    messages_dir = os.path.join(tempfile.mkdtemp(), 'messages')
+    with patch.object(message_collector, 'MESSAGES_DIR', messages_dir), \
+         patch.object(message_collector, 'message_log', MessageLog()):
+        today = message_collector.get_current_date()
+        buffer_message({'timestamp': f'{today}T10:00:00+03:00', 'text': 'первое'})
+        buffer_message({'timestamp': f'{today}T10:00:01+03:00', 'text': 'второе'})
+        check("nothing written before flush", not load_daily_messages())
+        check("read flushes the buffer", [m['text'] for m in get_daily_data()] == ['первое', 'второе'])
+
+        # Captured before midnight, flushed after it
+        buffer_message({'timestamp': '2025-11-23T23:59:59+03:00', 'text': 'вчера'})
+        check("flush writes everything queued", flush_pending() == 1)
+        check("message stays in its day", [m['text'] for m in iter_daily_messages('2025-11-23')] == ['вчера'])
+        message_collector.message_log.close()
+
+if __name__ == "__main__":
+    test_message_log()
+    test_message_buffer()
+    finish()
@@ -1,73 +1,287 @@
 import asyncio
 import logging
-import sys
 from unittest.mock import MagicMock, patch
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from checks import check, finish, use_temp_storage
 
 # Mock logging
 logging.basicConfig(level=logging.INFO)
 
-# Import the function to test
-# We need to ensure services.scheduler is imported so patch can find it
-try:
-    import services.scheduler
-except ImportError:
-    # If it fails (e.g. due to missing dependencies in environment), we might need to mock them first
-    pass
+# The planner reads the users' version from the shared storage
+use_temp_storage()
 
 async def test_notification():
     print("Starting verification...")
-    
+    from services import shift_reminders
+
     # Mock data
-    mock_users = {'12345': 'TestUser'}
-    mock_notifications = {}
-    
-    # Mock shift starting in 30 mins
-    now = datetime.now()
-    shift_start = now + timedelta(minutes=30)
-    shift_str = f"{shift_start.hour}:{shift_start.minute:02d}-{shift_start.hour+8}:{shift_start.minute:02d}"
-    
-    mock_shifts = [{
-        'name': 'TestUser',
-        'role': 'pizzamaker',
-        'shift': shift_str
-    }]
-    
+    mock_users = {'12345': 'TestUser', '67890': 'OtherUser', '11111': 'Blocked'}
+
+    # Mock shift starting in 90 mins -> reminder planned 30 mins from now
+    now = datetime.now(ZoneInfo('Europe/Moscow'))
+    shift_start = now + timedelta(minutes=90)
+    if shift_start.date() != now.date():
+        print("⚠️ Too close to midnight, run again later")
+        return
+    shift_str = f"{shift_start.hour}:{shift_start.minute:02d}-23:00"
+
+    # Three people starting together -> one slot
+    mock_shifts = [
+        {'name': name, 'role': 'pizzamaker', 'shift': shift_str}
+        for name in ['TestUser', 'OtherUser', 'Blocked']
+    ]
+
     print(f"Current time: {now.strftime('%H:%M')}")
     print(f"Mock shift: {shift_str}")
-    
-    # Patch dependencies
-    with patch('services.scheduler.load_json') as mock_load:
-        # Return users for first call, empty dict for second (notifications)
-        mock_load.side_effect = [mock_users, mock_notifications]
-        
-        with patch('services.scheduler.save_json') as mock_save:
-            with patch('services.scheduler.get_shifts_for_date') as mock_get_shifts:
-                mock_get_shifts.return_value = mock_shifts
-                
-                # Mock context
-                mock_context = MagicMock()
-                mock_context.bot.send_message = MagicMock(side_effect=lambda chat_id, text: asyncio.sleep(0)) # Async mock
-                
-                # Import and run
-                from services.scheduler import check_shifts_and_notify
-                
-                # We need to await the mock send_message if it's async, but MagicMock isn't async by default.
-                # The code awaits context.bot.send_message.
-                # So we need an AsyncMock.
-                
-                async def async_send_message(chat_id, text):
-                    print(f"✅ Notification sent to {chat_id}: {text}")
-                
-                mock_context.bot.send_message = async_send_message
-                
-                await check_shifts_and_notify(mock_context)
-                
-                # Verify save_json was called (updating notifications)
-                if mock_save.called:
-                    print("✅ Notifications file updated.")
-                else:
-                    print("❌ Notifications file NOT updated.")
+
+    async def get_shifts(date_str):
+        return (mock_shifts if date_str == now.strftime("%d.%m") else []), True
+
+    from services.user_index import UserIndex
+    from services.notification_ledger import NotificationLedger
+    from services.storage import Storage
+    import tempfile, os
+
+    tmp_dir = tempfile.mkdtemp()
+    test_storage = Storage(os.path.join(tmp_dir, 'bot.db'), data_dir=tmp_dir)
+    test_ledger = NotificationLedger(test_storage)
+
+    with patch('services.shift_reminders.get_user_index', return_value=UserIndex(mock_users, [], {})), \
+         patch('services.shift_reminders.ledger', test_ledger), \
+         patch.object(test_ledger, 'save', wraps=test_ledger.save) as mock_save, \
+         patch('services.shift_reminders.find_shifts_for_date', side_effect=get_shifts):
+
+        # Mock job queue keeping scheduled jobs in a list
+        jobs = []
+        job_queue = MagicMock()
+        job_queue.jobs.side_effect = lambda: list(jobs)
+        def run_once(callback, when, name=None, data=None):
+            job = MagicMock()
+            job.name, job.data, job.callback, job.when = name, data, callback, when
+            jobs.append(job)
+            return job
+        job_queue.run_once.side_effect = run_once
+
+        mock_context = MagicMock()
+        mock_context.job_queue = job_queue
+
+        await shift_reminders.reconcile_shift_reminders(mock_context)
+
+        if len(jobs) == 1 and len(jobs[0].data['reminders']) == 3 and abs((jobs[0].when - (shift_start - timedelta(minutes=60))).total_seconds()) < 60:
+            print(f"✅ 3 reminders planned in one slot for {jobs[0].when.strftime('%H:%M')}")
+        else:
+            print(f"❌ Unexpected plan: {[(j.name, j.when) for j in jobs]}")
+            return
+
+        # Re-planning with unchanged inputs must not touch the existing job
+        await shift_reminders.reconcile_shift_reminders(mock_context)
+        if len(jobs) == 1 and not jobs[0].schedule_removal.called:
+            print("✅ Unchanged plan left as is.")
+        else:
+            print("❌ Unchanged plan was rescheduled.")
+
+        # Fire the slot: one user is rate limited once, one has blocked the bot
+        from telegram.error import RetryAfter, Forbidden
+        sent = []
+        retried = []
+        replanned = []
+        async def async_send_message(chat_id, text):
+            if not replanned:
+                # A re-plan while the batch is in flight must not schedule these reminders again
+                replanned.append(len(jobs))
+                await shift_reminders.reconcile_shift_reminders(mock_context)
+                replanned.append(len(jobs))
+            if chat_id == '67890' and not retried:
+                retried.append(chat_id)
+                raise RetryAfter(0)
+            if chat_id == '11111':
+                raise Forbidden("bot was blocked by the user")
+            sent.append(chat_id)
+
+        # Like the JobQueue, a one-shot job is no longer listed once it fires
+        mock_context.job = jobs.pop(0)
+        mock_context.bot.send_message = async_send_message
+        await shift_reminders.send_shift_reminders(mock_context)
+
+        if sorted(sent) == ['12345', '67890'] and retried:
+            print("✅ Batch sent, flood control retried, blocked user skipped.")
+        else:
+            print(f"❌ Unexpected sends: {sent}")
+
+        if replanned and replanned[0] == replanned[1]:
+            print("✅ Reminders in flight not re-planned.")
+        else:
+            print(f"❌ Reminders in flight re-planned: {replanned}")
+
+        # Verify notifications were saved once, for the delivered and the undeliverable reminders
+        saved = {user_id for user_id, _, _ in test_storage.get_notifications([now.strftime("%d.%m")])}
+        if mock_save.call_count == 1 and saved == {'12345', '67890', '11111'}:
+            print("✅ Notifications saved once.")
+        else:
+            print("❌ Notifications NOT saved correctly.")
+
+        # The blocked chat isn't planned again by the next re-plan
+        await shift_reminders.reconcile_shift_reminders(mock_context)
+        if not jobs:
+            print("✅ Undeliverable reminder not re-planned.")
+        else:
+            print(f"❌ Re-planned: {[j.data['reminders'] for j in jobs]}")
+
+async def test_failures():
+    print("Testing failed sends and failed schedule loads...")
+    from services import shift_reminders
+    from services.user_index import UserIndex
+    from services.notification_ledger import NotificationLedger
+    from services.storage import Storage
+    from telegram.error import NetworkError
+    import tempfile, os
+
+    now = datetime.now(ZoneInfo('Europe/Moscow'))
+    shift_start = now + timedelta(minutes=90)
+    if shift_start.date() != now.date():
+        print("⚠️ Too close to midnight, run again later")
+        return
+    today = now.strftime("%d.%m")
+    shifts = [{'name': 'TestUser', 'role': 'pizzamaker', 'shift': f"{shift_start.hour}:{shift_start.minute:02d}-23:00"}]
+    loaded = {'value': True}
+
+    async def get_shifts(date_str):
+        if not loaded['value']:
+            return [], False
+        return (shifts if date_str == today else []), True
+
+    tmp_dir = tempfile.mkdtemp()
+    test_storage = Storage(os.path.join(tmp_dir, 'bot.db'), data_dir=tmp_dir)
+    test_ledger = NotificationLedger(test_storage)
+
+    with patch('services.shift_reminders.get_user_index', return_value=UserIndex({'12345': 'TestUser'}, [], {})), \
+         patch('services.shift_reminders.ledger', test_ledger), \
+         patch('services.shift_reminders.find_shifts_for_date', side_effect=get_shifts):
+
+        jobs = []
+        job_queue = MagicMock()
+        job_queue.jobs.side_effect = lambda: list(jobs)
+        def run_once(callback, when, name=None, data=None):
+            job = MagicMock()
+            job.name, job.data, job.callback, job.when = name, data, callback, when
+            jobs.append(job)
+            return job
+        job_queue.run_once.side_effect = run_once
+        context = MagicMock()
+        context.job_queue = job_queue
+
+        await shift_reminders.reconcile_shift_reminders(context)
+        planned = jobs[0]
+
+        # The sheets fail to load: the planned reminder stays, the next sync plans again
+        loaded['value'] = False
+        await shift_reminders.reconcile_shift_reminders(context)
+        check("failed load keeps planned reminders", jobs == [planned] and not planned.schedule_removal.called)
+        check("failed load re-planned on the next sync", shift_reminders._last_signature is None)
+        loaded['value'] = True
+
+        # The send fails: the reminder is queued again with a short delay
+        attempts = []
+        async def send_message(chat_id, text):
+            attempts.append(chat_id)
+            if len(attempts) == 1:
+                raise NetworkError("connection reset")
+
+        context.bot.send_message = send_message
+        context.job = jobs.pop(0)
+        await shift_reminders.send_shift_reminders(context)
+        retry = jobs[0] if len(jobs) == 1 else None
+        check("failed reminder queued for a retry", retry is not None and retry.when == shift_reminders.REMINDER_RETRY_DELAY
+              and retry.data['attempt'] == 2 and retry.data['reminders'] == planned.data['reminders'])
+        check("failed reminder not recorded", not test_storage.get_notifications([today]))
+
+        context.job = jobs.pop(0)
+        await shift_reminders.send_shift_reminders(context)
+        check("retry delivers and records it", len(attempts) == 2 and not jobs and len(test_storage.get_notifications([today])) == 1)
+
+        shift_reminders._schedule_retry(job_queue, {**retry.data, 'attempt': shift_reminders.REMINDER_MAX_ATTEMPTS}, retry.data['reminders'])
+        check("retries stop after the last attempt", not jobs)
+
+async def test_sync():
+    print("Testing the periodic sync...")
+    from services import shift_reminders
+    from services.sheet_manager import sheet_manager
+
+    sheets = [{'gid': '1', 'name': 'Кухня 17 - 23'}]
+    versions = {'value': 1}
+
+    async def get_many_versioned(urls, allow_stale=True):
+        return {url: ('', versions['value']) for url in urls}
+
+    with patch.object(sheet_manager, 'get_sheets', return_value=sheets), \
+         patch.object(sheet_manager, 'get_cached_sheets', return_value=sheets), \
+         patch.object(sheet_manager, 'get_many_versioned', side_effect=get_many_versioned) as mock_fetch, \
+         patch.object(sheet_manager, 'get_csv_version', side_effect=lambda url: versions['value']), \
+         patch.object(sheet_manager, 'prewarm') as mock_prewarm, \
+         patch('services.shift_reminders.reconcile_shift_reminders') as mock_reconcile:
+        context = MagicMock()
+        shift_reminders._last_signature = shift_reminders._inputs_signature(datetime.now(ZoneInfo('Europe/Moscow')))
+
+        await shift_reminders.sync_shift_reminders(context)
+        check("sync revalidates through the TTL cache", mock_fetch.call_args.kwargs.get('allow_stale') is False and not mock_prewarm.called)
+        check("unchanged schedule not re-planned", not mock_reconcile.called)
+
+        versions['value'] = 2
+        await shift_reminders.sync_shift_reminders(context)
+        check("changed sheet re-planned", mock_reconcile.call_count == 1)
+
+def test_split_shift_ledger():
+    print("Testing split shifts and ledger...")
+    from services.scheduler import parse_shift_starts
+    from services.notification_ledger import NotificationLedger
+    from services.storage import Storage
+    import tempfile, os, json
+
+    check("single shift", parse_shift_starts('9-21') == [(9, 0)])
+    check("split shift", parse_shift_starts('9-13 17-23') == [(9, 0), (17, 0)])
+    check("split with minutes", parse_shift_starts('9:30-13/17:15-23') == [(9, 30), (17, 15)])
+    check("not a shift", parse_shift_starts('ОТ') == [])
+    check("dotted times not matched mid-number", parse_shift_starts('09.00-17.00') == [])
+    check("dotted start minutes not matched", parse_shift_starts('9.30-18') == [])
+
+    now = datetime.now()
+    today = now.strftime("%d.%m")
+    tmp_dir = tempfile.mkdtemp()
+    # Old notifications.json format: one date per user, plus an outdated entry
+    with open(os.path.join(tmp_dir, 'notifications.json'), 'w', encoding='utf-8') as f:
+        json.dump({'1': today, '2': '01.01'}, f)
+
+    test_storage = Storage(os.path.join(tmp_dir, 'bot.db'), data_dir=tmp_dir)
+    ledger = NotificationLedger(test_storage)
+    ledger.refresh()
+    check("legacy entry covers the whole date", ledger.was_sent('1', today, '17:00'))
+    ledger.mark_sent('3', today, '09:00')
+    check("second start of split shift still due", not ledger.was_sent('3', today, '17:00'))
+    ledger.save(now)
+
+    saved = test_storage.get_notifications([today, '01.01'])
+    check("old dates compacted", ('2', '01.01', '*') not in saved and ('3', today, '09:00') in saved)
+
+    # Another process (or a restart) sees the saved reminders
+    reloaded = NotificationLedger(test_storage)
+    reloaded.refresh()
+    check("saved reminder reloaded", reloaded.was_sent('3', today, '09:00'))
+
+    # 22:30 UTC is already 01:30 the next day in Moscow, where the reminder dates come from
+    from datetime import timezone
+    from services import notification_ledger
+    class ServerClock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            utc_now = datetime(2025, 11, 23, 22, 30, tzinfo=timezone.utc)
+            return utc_now.astimezone(tz) if tz else utc_now.replace(tzinfo=None)
+    with patch.object(notification_ledger, 'datetime', ServerClock):
+        check("window follows the Moscow date", notification_ledger._window() == ['23.11', '24.11', '25.11'])
 
 if __name__ == "__main__":
     asyncio.run(test_notification())
+    asyncio.run(test_failures())
+    asyncio.run(test_sync())
+    test_split_shift_ledger()
+    finish()
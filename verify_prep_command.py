@@ -20,7 +20,7 @@ async def test_prep_command():
     mock_preps = "🔪 **Заготовки**..."
     
     # Patch dependencies
-    with patch('handlers.group_setup.get_preps') as mock_get_preps:
+    with patch('handlers.group_setup.get_preps_message') as mock_get_preps:
         mock_get_preps.return_value = mock_preps
         
         # Mock context and update
@@ -45,7 +45,7 @@ async def test_prep_command():
             print("\nTesting /prep at 14:00 (Mon):")
             await prep_command_handler(mock_update, mock_context)
             
-            # Verify get_preps called with (0, False)
+            # Verify get_preps_message called with (0, False)
             mock_get_preps.assert_called_with(0, False)
             print("✅ Correctly requested Evening preps for Today.")
             
@@ -59,7 +59,7 @@ async def test_prep_command():
             print("\nTesting /prep at 18:00 (Mon):")
             await prep_command_handler(mock_update, mock_context)
             
-            # Verify get_preps called with (1, True)
+            # Verify get_preps_message called with (1, True)
             mock_get_preps.assert_called_with(1, True)
             print("✅ Correctly requested Morning preps for Tomorrow.")
 
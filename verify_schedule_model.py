@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+from services.schedule_model import ScheduleModel, DateIndex
+from checks import check, finish
+
+SAMPLE_CSV = """,24.11,25.11,26.11
+,пн,вт,ср
+Менеджер,,,
+Ахмитенко Анна,9-21,,10-22
+Пиццамейкер,,,
+Иванов  Иван,9-17,17-23,
+Давыдова Софа,,9-13,
+Мойка,,,
+Ольга,9-17,,
+"""
+
+def test_schedule_model():
+    print("Testing ScheduleModel...")
+    model = ScheduleModel.from_csv(SAMPLE_CSV, version=1)
+
+    check("dates indexed", model.date_to_col == {'24.11': 1, '25.11': 2, '26.11': 3})
+    check("start date parsed", model.start_date.day == 24 and model.start_date.month == 11)
+
+    shifts = model.shifts_on('25.11')
+    check("shifts for 25.11", [s['name'] for s in shifts] == ['Иванов  Иван', 'Давыдова Софа'])
+    check("role carried from header", shifts[0]['role'] == 'пиццамейкер')
+    check("unknown date is empty", model.shifts_on('01.01') == [])
+
+    check("stops at Мойка", all(e['name'] != 'Ольга' for e in model.employees))
+    check("exact name lookup", model.find_employee('Иванов Иван')['role'] == 'пиццамейкер')
+    check("surname lookup", model.find_employee('ахмитенко')['name'] == 'Ахмитенко Анна')
+    check("missing employee", model.find_employee('Петров') is None)
+
+    # Rows after the "Мойка" section must not even be read
+    consumed = []
+    def rows():
+        for row in [line.split(',') for line in SAMPLE_CSV.splitlines()]:
+            consumed.append(row[0])
+            yield row
+    ScheduleModel(rows())
+    check("stops reading at Мойка", 'Ольга' not in consumed)
+
+def test_date_index():
+    print("Testing DateIndex...")
+    index = DateIndex()
+    index.update('111', ScheduleModel.from_csv(SAMPLE_CSV, version=1))
+    index.update('222', ScheduleModel.from_csv(SAMPLE_CSV.replace('24.11,25.11,26.11', '01.12,02.12,03.12'), version=1))
+
+    check("date maps to its sheet", index.lookup('02.12') == ('222', 2))
+    check("unknown date", index.lookup('15.12') is None)
+    check("version tracked", index.is_current('111', 1) and not index.is_current('111', 2))
+
+    # A newer version of a sheet replaces its old dates
+    index.update('111', ScheduleModel.from_csv(SAMPLE_CSV.replace('24.11', '23.11'), version=2))
+    check("re-indexed on new version", index.lookup('23.11') == ('111', 1) and index.lookup('24.11') is None)
+
+    index.retain(['222'])
+    check("removed sheet forgotten", index.lookup('25.11') is None)
+
+    # Same DD.MM in two sheets a year apart: the one closest to now wins
+    index.update('333', ScheduleModel.from_csv(SAMPLE_CSV.replace('24.11,25.11,26.11', '02.12,03.12,04.12'), version=1))
+    index._entries['02.12'][1] = ('333', 1, datetime(1999, 12, 2))
+    check("closest year wins", index.lookup('02.12', now=datetime(2030, 12, 1))[0] == '222')
+
+async def test_find_shifts_revalidates():
+    print("Testing date lookups against edited sheets...")
+    from services import sheets
+    from services.sheet_manager import sheet_manager
+
+    # Sheet 222 is indexed, then a cell of it is edited on the next revalidation
+    contents = {
+        '111': (SAMPLE_CSV, 1),
+        '222': (SAMPLE_CSV.replace('24.11,25.11,26.11', '01.12,02.12,03.12'), 1),
+    }
+
+    # Like the real cache, the cached version only moves when a sheet is fetched
+    cached = {}
+
+    async def get_many_versioned(urls, *args, **kwargs):
+        cached.update({url: contents[url] for url in urls})
+        return {url: contents[url] for url in urls}
+
+    async def get_csv_versioned(url, *args, **kwargs):
+        cached[url] = contents[url]
+        return contents[url]
+
+    with patch.object(sheet_manager, 'get_sheets', return_value=[{'gid': gid, 'name': gid} for gid in contents]), \
+         patch.object(sheet_manager, 'export_url', side_effect=lambda gid: gid), \
+         patch.object(sheet_manager, 'get_many_versioned', side_effect=get_many_versioned), \
+         patch.object(sheet_manager, 'get_csv_versioned', side_effect=get_csv_versioned), \
+         patch.object(sheet_manager, 'get_csv_version', side_effect=lambda url: cached[url][1] if url in cached else 0):
+        shifts, complete = await sheets.find_shifts_for_date('04.12')
+        check("missing date is complete and empty", shifts == [] and complete)
+
+        contents['222'] = (contents['222'][0].replace('03.12', '04.12'), 2)
+        shifts, complete = await sheets.find_shifts_for_date('04.12')
+        check("date added to an indexed sheet found", complete and [s['name'] for s in shifts] == ['Ахмитенко Анна'])
+
+if __name__ == "__main__":
+    test_schedule_model()
+    test_date_index()
+    asyncio.run(test_find_shifts_revalidates())
+    finish()
@@ -0,0 +1,227 @@
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from checks import check, finish
+
+URL = "https://docs.google.com/spreadsheets/d/test/export?format=csv&gid=1"
+
+class FakeResponse:
+    def __init__(self, status_code=200, text='', headers=None, chunks=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+        self.chunks = chunks or []
+        self.chunks_read = 0
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    async def aiter_text(self):
+        for chunk in self.chunks:
+            self.chunks_read += 1
+            yield chunk
+
+class FakeServer:
+    """Answers the fake clients' requests with respond(url, headers) and records them."""
+    def __init__(self, respond, delay=0.05):
+        self.respond = respond
+        self.delay = delay
+        self.requests = []
+        self.clients = []
+
+    def client(self):
+        client = FakeClient(self)
+        self.clients.append(client)
+        return client
+
+class FakeClient:
+    def __init__(self, server):
+        self.server = server
+        self.is_closed = False
+
+    async def get(self, url, headers=None):
+        self.server.requests.append((url, dict(headers or {})))
+        await asyncio.sleep(self.server.delay)
+        return self.server.respond(url, headers or {})
+
+    @asynccontextmanager
+    async def stream(self, method, url):
+        self.server.requests.append((url, {}))
+        yield self.server.respond(url, {})
+
+    async def aclose(self):
+        self.is_closed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+def make_manager(server):
+    """A fresh SheetManager on the fake HTTP layer."""
+    from services.sheet_manager import SheetManager
+    manager = SheetManager()
+    manager._create_client = server.client
+    return manager
+
+def empty_disk_cache():
+    return patch('services.sheet_manager.SHEETS_CACHE_DIR', tempfile.mkdtemp())
+
+def set_age(manager, url, seconds):
+    manager._csv_cache[url]['timestamp'] = datetime.now() - timedelta(seconds=seconds)
+
+async def wait_background(manager):
+    while manager._background_tasks:
+        await asyncio.gather(*list(manager._background_tasks))
+
+async def test_single_flight():
+    print("Testing single-flight downloads...")
+    server = FakeServer(lambda url, headers: FakeResponse(text="a,b\n1,2\n"))
+    manager = make_manager(server)
+
+    results = await asyncio.gather(*(manager.get_csv_versioned(URL) for _ in range(5)))
+    check("concurrent readers share one download", len(server.requests) == 1)
+    check("every reader gets the content", all(result == ("a,b\n1,2\n", 1) for result in results))
+
+    await manager.get_csv_versioned(URL)
+    check("fresh entry served from memory", len(server.requests) == 1)
+    check("per-call client closed off the bot loop", all(client.is_closed for client in server.clients))
+
+    failing = FakeServer(lambda url, headers: FakeResponse(status_code=500))
+    manager = make_manager(failing)
+    with empty_disk_cache():
+        results = await asyncio.gather(*(manager.get_csv_versioned(URL) for _ in range(3)), return_exceptions=True)
+    check("a failed download is shared too", len(failing.requests) == 1)
+    check("every reader sees the error", all(isinstance(result, Exception) for result in results))
+    check("no task left in flight", not manager._inflight)
+
+async def test_stale_serving():
+    print("Testing stale and disk-restored entries...")
+    from services.sheet_manager import SHEETS_STALE_MAX_AGE
+    ttl = 300
+    content = {'value': 'v1'}
+    server = FakeServer(lambda url, headers: FakeResponse(text=content['value']))
+
+    # In-memory entry on the bot's loop
+    manager = make_manager(server)
+    await manager.start()
+    await manager.get_csv_versioned(URL)
+    content['value'] = 'v2'
+    set_age(manager, URL, ttl + 10)
+    text, _ = await manager.get_csv_versioned(URL)
+    check("stale entry served at once", text == 'v1' and len(server.requests) == 1)
+    await wait_background(manager)
+    check("stale entry refreshed in the background", len(server.requests) == 2 and manager._csv_cache[URL]['content'] == 'v2')
+
+    content['value'] = 'v3'
+    set_age(manager, URL, ttl + SHEETS_STALE_MAX_AGE + 10)
+    text, _ = await manager.get_csv_versioned(URL)
+    check("entry past the stale window downloaded first", text == 'v3' and len(server.requests) == 3)
+    await manager.close()
+
+    # Entries restored from disk by a restarted bot follow the same rules
+    restored = make_manager(server)
+    await restored.start()
+    text, _ = await restored.get_csv_versioned(URL)
+    check("fresh disk entry served without a download", text == 'v3' and len(server.requests) == 3)
+
+    content['value'] = 'v4'
+    set_age(restored, URL, ttl + 10)
+    text, _ = await restored.get_csv_versioned(URL)
+    check("stale disk entry served at once", text == 'v3' and len(server.requests) == 3)
+    await wait_background(restored)
+    check("stale disk entry refreshed in the background", len(server.requests) == 4)
+
+    content['value'] = 'v5'
+    set_age(restored, URL, ttl + SHEETS_STALE_MAX_AGE + 10)
+    text, _ = await restored.get_csv_versioned(URL)
+    check("expired disk entry downloaded first", text == 'v5' and len(server.requests) == 5)
+    await restored.close()
+
+    # Web app / scripts: no start(), no loop to refresh on, so a stale entry is downloaded first
+    script = make_manager(server)
+    script.load_disk_cache()
+    content['value'] = 'v6'
+    set_age(script, URL, ttl + 10)
+    text, _ = await script.get_csv_versioned(URL)
+    check("stale entry downloaded first off the bot loop", text == 'v6' and len(server.requests) == 6)
+    check("no background refresh off the bot loop", not script._background_tasks)
+
+    # Google failing: the last known content is served, whatever its age
+    failing = FakeServer(lambda url, headers: FakeResponse(status_code=503))
+    degraded = make_manager(failing)
+    degraded.load_disk_cache()
+    set_age(degraded, URL, ttl + SHEETS_STALE_MAX_AGE + 10)
+    text, _ = await degraded.get_csv_versioned(URL)
+    check("cached copy served when the download fails", text == 'v6' and degraded.get_stats()['degraded'] == 1)
+
+async def test_conditional_get():
+    print("Testing conditional GET...")
+    body = {'value': "a,b\n1,2\n"}
+
+    def respond(url, headers):
+        if headers.get('If-None-Match') == '"e1"':
+            return FakeResponse(status_code=304)
+        return FakeResponse(text=body['value'], headers={'ETag': '"e1"', 'Last-Modified': 'Mon, 24 Nov 2025 08:00:00 GMT'})
+
+    server = FakeServer(respond)
+    manager = make_manager(server)
+    _, version = await manager.get_csv_versioned(URL)
+    check("first download sends no validators", server.requests[0][1] == {})
+
+    set_age(manager, URL, 3600)
+    text, new_version = await manager.get_csv_versioned(URL, allow_stale=False)
+    check("validators sent on the next download", server.requests[1][1] == {
+        'If-None-Match': '"e1"', 'If-Modified-Since': 'Mon, 24 Nov 2025 08:00:00 GMT'})
+    check("304 keeps content and version", text == body['value'] and new_version == version)
+    check("304 counted", manager.get_stats()['not_modified'] == 1)
+    await manager.get_csv_versioned(URL)
+    check("304 renews the entry", len(server.requests) == 2)
+
+    # Exports usually come without validators: the content digest decides
+    plain = FakeServer(lambda url, headers: FakeResponse(text=body['value']))
+    manager = make_manager(plain)
+    _, version = await manager.get_csv_versioned(URL)
+    set_age(manager, URL, 3600)
+    _, same_version = await manager.get_csv_versioned(URL, allow_stale=False)
+    check("identical content keeps the version", same_version == version and manager.get_stats()['unchanged'] == 1)
+    body['value'] = "a,b\n1,3\n"
+    set_age(manager, URL, 3600)
+    text, new_version = await manager.get_csv_versioned(URL, allow_stale=False)
+    check("changed content bumps the version", text == body['value'] and new_version == version + 1)
+
+async def test_bootstrap_discovery():
+    print("Testing sheet discovery...")
+    data = r'{"changes":"[7,0,\"111\",[{\"1\":[[0,0,\"кухня 24-30\"]]}],[8,0,\"222\",[{\"1\":[[0,0,\"Бар\"]]}]"}'
+    # The marker starts at 4990, so it is split across the 1000-character chunks
+    page = '<html><head>' + 'x' * 4978 + 'var bootstrapData = ' + data + ';' + 'y' * 50000
+    chunks = [page[i:i + 1000] for i in range(0, len(page), 1000)]
+    response = FakeResponse(chunks=chunks)
+    server = FakeServer(lambda url, headers: response)
+    manager = make_manager(server)
+
+    with patch('services.sheet_manager.SHEETS_CONFIG_FILE', '/nonexistent/sheets_config.json'):
+        sheets = await manager.get_sheets()
+    check("kitchen sheets found in bootstrapData", sheets == [{'name': 'кухня 24-30', 'gid': '111'}])
+    check("rest of the page not downloaded", response.chunks_read < len(chunks) // 2)
+
+    await manager.get_sheets()
+    check("sheet list cached", len(server.requests) == 1)
+
+async def run_all():
+    with empty_disk_cache():
+        await test_single_flight()
+    with empty_disk_cache():
+        await test_stale_serving()
+    with empty_disk_cache():
+        await test_conditional_get()
+    with empty_disk_cache():
+        await test_bootstrap_discovery()
+
+if __name__ == "__main__":
+    asyncio.run(run_all())
+    finish()
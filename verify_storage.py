@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+from checks import check, finish
+
+def write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+def test_import():
+    print("Testing import of the JSON files...")
+    from services.storage import Storage
+
+    data_dir = tempfile.mkdtemp()
+    write_json(os.path.join(data_dir, 'users.json'), {'1': 'Иванов Иван', '2': {'surname': 'Петров'}})
+    write_json(os.path.join(data_dir, 'group.json'), {'group_id': '-100123'})
+    write_json(os.path.join(data_dir, 'ratings.json'), {'rs': 'photo1', 'rp': ['photo2', 'photo3']})
+    write_json(os.path.join(data_dir, 'medical_info.json'), {'employees': [
+        {'name': 'Иванов Иван', 'role': 'manager', 'med_commission_date': '01.01.2030', 'note': 'x'},
+        {'name': 'Петров Пётр', 'role': 'cashier', 'status': 'missing_docs'},
+    ]})
+
+    storage = Storage(os.path.join(data_dir, 'bot.db'), data_dir=data_dir)
+    check("users imported", storage.get_users() == {'1': 'Иванов Иван', '2': 'Петров'})
+    check("group id imported", storage.get_group_id() == '-100123')
+    check("old single-photo ratings converted", storage.get_ratings() == {'rs': ['photo1'], 'rp': ['photo2', 'photo3']})
+    employees = storage.get_medical_employees()
+    check("medical records imported in order", [e['name'] for e in employees] == ['Иванов Иван', 'Петров Пётр'])
+    check("unknown medical fields kept", employees[0]['note'] == 'x' and 'status' not in employees[0])
+
+    check("imported files renamed", not os.path.exists(os.path.join(data_dir, 'users.json'))
+          and os.path.exists(os.path.join(data_dir, 'users.json.imported')))
+
+    # A users.json edited and put back never drops registrations made since
+    storage.register_user('3', 'Сидоров')
+    write_json(os.path.join(data_dir, 'users.json'), {'1': 'Иванов Иван (изменён)', '4': 'Новиков'})
+    reopened = Storage(os.path.join(data_dir, 'bot.db'), data_dir=data_dir)
+    users = reopened.get_users()
+    check("re-import keeps live users", users.get('3') == 'Сидоров' and users.get('1') == 'Иванов Иван')
+    check("re-import adds new users", users.get('4') == 'Новиков')
+    check("second import renamed aside", len([f for f in os.listdir(data_dir) if f.startswith('users.json.imported')]) == 2)
+
+    write_json(os.path.join(data_dir, 'medical_info.json'), {'employees': [{'name': 'Сидоров Сидор'}]})
+    reopened = Storage(os.path.join(data_dir, 'bot.db'), data_dir=data_dir)
+    check("medical re-import is additive", len(reopened.get_medical_employees()) == 3)
+
+    # deploy_group_json.sh puts group.json in place to set the group
+    write_json(os.path.join(data_dir, 'group.json'), {'group_id': '-100999'})
+    reopened = Storage(os.path.join(data_dir, 'bot.db'), data_dir=data_dir)
+    check("deployed group.json applied", reopened.get_group_id() == '-100999')
+
+def test_row_updates():
+    print("Testing row-level updates...")
+    from services.storage import Storage
+
+    data_dir = tempfile.mkdtemp()
+    storage = Storage(os.path.join(data_dir, 'bot.db'), data_dir=data_dir)
+
+    version = storage.version('users')
+    check("register", storage.register_user(1, 'Иванов Иван'))
+    check("name taken by another user", not storage.register_user(2, 'Иванов Иван'))
+    check("re-register same user", storage.register_user(1, 'Иванов Иван'))
+    check("version bumped", storage.version('users') == version + 2)
+    check("delete", storage.delete_user(1) and storage.get_user_name(1) is None)
+
+    check("add employee", storage.add_medical_employee({'name': 'Петров Пётр', 'role': 'cashier', 'status': 'missing_docs'}))
+    check("duplicate employee rejected", not storage.add_medical_employee({'name': 'петров пётр'}))
+    storage.update_medical_employee('Петров Пётр', med_commission_date='01.01.2030', status=None)
+    employee = storage.find_medical_employee('петров')
+    check("update fields, remove status", employee['med_commission_date'] == '01.01.2030' and 'status' not in employee)
+    check("remove employee", storage.remove_medical_employee('ПЕТРОВ ПЁТР') and not storage.get_medical_employees())
+
+    storage.set_ratings('rs', ['a', 'b'])
+    storage.set_ratings('rs', ['c'])
+    check("ratings replaced", storage.get_ratings()['rs'] == ['c'])
+
+if __name__ == "__main__":
+    test_import()
+    test_row_updates()
+    finish()
@@ -0,0 +1,51 @@
+from unittest.mock import patch
+from services.user_index import UserIndex
+from checks import check, finish, use_temp_storage
+
+BLACKLIST = ['куйкин сергей']
+ALIASES = {'давыдова софа': 'Давыдова София', 'давыдова': 'Давыдова София'}
+
+def test_user_index():
+    print("Testing UserIndex...")
+    users = {
+        '1': 'Иванов Иван',
+        '2': 'Иванов Иван',      # Same employee on two accounts
+        '3': 'Давыдова София',
+        '4': 'Петров',           # Old registration with surname only
+        '5': 'Куйкин Сергей',
+    }
+    index = UserIndex(users, BLACKLIST, ALIASES)
+
+    check("exact name, duplicates kept", index.user_ids_for('Иванов  Иван') == ['1', '2'])
+    check("alias in schedule", index.user_ids_for('Давыдова Софа') == ['3'])
+    check("surname-only registration", index.user_ids_for('Петров Пётр') == ['4'])
+    check("blacklisted row", index.user_ids_for('Куйкин Сергей') == [])
+    check("unknown employee", index.user_ids_for('Сидоров Олег') == [])
+
+    check("matches alias", index.matches('Давыдова София', 'Давыдова Софа'))
+    check("matches surname", index.matches('Петров', 'Петров Пётр'))
+    check("no partial full-name match", not index.matches('Иванов Иван', 'Иванова Ивана'))
+
+def test_cached_index():
+    print("Testing the cached index...")
+    from services.user_index import get_user_index, index_version
+
+    storage = use_temp_storage()
+    storage.register_user('1', 'Иванов Иван')
+    index = get_user_index()
+    check("index built from storage", index.user_ids_for('Иванов Иван') == ['1'])
+
+    with patch.object(storage, 'version', wraps=storage.version) as mock_version:
+        for _ in range(100):
+            get_user_index()
+            index_version()
+        check("version checks throttled", mock_version.call_count == 0)
+
+    # A registration by this process is seen right away
+    storage.register_user('2', 'Петров Пётр')
+    check("registration invalidates the index", get_user_index().user_ids_for('Петров Пётр') == ['2'])
+
+if __name__ == "__main__":
+    test_user_index()
+    test_cached_index()
+    finish()